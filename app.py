@@ -7,8 +7,14 @@ mail = Mail()
 
 
 def create_app():
+    from utils.uploads import StreamingUploadRequest, UPLOAD_MAX_REQUEST_BYTES
+
     app = Flask(__name__)
 
+    # ✅ Uploads stream into blob staging; per-request and per-file byte caps
+    app.request_class = StreamingUploadRequest
+    app.config["MAX_CONTENT_LENGTH"] = UPLOAD_MAX_REQUEST_BYTES
+
     # ✅ CORS setup for React frontend
     from flask_cors import CORS
 
@@ -31,14 +37,8 @@ def create_app():
 
 
     # ✅ Default Mail Config (used if tenant email not configured)
-    app.config.update({
-        "MAIL_SERVER": "smtp.gmail.com",
-        "MAIL_PORT": 587,
-        "MAIL_USE_TLS": True,
-        "MAIL_USERNAME": "yourcompanyemail@gmail.com",
-        "MAIL_PASSWORD": "your_app_password",  # Gmail app password
-        "MAIL_DEFAULT_SENDER": ("Phoenix Computers", "yourcompanyemail@gmail.com"),
-    })
+    from utils.email_utils import MAIL_DEFAULTS
+    app.config.update(MAIL_DEFAULTS)
 
     mail.init_app(app)
 
@@ -84,17 +84,32 @@ def create_app():
     app.register_blueprint(challans_bp, url_prefix="/api/tenant")
     app.register_blueprint(email_settings_bp, url_prefix="/api/tenant")
 
+    # ✅ Request timing: /metrics (Prometheus) + Server-Timing header
+    from utils.metrics import init_metrics
+    from utils.query_log import init_query_log
+    init_metrics(app)
+    init_query_log(app)
+
+    @app.errorhandler(413)
+    def upload_too_large(e):
+        return {"error": getattr(e, "description", None) or "Upload too large"}, 413
+
     # ============================================================
     # ✅ BASE ROUTE
     # ============================================================
+    services = {
+        "admin": "/api/admin/*",
+        "tenant": "/api/tenant/*",
+    }
+    # init_metrics only registers /metrics when it is enabled and protected
+    if "metrics" in app.view_functions:
+        services["metrics"] = "/metrics"
+
     @app.route("/")
     def home():
         return {
             "message": "🚀 Automan Solutions API is running",
-            "services": {
-                "admin": "/api/admin/*",
-                "tenant": "/api/tenant/*",
-            },
+            "services": services,
         }
 
     return app
@@ -104,5 +119,20 @@ def create_app():
 # 🔹 ENTRY POINT
 # ============================================================
 if __name__ == "__main__":
+    import os
+    from utils.jobs import start_inline_workers
+    from utils.migrations import upgrade
+
     app = create_app()
+
+    # Local dev: run artifact workers in-process (set JOBS_INLINE_WORKERS=0 when
+    # `python worker.py` is running). Only the reloader's child serves requests.
+    inline_workers = int(os.environ.get("JOBS_INLINE_WORKERS", 2))
+    if inline_workers and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        try:
+            upgrade()
+        except Exception as e:
+            print("⚠️ Could not apply migrations:", e)
+        start_inline_workers(inline_workers)
+
     app.run(host="0.0.0.0", port=6001, debug=True)
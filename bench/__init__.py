@@ -0,0 +1,6 @@
+"""
+Load / benchmark suite for the challan API (see bench/load.py).
+
+Everything it needs runs locally: a throwaway Postgres (or a dedicated
+database on an existing server), an SMTP sink and a stub wkhtmltopdf.
+"""
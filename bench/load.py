@@ -0,0 +1,329 @@
+"""
+Load benchmark for the challan API.
+
+Starts the local stand-ins (bench/standins.py), seeds N tenants x M
+challans, serves the real app on a threaded local HTTP server with inline
+job/outbox workers, then drives each scenario at a fixed concurrency and
+reports latency percentiles and throughput. After each scenario the run
+waits for the PDFs/emails it queued ("drain s"), so scenarios do not
+overlap with each other's background work:
+
+    python -m bench.load --tenants 5 --challans 500 --concurrency 8 --requests 400
+    python -m bench.load --save-baseline              # record bench/baseline.json
+    python -m bench.load --baseline bench/baseline.json --tolerance 0.25
+
+With --baseline the run exits 1 when a scenario's p95 grows, or its
+throughput drops, by more than --tolerance, or when it returns more errors.
+Baselines are machine-specific: record them on the machine that compares.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import threading
+import itertools
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.standins import Database, SmtpSink, StubWkhtmltopdf
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+SCENARIOS = ("create_challan", "get_challans", "get_single_challan", "verify_otp", "tenant_dashboard")
+
+
+# ============================================================
+# 🔹 SCENARIOS
+# ============================================================
+class Scenarios:
+    """Request builders; each returns (method, path, json_body, token)."""
+
+    def __init__(self, seeded):
+        self.seeded = seeded
+        self._lock = threading.Lock()
+        # every verify_otp call consumes one seeded OTP challan
+        self._otp_pool = iter([(t, no) for t in seeded for no in t["otp_challan_nos"]])
+        self._seq = itertools.count(1)
+
+    def _tenant(self):
+        return random.choice(self.seeded)
+
+    def create_challan(self):
+        tenant = self._tenant()
+        n = next(self._seq)
+        body = {
+            "customer_name": f"Load Customer {n}",
+            "email": f"load{n}@example.com",
+            "contact_number": "9800000000",
+            "serial_number": f"LOAD-{n}",
+            "city": "Pune",
+            "problem": "Bench problem",
+            "accessories": ["Charger"],
+            "items": [{"name": "Laptop", "qty": 1}],
+        }
+        return "POST", "/api/tenant/challan", body, tenant["token"]
+
+    def get_challans(self):
+        return "GET", "/api/tenant/challans?limit=50", None, self._tenant()["token"]
+
+    def get_single_challan(self):
+        tenant = self._tenant()
+        return "GET", f"/api/tenant/challan/{random.choice(tenant['challan_nos'])}", None, tenant["token"]
+
+    def verify_otp(self):
+        with self._lock:
+            tenant, challan_no = next(self._otp_pool)
+        from bench.seed import BENCH_OTP
+        return "POST", f"/api/tenant/challan/{challan_no}/verify_otp", {"otp": BENCH_OTP}, tenant["token"]
+
+    def tenant_dashboard(self):
+        return "GET", "/api/tenant/dashboard", None, self._tenant()["token"]
+
+
+# ============================================================
+# 🔹 DRIVER
+# ============================================================
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def run_scenario(base_url, build, requests_total, concurrency, warmup=0):
+    """Issue `requests_total` requests from `concurrency` threads; returns the summary dict."""
+    import requests as http
+
+    local = threading.local()
+    latencies, errors = [], []
+    lock = threading.Lock()
+    remaining = itertools.count()
+
+    def _session():
+        if not hasattr(local, "session"):
+            local.session = http.Session()
+        return local.session
+
+    def _one(record=True):
+        method, path, body, token = build()
+        started = time.perf_counter()
+        try:
+            resp = _session().request(method, base_url + path, json=body,
+                                      headers={"Authorization": f"Bearer {token}"}, timeout=60)
+            ok = resp.status_code < 400
+            status = resp.status_code
+        except Exception as e:
+            ok, status = False, type(e).__name__
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if record:
+            with lock:
+                latencies.append(elapsed_ms)
+                if not ok:
+                    errors.append(status)
+
+    def _worker():
+        while next(remaining) < requests_total:
+            _one()
+
+    for _ in range(warmup):
+        _one(record=False)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench") as pool:
+        for f in [pool.submit(_worker) for _ in range(concurrency)]:
+            f.result()
+    wall = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": len(errors),
+        "error_statuses": sorted({str(s) for s in errors}),
+        "throughput_rps": round(len(ordered) / wall, 2) if wall else 0.0,
+        "p50_ms": round(_percentile(ordered, 0.50), 2),
+        "p95_ms": round(_percentile(ordered, 0.95), 2),
+        "p99_ms": round(_percentile(ordered, 0.99), 2),
+        "max_ms": round(ordered[-1], 2) if ordered else 0.0,
+    }
+
+
+def _quiet_handler():
+    from werkzeug.serving import WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass  # one access-log line per request would dominate the output
+
+    return QuietHandler
+
+
+def _background_settled():
+    """True once no artifact job or email is waiting or running."""
+    from utils.db import db_connection
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT (SELECT COUNT(*) FROM challan_jobs WHERE status IN ('queued', 'running'))
+                    + (SELECT COUNT(*) FROM email_outbox WHERE status IN ('queued', 'sending'))"""
+        )
+        pending = cur.fetchone()[0]
+        cur.close()
+    return pending == 0
+
+
+# ============================================================
+# 🔹 BASELINE
+# ============================================================
+def compare(results, baseline, tolerance):
+    """List of human-readable regressions versus a stored baseline."""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        if base["p95_ms"] and current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']} ms vs baseline {base['p95_ms']} ms")
+        if base["throughput_rps"] and current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['throughput_rps']} rps vs baseline {base['throughput_rps']} rps")
+        if current["errors"] > base.get("errors", 0):
+            regressions.append(f"{name}: {current['errors']} errors vs baseline {base.get('errors', 0)}")
+    return regressions
+
+
+def print_table(results):
+    header = (f"{'scenario':<20}{'reqs':>7}{'errs':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}"
+              f"{'p99 ms':>10}{'max ms':>10}{'drain s':>10}")
+    print(header)
+    print("-" * len(header))
+    for name, r in results["scenarios"].items():
+        print(f"{name:<20}{r['requests']:>7}{r['errors']:>6}{r['throughput_rps']:>10}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['max_ms']:>10}"
+              f"{str(r['background_drain_s']):>10}")
+
+
+# ============================================================
+# 🔹 MAIN
+# ============================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Challan API load benchmark")
+    parser.add_argument("--tenants", type=int, default=5)
+    parser.add_argument("--challans", type=int, default=500, help="seeded challans per tenant")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=400, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per scenario")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--db", choices=["auto", "pgserver", "existing"], default="auto",
+                        help="throwaway pgserver cluster, or a fresh database on the DB_* server")
+    parser.add_argument("--workers", type=int, default=2, help="inline job/outbox worker threads")
+    parser.add_argument("--drain-timeout", type=float, default=120,
+                        help="seconds to wait for queued PDFs/emails after each scenario")
+    parser.add_argument("--render-delay-ms", type=float, default=0, help="extra latency of the stub wkhtmltopdf")
+    parser.add_argument("--output", help="write the results JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="store the results as baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    # stand-ins first: utils.* read their environment on import
+    db = Database(args.db).start()
+    smtp = SmtpSink().start()
+    stub = StubWkhtmltopdf(args.render_delay_ms).start()
+    os.environ.setdefault("SLOW_QUERY_MS", "0")
+
+    from werkzeug.serving import make_server
+    from app import create_app
+    from utils.migrations import upgrade
+    from utils.jobs import start_inline_workers, wait_for
+    from bench.seed import seed, cleanup_artifacts
+
+    seeded = []
+    server = None
+    stop_workers = None
+    worker_threads = []
+    try:
+        upgrade()
+        otp_per_tenant = (args.requests + args.warmup) // max(1, args.tenants) + 1 if "verify_otp" in scenarios else 0
+        started = time.perf_counter()
+        seeded = seed(args.tenants, args.challans, otp_per_tenant)
+        print(f"🌱 Seeded {args.tenants} tenants x {args.challans} challans in {time.perf_counter() - started:.1f}s")
+
+        stop_workers, worker_threads = start_inline_workers(args.workers)
+        server = make_server("127.0.0.1", 0, create_app(), threaded=True, request_handler=_quiet_handler())
+        threading.Thread(target=server.serve_forever, name="bench-http", daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+
+        builders = Scenarios(seeded)
+        results = {
+            "recorded_at": datetime.utcnow().isoformat(),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "config": {k: getattr(args, k) for k in ("tenants", "challans", "concurrency", "requests",
+                                                     "warmup", "workers", "render_delay_ms")},
+            "scenarios": {},
+        }
+        for name in scenarios:
+            print(f"🏃 {name} ...")
+            summary = run_scenario(base_url, getattr(builders, name), args.requests, args.concurrency, args.warmup)
+            # let the PDFs/emails it queued finish, so the next scenario starts idle
+            started = time.perf_counter()
+            drained = wait_for(_background_settled, args.drain_timeout)
+            summary["background_drain_s"] = round(time.perf_counter() - started, 2) if drained else None
+            results["scenarios"][name] = summary
+        results["emails_accepted_by_sink"] = smtp.messages
+    finally:
+        if server is not None:
+            server.shutdown()
+        if stop_workers is not None:
+            stop_workers.set()
+            for t in worker_threads:
+                t.join(timeout=10)
+        cleanup_artifacts(seeded)
+        try:
+            from utils.db import get_pool
+            get_pool().closeall()
+        except Exception:
+            pass
+        stub.stop()
+        smtp.stop()
+        db.stop()
+
+    print()
+    print_table(results)
+    stuck = [name for name, r in results["scenarios"].items() if r["background_drain_s"] is None]
+    if stuck:
+        print(f"⚠️ Background work still pending {args.drain_timeout:.0f}s after: {', '.join(stuck)}")
+    print(f"✉️ {results['emails_accepted_by_sink']} emails reached the SMTP sink")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ Regressions beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print("   -", line)
+            return 1
+        print(f"✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
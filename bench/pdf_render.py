@@ -0,0 +1,301 @@
+"""
+PDF rendering micro-benchmark and regression gate.
+
+Renders synthetic challans through generate_pdf() across a parameter grid
+(attached images, logo size, items table length, delivered watermark) and
+reports, per case and engine, the median wall time, CPU time (including
+the wkhtmltopdf child process), peak RSS and output size:
+
+    python -m bench.pdf_render                         # one factor at a time around a base case
+    python -m bench.pdf_render --full-grid --repeat 5
+    python -m bench.pdf_render --engines native        # one engine (default: all in ENGINES)
+    python -m bench.pdf_render --save-baseline         # record bench/pdf_baseline.json
+    python -m bench.pdf_render --baseline bench/pdf_baseline.json --threshold 0.2
+
+Each case runs in a fresh process so peak RSS belongs to that case alone,
+with the PDF cache pointed at a scratch directory and a per-render nonce
+so every render is a real one. With --baseline the run exits 1 when a
+case's wall time, CPU time or peak RSS grows by more than --threshold.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import itertools
+import statistics
+import tempfile
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCH_DIR)
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "pdf_baseline.json")
+# synthetic assets must live under static/ for resolve_asset() to embed them
+ASSETS_DIR = os.path.join(PROJECT_ROOT, "static", "bench")
+
+GRID = {
+    "images": [0, 2, 6],
+    "logo": ["none", "small", "large"],
+    "items": [1, 25, 150],
+    "watermark": [False, True],
+}
+BASE_CASE = {"images": 2, "logo": "small", "items": 5, "watermark": False}
+
+LOGO_SIZES = {"small": (240, 96), "large": (2400, 960)}
+IMAGE_SIZE = (1600, 1200)
+
+
+# ============================================================
+# 🔹 ENGINES
+# ============================================================
+def _engine(name):
+    """The production path, generate_pdf(), with the tenant's engine set to `name`."""
+    def _render(data, tenant_design, out_path):
+        from utils.pdf_qr_utils import generate_pdf
+
+        return generate_pdf(data, {**tenant_design, "pdf_engine": name}, output_path=out_path)
+    return _render
+
+
+ENGINES = {"wkhtmltopdf": _engine("wkhtmltopdf"), "native": _engine("native")}
+
+
+# ============================================================
+# 🔹 SYNTHETIC INPUT
+# ============================================================
+def make_assets(directory=ASSETS_DIR):
+    """Write the logo, photo and QR files the cases reference; returns their /static URLs."""
+    from PIL import Image, ImageDraw
+    import qrcode
+
+    os.makedirs(directory, exist_ok=True)
+    rel = "/static/" + os.path.relpath(directory, os.path.join(PROJECT_ROOT, "static")).replace(os.sep, "/")
+    urls = {}
+    for name, size in LOGO_SIZES.items():
+        img = Image.new("RGB", size, (17, 78, 158))
+        ImageDraw.Draw(img).rectangle([size[0] // 10, size[1] // 4, size[0] // 2, size[1] * 3 // 4], fill="white")
+        img.save(os.path.join(directory, f"logo_{name}.png"))
+        urls[f"logo_{name}"] = f"{rel}/logo_{name}.png"
+    for i in range(max(GRID["images"])):
+        # noisy gradient so JPEG size is realistic
+        img = Image.effect_noise(IMAGE_SIZE, 40 + i).convert("RGB")
+        img.save(os.path.join(directory, f"photo_{i}.jpg"), quality=85)
+        urls[f"photo_{i}"] = f"{rel}/photo_{i}.jpg"
+    qrcode.make(json.dumps({"challan_no": "BENCH-000001", "tenant_id": 0})).save(os.path.join(directory, "qr.png"))
+    urls["qr"] = f"{rel}/qr.png"
+    return urls
+
+
+def case_input(case, urls, nonce):
+    tenant_design = {
+        "company_name": "Bench Computers",
+        "tagline": "Repairs & Service",
+        "company_address": "1 Test Street, Pune",
+        "company_phone": "+91 98000 00000",
+        "theme_color": "#114e9e",
+        "terms_conditions": "<ol>" + "".join(f"<li>Term {i}</li>" for i in range(1, 8)) + "</ol>",
+    }
+    if case["logo"] != "none":
+        tenant_design["logo_url"] = urls[f"logo_{case['logo']}"]
+    data = {
+        "challan_no": f"BENCH-{nonce:06d}",
+        "customer_name": "Bench Customer",
+        "email": "bench@example.com",
+        "contact_number": "9800000000",
+        "serial_number": "SN-BENCH",
+        "city": "Pune",
+        "problem": "Display flickers after warm-up; intermittent power loss.",
+        "accessories": ["Charger", "Bag", "Mouse"],
+        "warranty": "In warranty",
+        "dispatch_through": "Courier",
+        "employee_name": "Bench Staff",
+        "items": [{"description": f"Part {i}", "quantity": 1 + i % 3} for i in range(case["items"])],
+        "status": "delivered" if case["watermark"] else "pending",
+        "images": [urls[f"photo_{i}"] for i in range(case["images"])],
+        "qr_code_url": urls["qr"],
+    }
+    return data, tenant_design
+
+
+def case_name(case):
+    return f"img{case['images']}-logo_{case['logo']}-items{case['items']}-{'wm' if case['watermark'] else 'nowm'}"
+
+
+def build_cases(full_grid):
+    if full_grid:
+        keys = list(GRID)
+        return [dict(zip(keys, values)) for values in itertools.product(*(GRID[k] for k in keys))]
+    cases = [dict(BASE_CASE)]
+    for key, values in GRID.items():
+        for value in values:
+            case = {**BASE_CASE, key: value}
+            if case not in cases:
+                cases.append(case)
+    return cases
+
+
+# ============================================================
+# 🔹 MEASUREMENT (runs in a fresh process per case)
+# ============================================================
+def _cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / scale, 1)
+
+
+def measure_case(engine, case, urls, repeat, scratch_dir):
+    render = ENGINES[engine]
+    out_path = os.path.join(scratch_dir, f"{engine}-{case_name(case)}.pdf")
+
+    data, design = case_input(case, urls, 0)
+    if not render(data, design, out_path):  # warm-up: imports, template, binary lookup
+        return {"error": "render failed"}
+
+    walls, cpus = [], []
+    for i in range(1, repeat + 1):
+        data, design = case_input(case, urls, i)  # new challan_no: a cache miss every time
+        cpu_before = _cpu_seconds()
+        started = time.perf_counter()
+        if not render(data, design, out_path):
+            return {"error": "render failed"}
+        walls.append((time.perf_counter() - started) * 1000)
+        cpus.append((_cpu_seconds() - cpu_before) * 1000)
+
+    return {
+        "wall_ms": round(statistics.median(walls), 2),
+        "wall_min_ms": round(min(walls), 2),
+        "cpu_ms": round(statistics.median(cpus), 2),
+        "peak_rss_mb": _peak_rss_mb(),
+        "size_kb": round(os.path.getsize(out_path) / 1024, 1),
+    }
+
+
+def _measure_in_child(env, engine, case, urls, repeat, scratch_dir):
+    os.environ.update(env)
+    return measure_case(engine, case, urls, repeat, scratch_dir)
+
+
+# ============================================================
+# 🔹 BASELINE
+# ============================================================
+GATED_METRICS = ("wall_ms", "cpu_ms", "peak_rss_mb")
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for key, current in results["cases"].items():
+        base = baseline.get("cases", {}).get(key)
+        if not base or "error" in base:
+            continue
+        if "error" in current:
+            regressions.append(f"{key}: {current['error']}")
+            continue
+        for metric in GATED_METRICS:
+            if base.get(metric) and current[metric] > base[metric] * (1 + threshold):
+                regressions.append(f"{key}: {metric} {current[metric]} vs baseline {base[metric]}")
+    return regressions
+
+
+def print_table(results):
+    header = f"{'engine / case':<48}{'wall ms':>10}{'cpu ms':>10}{'rss MB':>9}{'KB':>9}"
+    print(header)
+    print("-" * len(header))
+    for key, r in results["cases"].items():
+        if "error" in r:
+            print(f"{key:<48}{r['error']:>38}")
+        else:
+            print(f"{key:<48}{r['wall_ms']:>10}{r['cpu_ms']:>10}{r['peak_rss_mb']:>9}{r['size_kb']:>9}")
+
+
+# ============================================================
+# 🔹 MAIN
+# ============================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PDF rendering micro-benchmark")
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--full-grid", action="store_true", help="every combination instead of one factor at a time")
+    parser.add_argument("--repeat", type=int, default=3, help="measured renders per case (median reported)")
+    parser.add_argument("--stub-wkhtmltopdf", action="store_true",
+                        help="use the bench stub instead of the real binary (checks the harness, not wkhtmltopdf)")
+    parser.add_argument("--output", help="write the results JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="store the results as baseline")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    engines = [e.strip() for e in args.engines.split(",") if e.strip()]
+    unknown = [e for e in engines if e not in ENGINES]
+    if unknown:
+        parser.error(f"unknown engines: {', '.join(unknown)} (available: {', '.join(ENGINES)})")
+
+    scratch_dir = tempfile.mkdtemp(prefix="challan-pdf-bench-")
+    stub = None
+    # renders must miss the shared PDF cache and must not fill it
+    env = {"PDF_CACHE_DIR": os.path.join(scratch_dir, "cache")}
+    if args.stub_wkhtmltopdf:
+        from bench.standins import StubWkhtmltopdf
+        stub = StubWkhtmltopdf().start()
+        env["WKHTMLTOPDF_BIN"] = stub.path
+
+    results = {
+        "recorded_at": datetime.utcnow().isoformat(),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "config": {"repeat": args.repeat, "full_grid": args.full_grid, "stub_wkhtmltopdf": args.stub_wkhtmltopdf},
+        "cases": {},
+    }
+    try:
+        urls = make_assets()
+        for engine in engines:
+            for case in build_cases(args.full_grid):
+                key = f"{engine}/{case_name(case)}"
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    results["cases"][key] = pool.submit(
+                        _measure_in_child, env, engine, case, urls, args.repeat, scratch_dir,
+                    ).result()
+                print(f"📄 {key}: {results['cases'][key]}")
+    finally:
+        shutil.rmtree(ASSETS_DIR, ignore_errors=True)
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+        if stub is not None:
+            stub.stop()
+
+    print()
+    print_table(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Baseline saved to {args.save_baseline}")
+
+    failed = [key for key, r in results["cases"].items() if "error" in r]
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"❌ Regressions beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print("   -", line)
+            return 1
+        print(f"✅ No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Seed N tenants x M challans for the benchmark.
+
+Tenant ids start at BENCH_TENANT_ID_START so the PDFs/QR codes the run
+produces land in their own static/pdfs/<tenant_id>/ folders (removed by
+cleanup_artifacts()) instead of next to a dev database's tenants.
+"""
+import os
+import json
+import shutil
+import random
+from datetime import datetime, timedelta
+from psycopg2.extras import execute_values
+from utils.db import db_connection
+from utils.auth import generate_token
+from utils.challan_numbers import format_challan_no, DEFAULT_FORMAT, DEFAULT_PREFIX
+
+BENCH_TENANT_ID_START = int(os.environ.get("BENCH_TENANT_ID_START", 900000))
+BENCH_OTP = "424242"
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+
+_PROBLEMS = ["No display", "Battery not charging", "Keyboard faulty", "Overheating", "Won't boot"]
+_CITIES = ["Pune", "Mumbai", "Nashik", "Nagpur"]
+
+
+def _challan_row(tenant_id, seq, employee_id, created_at, otp=False):
+    return (
+        tenant_id,
+        format_challan_no(DEFAULT_FORMAT, DEFAULT_PREFIX, seq, created_at),
+        f"Customer {seq}",
+        f"customer{seq}@example.com",
+        f"98{seq:08d}",
+        f"SN-{tenant_id}-{seq}",
+        random.choice(_CITIES),
+        random.choice(_PROBLEMS),
+        json.dumps(["Charger", "Bag"]),
+        "In warranty" if seq % 3 else "Out of warranty",
+        "Courier",
+        employee_id,
+        json.dumps([{"name": "Laptop", "qty": 1}]),
+        json.dumps([]),
+        "delivered" if seq % 4 == 0 and not otp else "pending",
+        created_at,
+        BENCH_OTP if otp else None,
+        datetime.utcnow() + timedelta(days=1) if otp else None,
+    )
+
+
+def seed(tenants, challans_per_tenant, otp_challans_per_tenant=0, days=90):
+    """
+    Insert the tenants, one staff user each, settings and challans.
+    `otp_challans_per_tenant` extra pending challans carry BENCH_OTP for the
+    verify_otp scenario. Returns [{tenant_id, user_id, token, challan_nos, otp_challan_nos}].
+    """
+    seeded = []
+    now = datetime.utcnow()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT setval('tenants_id_seq', %s, false)", (BENCH_TENANT_ID_START,))
+        for t in range(tenants):
+            cur.execute(
+                "INSERT INTO tenants (name, email) VALUES (%s, %s) RETURNING id",
+                (f"Bench Tenant {t + 1}", f"bench-tenant-{t + 1}@example.com"),
+            )
+            tenant_id = cur.fetchone()[0]
+            cur.execute(
+                """INSERT INTO users (tenant_id, name, email, password_hash, role)
+                   VALUES (%s, %s, %s, 'x', 'staff') RETURNING id""",
+                (tenant_id, f"Staff {t + 1}", f"staff{t + 1}@example.com"),
+            )
+            user_id = cur.fetchone()[0]
+            cur.execute(
+                """INSERT INTO tenant_settings (tenant_id, branding_config, challan_config, terms_conditions)
+                   VALUES (%s, %s, %s, %s)""",
+                (tenant_id, json.dumps({"company_name": f"Bench Tenant {t + 1}", "theme_color": "#114e9e"}),
+                 json.dumps({}), "Goods once delivered will not be taken back."),
+            )
+
+            total = challans_per_tenant + otp_challans_per_tenant
+            rows = [
+                _challan_row(
+                    tenant_id, seq, user_id,
+                    now - timedelta(seconds=random.randint(0, days * 86400)),
+                    otp=seq > challans_per_tenant,
+                )
+                for seq in range(1, total + 1)
+            ]
+            execute_values(
+                cur,
+                """INSERT INTO challans (tenant_id, challan_no, customer_name, email, contact_number,
+                       serial_number, city, problem, accessories, warranty, dispatch_through, employee_id,
+                       items, images, status, created_at, otp_code, otp_expires_at)
+                   VALUES %s""",
+                rows,
+                page_size=1000,
+            )
+            # new challans continue after the seeded numbers
+            cur.execute(
+                "INSERT INTO challan_number_counters (tenant_id, next_value) VALUES (%s, %s)",
+                (tenant_id, total + 1),
+            )
+            seeded.append({
+                "tenant_id": tenant_id,
+                "user_id": user_id,
+                "token": generate_token({"tenant_id": tenant_id, "user_id": user_id, "name": f"Staff {t + 1}"}),
+                "challan_nos": [r[1] for r in rows[:challans_per_tenant]],
+                "otp_challan_nos": [r[1] for r in rows[challans_per_tenant:]],
+            })
+        cur.execute("ANALYZE")
+        conn.commit()
+        cur.close()
+    return seeded
+
+
+def cleanup_artifacts(seeded):
+    """Remove the PDF/QR folders the benchmark tenants produced."""
+    for tenant in seeded:
+        for folder in ("pdfs", "qr_codes"):
+            shutil.rmtree(os.path.join(STATIC_DIR, folder, str(tenant["tenant_id"])), ignore_errors=True)
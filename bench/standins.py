@@ -0,0 +1,208 @@
+"""
+Local stand-ins for the benchmark: Postgres, an SMTP sink and wkhtmltopdf.
+
+They only set environment variables, so this module must be used before
+anything from `utils`/`routes` is imported (utils.db reads DB_* on import).
+"""
+import os
+import sys
+import stat
+import shutil
+import tempfile
+import threading
+import socketserver
+import psycopg2
+from psycopg2 import extensions
+
+try:
+    import pgserver  # optional: self-contained Postgres binaries from pip
+except ImportError:
+    pgserver = None
+
+BENCH_DB_NAME = os.environ.get("BENCH_DB_NAME", "challan_bench")
+
+
+# ============================================================
+# 🔹 POSTGRES
+# ============================================================
+class Database:
+    """
+    A freshly created benchmark database, either in a throwaway pgserver
+    cluster ("pgserver") or on the server configured by DB_* ("existing").
+    """
+
+    def __init__(self, mode="auto", name=BENCH_DB_NAME):
+        if mode == "auto":
+            mode = "pgserver" if pgserver is not None else "existing"
+        if mode == "pgserver" and pgserver is None:
+            raise RuntimeError("pgserver is not installed (pip install pgserver) — use --db existing")
+        self.mode = mode
+        self.name = name
+        self._server = None
+        self._data_dir = None
+
+    def start(self):
+        if self.mode == "pgserver":
+            self._data_dir = tempfile.mkdtemp(prefix="challan-bench-pg-")
+            self._server = pgserver.get_server(self._data_dir, cleanup_mode="delete")
+            dsn = extensions.parse_dsn(self._server.get_uri())
+            admin = {
+                "host": dsn.get("host", "localhost"),
+                "port": dsn.get("port", "5432"),
+                "user": dsn.get("user", "postgres"),
+                "password": dsn.get("password", ""),
+            }
+        else:
+            admin = {
+                "host": os.environ.get("DB_HOST", "localhost"),
+                "port": os.environ.get("DB_PORT", "5432"),
+                "user": os.environ.get("DB_USER", "postgres"),
+                "password": os.environ.get("DB_PASS", "AutomanSolutions"),
+            }
+
+        conn = psycopg2.connect(dbname="postgres", **admin)
+        conn.autocommit = True
+        cur = conn.cursor()
+        cur.execute(f'DROP DATABASE IF EXISTS "{self.name}"')
+        cur.execute(f'CREATE DATABASE "{self.name}"')
+        cur.close()
+        conn.close()
+
+        os.environ.update({
+            "DB_HOST": admin["host"],
+            "DB_PORT": str(admin["port"]),
+            "DB_USER": admin["user"],
+            "DB_PASS": admin["password"] or "",
+            "DB_NAME": self.name,
+        })
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            try:
+                self._server.cleanup()
+            except Exception as e:
+                print("⚠️ Could not stop benchmark Postgres:", e)
+        if self._data_dir:
+            shutil.rmtree(self._data_dir, ignore_errors=True)
+
+
+# ============================================================
+# 🔹 SMTP SINK
+# ============================================================
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    """Just enough ESMTP for smtplib: accepts AUTH and every message."""
+
+    def handle(self):
+        sink = self.server.sink
+        with sink.lock:
+            sink.connections += 1
+        self._reply("220 bench-sink ready")
+        in_data = False
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if in_data:
+                if line.rstrip(b"\r\n") == b".":
+                    in_data = False
+                    with sink.lock:
+                        sink.messages += 1
+                    self._reply("250 OK queued")
+                continue
+            command = line.decode("utf-8", errors="replace").strip().upper()
+            if command.startswith("EHLO"):
+                self.wfile.write(b"250-bench-sink\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+            elif command.startswith("AUTH"):
+                self._reply("235 Authentication successful")
+            elif command.startswith("DATA"):
+                in_data = True
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+            elif command.startswith("QUIT"):
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("250 OK")
+
+    def _reply(self, text):
+        self.wfile.write((text + "\r\n").encode("ascii"))
+
+
+class _SmtpServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class SmtpSink:
+    """Local SMTP server that counts and discards messages."""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.lock = threading.Lock()
+        self.messages = 0
+        self.connections = 0
+        self._server = _SmtpServer((host, port), _SmtpHandler)
+        self._server.sink = self
+        self.host, self.port = self._server.server_address
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="smtp-sink", daemon=True).start()
+        os.environ.update({
+            "MAIL_SERVER": self.host,
+            "MAIL_PORT": str(self.port),
+            "MAIL_USE_TLS": "false",
+            "MAIL_USERNAME": "bench",
+            "MAIL_PASSWORD": "bench",
+            "MAIL_SENDER_EMAIL": "bench@example.com",
+        })
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# ============================================================
+# 🔹 STUB WKHTMLTOPDF
+# ============================================================
+# smallest well-formed one-page PDF; the stub writes it after an optional delay
+_STUB_SCRIPT = '''#!{python}
+import sys, time
+args = sys.argv[1:]
+if "--version" in args:
+    print("wkhtmltopdf 0.12.6 (bench stub)")
+    sys.exit(0)
+if args[-2] == "-":
+    sys.stdin.read()
+time.sleep({delay})
+pdf = (b"%PDF-1.4\\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\\n"
+       b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\\n"
+       b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 595 842]>>endobj\\n"
+       b"trailer<</Root 1 0 R>>\\n%%EOF\\n")
+if args[-1] == "-":
+    sys.stdout.buffer.write(pdf)
+else:
+    with open(args[-1], "wb") as f:
+        f.write(pdf)
+'''
+
+
+class StubWkhtmltopdf:
+    """Executable standing in for wkhtmltopdf (process spawn + fixed delay, no rendering)."""
+
+    def __init__(self, delay_ms=0):
+        self.delay_ms = delay_ms
+        self._dir = None
+        self.path = None
+
+    def start(self):
+        self._dir = tempfile.mkdtemp(prefix="challan-bench-bin-")
+        self.path = os.path.join(self._dir, "wkhtmltopdf")
+        with open(self.path, "w") as f:
+            f.write(_STUB_SCRIPT.format(python=sys.executable, delay=self.delay_ms / 1000.0))
+        os.chmod(self.path, os.stat(self.path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+        os.environ["WKHTMLTOPDF_BIN"] = self.path
+        return self
+
+    def stop(self):
+        if self._dir:
+            shutil.rmtree(self._dir, ignore_errors=True)
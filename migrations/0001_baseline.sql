@@ -0,0 +1,88 @@
+-- Baseline schema as deployed before migrations were introduced.
+-- Everything is IF NOT EXISTS so existing databases adopt it as a no-op.
+
+CREATE TABLE IF NOT EXISTS admin_users (
+    id SERIAL PRIMARY KEY,
+    full_name TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE,
+    password_hash TEXT NOT NULL,
+    role TEXT NOT NULL DEFAULT 'admin',
+    is_superadmin BOOLEAN NOT NULL DEFAULT FALSE,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+CREATE TABLE IF NOT EXISTS tenants (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE,
+    logo_url TEXT,
+    theme_color TEXT DEFAULT '#114e9e',
+    plan TEXT DEFAULT 'Free',
+    subscription_start DATE,
+    subscription_end DATE,
+    status TEXT NOT NULL DEFAULT 'active',
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    tenant_id INTEGER NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    password_hash TEXT NOT NULL,
+    role TEXT NOT NULL DEFAULT 'staff',
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id SERIAL PRIMARY KEY,
+    tenant_id INTEGER NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    plan_name TEXT NOT NULL,
+    price NUMERIC(12, 2),
+    start_date DATE,
+    end_date DATE,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE
+);
+CREATE TABLE IF NOT EXISTS activity_logs (
+    id SERIAL PRIMARY KEY,
+    admin_user_id INTEGER,
+    tenant_id INTEGER,
+    action_type TEXT NOT NULL,
+    description TEXT,
+    timestamp TIMESTAMP NOT NULL DEFAULT NOW()
+);
+CREATE TABLE IF NOT EXISTS tenant_settings (
+    tenant_id INTEGER PRIMARY KEY REFERENCES tenants(id) ON DELETE CASCADE,
+    branding_config JSONB,
+    challan_config JSONB,
+    email_config JSONB,
+    terms_conditions TEXT,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+CREATE TABLE IF NOT EXISTS challans (
+    id SERIAL PRIMARY KEY,
+    tenant_id INTEGER NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    challan_no TEXT NOT NULL,
+    customer_name TEXT NOT NULL,
+    email TEXT,
+    contact_number TEXT,
+    serial_number TEXT,
+    city TEXT,
+    problem TEXT,
+    accessories JSONB DEFAULT '[]'::jsonb,
+    warranty TEXT,
+    dispatch_through TEXT,
+    employee_id INTEGER,
+    items JSONB DEFAULT '[]'::jsonb,
+    images JSONB DEFAULT '[]'::jsonb,
+    status TEXT NOT NULL DEFAULT 'pending',
+    qr_code_url TEXT,
+    pdf_url TEXT,
+    email_sent BOOLEAN NOT NULL DEFAULT FALSE,
+    otp_code TEXT,
+    otp_expires_at TIMESTAMP,
+    delivered_at TIMESTAMP,
+    delivered_by INTEGER,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP
+);
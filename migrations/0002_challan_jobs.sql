@@ -0,0 +1,24 @@
+-- Durable job queue for challan QR/PDF/email generation (utils/jobs.py)
+CREATE TABLE IF NOT EXISTS challan_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    job_type TEXT NOT NULL,
+    tenant_id INTEGER,
+    challan_no TEXT,
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after TIMESTAMP NOT NULL DEFAULT NOW(),
+    locked_by TEXT,
+    locked_at TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    finished_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_challan_jobs_ready
+    ON challan_jobs (run_after, id) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_challan_jobs_challan
+    ON challan_jobs (tenant_id, challan_no);
+
+ALTER TABLE challans ADD COLUMN IF NOT EXISTS pdf_status TEXT NOT NULL DEFAULT 'ready';
+ALTER TABLE challans ADD COLUMN IF NOT EXISTS pdf_error TEXT;
@@ -0,0 +1,18 @@
+-- Content-addressed upload store (utils/blob_store.py)
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    ext TEXT NOT NULL DEFAULT '',
+    size_bytes BIGINT NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+CREATE TABLE IF NOT EXISTS challan_images (
+    tenant_id INTEGER NOT NULL,
+    challan_no TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    sha256 TEXT NOT NULL REFERENCES blobs(sha256),
+    original_name TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (tenant_id, challan_no, position)
+);
+CREATE INDEX IF NOT EXISTS idx_challan_images_sha ON challan_images (sha256);
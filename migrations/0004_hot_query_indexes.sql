@@ -0,0 +1,33 @@
+-- Indexes for the per-tenant challan queries and the admin listings.
+-- Check coverage with: python -m utils.migrations check-indexes
+
+-- single-challan lookups / updates (WHERE challan_no=%s AND tenant_id=%s).
+-- Fails if a tenant already has duplicate challan numbers; resolve those first.
+CREATE UNIQUE INDEX IF NOT EXISTS uq_challans_tenant_challan_no
+    ON challans (tenant_id, challan_no);
+
+-- challan list: keyset pagination on (created_at, challan_no) newest first
+CREATE INDEX IF NOT EXISTS idx_challans_tenant_created
+    ON challans (tenant_id, created_at DESC, challan_no DESC);
+
+-- dashboard counts and status filter
+CREATE INDEX IF NOT EXISTS idx_challans_tenant_status
+    ON challans (tenant_id, status);
+
+-- challan list filtered by employee
+CREATE INDEX IF NOT EXISTS idx_challans_tenant_employee_created
+    ON challans (tenant_id, employee_id, created_at DESC);
+
+-- challans still waiting for their customer email
+CREATE INDEX IF NOT EXISTS idx_challans_tenant_email_unsent
+    ON challans (tenant_id, created_at DESC) WHERE email_sent = FALSE;
+
+-- tenant login (WHERE u.email = %s) and per-tenant user listing
+CREATE INDEX IF NOT EXISTS idx_users_email ON users (email);
+CREATE INDEX IF NOT EXISTS idx_users_tenant_created ON users (tenant_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_subscriptions_tenant_start ON subscriptions (tenant_id, start_date DESC);
+CREATE INDEX IF NOT EXISTS idx_activity_logs_timestamp ON activity_logs (timestamp DESC);
+CREATE INDEX IF NOT EXISTS idx_activity_logs_tenant_timestamp ON activity_logs (tenant_id, timestamp DESC);
+
+ANALYZE challans;
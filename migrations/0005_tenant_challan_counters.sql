@@ -0,0 +1,70 @@
+-- Per-tenant challan counters for the dashboard, maintained by trigger.
+-- Verify / repair with: python -m utils.dashboard_counters reconcile
+CREATE TABLE IF NOT EXISTS tenant_challan_counters (
+    tenant_id INTEGER PRIMARY KEY,
+    total BIGINT NOT NULL DEFAULT 0,
+    pending BIGINT NOT NULL DEFAULT 0,
+    delivered BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION challan_counters_add(p_tenant INTEGER, p_status TEXT, p_sign INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO tenant_challan_counters AS c (tenant_id, total, pending, delivered, updated_at)
+    VALUES (
+        p_tenant,
+        p_sign,
+        CASE WHEN p_status = 'pending' THEN p_sign ELSE 0 END,
+        CASE WHEN p_status = 'delivered' THEN p_sign ELSE 0 END,
+        NOW()
+    )
+    ON CONFLICT (tenant_id) DO UPDATE SET
+        total = c.total + EXCLUDED.total,
+        pending = c.pending + EXCLUDED.pending,
+        delivered = c.delivered + EXCLUDED.delivered,
+        updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION challan_counters_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM challan_counters_add(OLD.tenant_id, OLD.status, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM challan_counters_add(NEW.tenant_id, NEW.status, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- block writers while the trigger is installed and the counters are seeded
+LOCK TABLE challans IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS trg_challan_counters_ins_del ON challans;
+CREATE TRIGGER trg_challan_counters_ins_del
+    AFTER INSERT OR DELETE ON challans
+    FOR EACH ROW EXECUTE FUNCTION challan_counters_trigger();
+
+DROP TRIGGER IF EXISTS trg_challan_counters_upd ON challans;
+CREATE TRIGGER trg_challan_counters_upd
+    AFTER UPDATE OF status, tenant_id ON challans
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status OR OLD.tenant_id IS DISTINCT FROM NEW.tenant_id)
+    EXECUTE FUNCTION challan_counters_trigger();
+
+INSERT INTO tenant_challan_counters (tenant_id, total, pending, delivered, updated_at)
+SELECT tenant_id,
+       COUNT(*),
+       COUNT(*) FILTER (WHERE status = 'pending'),
+       COUNT(*) FILTER (WHERE status = 'delivered'),
+       NOW()
+FROM challans
+GROUP BY tenant_id
+ON CONFLICT (tenant_id) DO UPDATE SET
+    total = EXCLUDED.total,
+    pending = EXCLUDED.pending,
+    delivered = EXCLUDED.delivered,
+    updated_at = NOW();
@@ -0,0 +1,94 @@
+-- Daily per-employee challan rollups for /api/tenant/dashboard/timeseries,
+-- maintained by trigger. Rebuild with: python -m utils.challan_rollups rebuild
+--
+-- created:   challans created that day by employee_id
+-- delivered: challans delivered that day by delivered_by (falling back to employee_id)
+-- turnaround_hist[i]: deliveries whose created_at -> delivered_at fell in bucket i,
+--   bounds in hours (keep in sync with TURNAROUND_BUCKET_HOURS in utils/challan_rollups.py):
+--   1, 2, 4, 8, 12, 24, 48, 72, 120, 168, 336, 720, +inf
+CREATE TABLE IF NOT EXISTS challan_daily_rollups (
+    tenant_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    employee_id INTEGER NOT NULL DEFAULT 0,
+    created INTEGER NOT NULL DEFAULT 0,
+    delivered INTEGER NOT NULL DEFAULT 0,
+    turnaround_seconds BIGINT NOT NULL DEFAULT 0,
+    turnaround_hist INTEGER[] NOT NULL DEFAULT ARRAY_FILL(0, ARRAY[13]),
+    PRIMARY KEY (tenant_id, day, employee_id)
+);
+
+CREATE OR REPLACE FUNCTION challan_turnaround_bucket(p_seconds DOUBLE PRECISION)
+RETURNS INTEGER AS $$
+    SELECT COALESCE(
+        (SELECT i FROM UNNEST(ARRAY[1, 2, 4, 8, 12, 24, 48, 72, 120, 168, 336, 720]) WITH ORDINALITY AS b(hours, i)
+         WHERE p_seconds <= b.hours * 3600 ORDER BY i LIMIT 1),
+        13
+    )::INTEGER;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION challan_rollup_apply(c challans, p_sign INTEGER)
+RETURNS VOID AS $$
+DECLARE
+    v_seconds DOUBLE PRECISION;
+    v_bucket INTEGER;
+    v_employee INTEGER;
+BEGIN
+    IF c.created_at IS NOT NULL THEN
+        INSERT INTO challan_daily_rollups (tenant_id, day, employee_id)
+        VALUES (c.tenant_id, c.created_at::date, COALESCE(c.employee_id, 0))
+        ON CONFLICT DO NOTHING;
+        UPDATE challan_daily_rollups SET created = created + p_sign
+        WHERE tenant_id = c.tenant_id AND day = c.created_at::date AND employee_id = COALESCE(c.employee_id, 0);
+    END IF;
+
+    IF c.status = 'delivered' AND c.delivered_at IS NOT NULL THEN
+        v_employee := COALESCE(c.delivered_by, c.employee_id, 0);
+        v_seconds := GREATEST(EXTRACT(EPOCH FROM c.delivered_at - c.created_at), 0);
+        v_bucket := challan_turnaround_bucket(v_seconds);
+        INSERT INTO challan_daily_rollups (tenant_id, day, employee_id)
+        VALUES (c.tenant_id, c.delivered_at::date, v_employee)
+        ON CONFLICT DO NOTHING;
+        UPDATE challan_daily_rollups
+        SET delivered = delivered + p_sign,
+            turnaround_seconds = turnaround_seconds + p_sign * v_seconds::BIGINT,
+            turnaround_hist[v_bucket] = turnaround_hist[v_bucket] + p_sign
+        WHERE tenant_id = c.tenant_id AND day = c.delivered_at::date AND employee_id = v_employee;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION challan_rollups_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM challan_rollup_apply(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM challan_rollup_apply(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+LOCK TABLE challans IN SHARE ROW EXCLUSIVE MODE;
+
+DROP TRIGGER IF EXISTS trg_challan_rollups_ins_del ON challans;
+CREATE TRIGGER trg_challan_rollups_ins_del
+    AFTER INSERT OR DELETE ON challans
+    FOR EACH ROW EXECUTE FUNCTION challan_rollups_trigger();
+
+DROP TRIGGER IF EXISTS trg_challan_rollups_upd ON challans;
+CREATE TRIGGER trg_challan_rollups_upd
+    AFTER UPDATE OF tenant_id, created_at, employee_id, status, delivered_at, delivered_by ON challans
+    FOR EACH ROW
+    WHEN (OLD.tenant_id IS DISTINCT FROM NEW.tenant_id
+       OR OLD.created_at IS DISTINCT FROM NEW.created_at
+       OR OLD.employee_id IS DISTINCT FROM NEW.employee_id
+       OR OLD.status IS DISTINCT FROM NEW.status
+       OR OLD.delivered_at IS DISTINCT FROM NEW.delivered_at
+       OR OLD.delivered_by IS DISTINCT FROM NEW.delivered_by)
+    EXECUTE FUNCTION challan_rollups_trigger();
+
+-- backfill from existing challans
+DELETE FROM challan_daily_rollups;
+SELECT challan_rollup_apply(c, 1) FROM challans c;
@@ -0,0 +1,25 @@
+-- Durable outbox for customer emails (utils/email_outbox.py)
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    tenant_id INTEGER,
+    challan_no TEXT,
+    kind TEXT NOT NULL,
+    to_email TEXT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 8,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMP,
+    locked_by TEXT,
+    locked_at TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    sent_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_email_outbox_ready
+    ON email_outbox (next_attempt_at, id) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_email_outbox_sending
+    ON email_outbox (locked_at) WHERE status = 'sending';
+CREATE INDEX IF NOT EXISTS idx_email_outbox_challan
+    ON email_outbox (tenant_id, challan_no);
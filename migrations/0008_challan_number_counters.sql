@@ -0,0 +1,7 @@
+-- Per-tenant challan number sequence (utils/challan_numbers.py).
+-- Processes reserve blocks of numbers with one UPDATE per block.
+CREATE TABLE IF NOT EXISTS challan_number_counters (
+    tenant_id INTEGER PRIMARY KEY,
+    next_value BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
@@ -0,0 +1,7 @@
+-- Reclaim branch of the worker claim query (status='running' AND locked_at < ...);
+-- without it every claim seq-scans the whole job history
+CREATE INDEX IF NOT EXISTS idx_challan_jobs_running
+    ON challan_jobs (locked_at) WHERE status = 'running';
+-- Settled jobs are pruned by age (utils/jobs.prune_jobs)
+CREATE INDEX IF NOT EXISTS idx_challan_jobs_settled
+    ON challan_jobs (finished_at) WHERE status IN ('done', 'superseded', 'failed');
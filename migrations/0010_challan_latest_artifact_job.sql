@@ -0,0 +1,4 @@
+-- The artifact job whose output may be published for a challan
+-- (utils/challan_artifacts.py). A job that was superseded while already
+-- running must not overwrite the PDF of the newer one.
+ALTER TABLE challans ADD COLUMN IF NOT EXISTS latest_artifact_job_id BIGINT;
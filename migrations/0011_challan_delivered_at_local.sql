@@ -0,0 +1,48 @@
+-- delivered_at was written from Python's utcnow() while created_at comes from
+-- the database's NOW(), so turnaround was off by the server's UTC offset (and
+-- clamped to 0 when that made it negative). verify_otp now sets
+-- delivered_at=NOW(); convert the existing UTC values to the same clock, drop
+-- the clamp and rebuild the rollups (utils/challan_rollups.py).
+
+CREATE OR REPLACE FUNCTION challan_rollup_apply(c challans, p_sign INTEGER)
+RETURNS VOID AS $$
+DECLARE
+    v_seconds DOUBLE PRECISION;
+    v_bucket INTEGER;
+    v_employee INTEGER;
+BEGIN
+    IF c.created_at IS NOT NULL THEN
+        INSERT INTO challan_daily_rollups (tenant_id, day, employee_id)
+        VALUES (c.tenant_id, c.created_at::date, COALESCE(c.employee_id, 0))
+        ON CONFLICT DO NOTHING;
+        UPDATE challan_daily_rollups SET created = created + p_sign
+        WHERE tenant_id = c.tenant_id AND day = c.created_at::date AND employee_id = COALESCE(c.employee_id, 0);
+    END IF;
+
+    IF c.status = 'delivered' AND c.delivered_at IS NOT NULL THEN
+        v_employee := COALESCE(c.delivered_by, c.employee_id, 0);
+        v_seconds := EXTRACT(EPOCH FROM c.delivered_at - c.created_at);
+        v_bucket := challan_turnaround_bucket(v_seconds);
+        INSERT INTO challan_daily_rollups (tenant_id, day, employee_id)
+        VALUES (c.tenant_id, c.delivered_at::date, v_employee)
+        ON CONFLICT DO NOTHING;
+        UPDATE challan_daily_rollups
+        SET delivered = delivered + p_sign,
+            turnaround_seconds = turnaround_seconds + p_sign * v_seconds::BIGINT,
+            turnaround_hist[v_bucket] = turnaround_hist[v_bucket] + p_sign
+        WHERE tenant_id = c.tenant_id AND day = c.delivered_at::date AND employee_id = v_employee;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+LOCK TABLE challans IN SHARE ROW EXCLUSIVE MODE;
+
+-- UTC wall time -> the session time zone NOW() uses for created_at
+ALTER TABLE challans DISABLE TRIGGER trg_challan_rollups_upd;
+UPDATE challans SET delivered_at = (delivered_at AT TIME ZONE 'UTC')::timestamp
+WHERE delivered_at IS NOT NULL;
+ALTER TABLE challans ENABLE TRIGGER trg_challan_rollups_upd;
+
+-- rebuild (same as python -m utils.challan_rollups rebuild)
+DELETE FROM challan_daily_rollups;
+SELECT challan_rollup_apply(c, 1) FROM challans c;
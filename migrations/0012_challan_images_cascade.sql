@@ -0,0 +1,33 @@
+-- challan_images rows follow their challan (e.g. when a tenant is deleted and
+-- its challans cascade away), and blobs.ref_count follows challan_images.
+-- Blobs left at ref_count 0 are removed from disk by utils.blob_store
+-- (detach_blobs / sweep_unreferenced_blobs).
+
+-- references whose challan is already gone
+DELETE FROM challan_images ci
+WHERE NOT EXISTS (
+    SELECT 1 FROM challans c WHERE c.tenant_id = ci.tenant_id AND c.challan_no = ci.challan_no
+);
+-- recount from what is left (fixes counts the deleted rows held up)
+UPDATE blobs b SET ref_count = COALESCE(
+    (SELECT COUNT(*) FROM challan_images ci WHERE ci.sha256 = b.sha256), 0);
+
+ALTER TABLE challan_images DROP CONSTRAINT IF EXISTS fk_challan_images_challan;
+ALTER TABLE challan_images ADD CONSTRAINT fk_challan_images_challan
+    FOREIGN KEY (tenant_id, challan_no) REFERENCES challans (tenant_id, challan_no) ON DELETE CASCADE
+    -- create_challan attaches images before inserting the challan row
+    DEFERRABLE INITIALLY DEFERRED;
+
+-- increments stay in attach_blobs' upsert, which must create the row first
+CREATE OR REPLACE FUNCTION challan_images_release_blob()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE blobs SET ref_count = GREATEST(ref_count - 1, 0) WHERE sha256 = OLD.sha256;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_challan_images_release_blob ON challan_images;
+CREATE TRIGGER trg_challan_images_release_blob
+    AFTER DELETE ON challan_images
+    FOR EACH ROW EXECUTE FUNCTION challan_images_release_blob();
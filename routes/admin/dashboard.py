@@ -1,5 +1,14 @@
 from flask import Blueprint, jsonify
-from utils.db import get_db_connection
+from utils.db import get_db_connection, get_pool_stats
+from utils.pdf_renderer import get_render_stats
+from utils.pdf_cache import pdf_cache
+from utils.uploads import get_upload_stats
+from utils.smtp_pool import get_smtp_pool_stats
+from utils.email_outbox import outbox_stats
+from utils.executor import get_executor_stats
+from utils.tenant_config import get_tenant_config_stats
+from utils.challan_numbers import get_allocator_stats
+from utils.query_log import get_query_stats
 from utils.auth import admin_token_required
 
 # ✅ Blueprint renamed for clarity
@@ -77,3 +86,131 @@ def admin_dashboard_summary():
     finally:
         if conn:
             conn.close()
+
+
+# ============================================================
+# 🩺 DB Connection Pool Stats (per worker process)
+# ============================================================
+@admin_dashboard_bp.route("/dashboard/db_pool", methods=["GET"])
+@admin_token_required
+def admin_db_pool_stats():
+    """
+    Returns the connection pool snapshot of the worker serving the request:
+      - size / in_use / idle / waiting
+      - checkouts, timeouts, discarded connections
+      - average & max checkout latency (ms)
+    """
+    return jsonify({"db_pool": get_pool_stats()}), 200
+
+
+# ============================================================
+# 🧾 PDF Renderer Stats (per worker process)
+# ============================================================
+@admin_dashboard_bp.route("/dashboard/pdf_renderer", methods=["GET"])
+@admin_token_required
+def admin_pdf_renderer_stats():
+    """
+    Returns render pool usage and timings (template, queue wait,
+    wkhtmltopdf, total) plus PDF cache hit/miss counters for the
+    process serving the request.
+    """
+    return jsonify({"pdf_renderer": get_render_stats(), "pdf_cache": pdf_cache.stats()}), 200
+
+
+# ============================================================
+# 📤 Upload Throughput Stats (per worker process)
+# ============================================================
+@admin_dashboard_bp.route("/dashboard/uploads", methods=["GET"])
+@admin_token_required
+def admin_upload_stats():
+    """
+    Returns streamed upload counters for the process serving the request:
+      - files, bytes, largest file, rejected (too large)
+      - average throughput (MB/s) and configured limits
+    """
+    return jsonify({"uploads": get_upload_stats()}), 200
+
+
+# ============================================================
+# ✉️ SMTP Session Pool Stats (per worker process)
+# ============================================================
+@admin_dashboard_bp.route("/dashboard/smtp_pool", methods=["GET"])
+@admin_token_required
+def admin_smtp_pool_stats():
+    """
+    Returns pooled SMTP session usage for the process serving the request:
+      - open / idle sessions and sender keys
+      - connects vs reused sessions, reconnects, keepalive failures, idle evictions
+    """
+    return jsonify({"smtp_pool": get_smtp_pool_stats()}), 200
+
+
+# ============================================================
+# 📬 Email Outbox
+# ============================================================
+@admin_dashboard_bp.route("/dashboard/email_outbox", methods=["GET"])
+@admin_token_required
+def admin_email_outbox_stats():
+    """
+    Returns outbox rows by status (queued / sending / sent / failed /
+    expired / superseded) and how long the oldest due email has waited.
+    """
+    try:
+        return jsonify({"email_outbox": outbox_stats()}), 200
+    except Exception as e:
+        print("❌ Email outbox stats error:", e)
+        return jsonify({"error": "Failed to fetch email outbox stats"}), 500
+
+
+# ============================================================
+# 🧵 Background Executor Stats (per worker process)
+# ============================================================
+@admin_dashboard_bp.route("/dashboard/executor", methods=["GET"])
+@admin_token_required
+def admin_executor_stats():
+    """
+    Returns the shared background executor's state for the process serving
+    the request: queue depth (current / peak), running, rejected (saturated)
+    submissions and task wait / run latency percentiles.
+    """
+    return jsonify({"executor": get_executor_stats()}), 200
+
+
+# ============================================================
+# 🏷️ Tenant Config Cache Stats (per worker process)
+# ============================================================
+@admin_dashboard_bp.route("/dashboard/tenant_config_cache", methods=["GET"])
+@admin_token_required
+def admin_tenant_config_cache_stats():
+    """
+    Returns the tenant settings cache counters for the process serving the
+    request: hits / misses / hit rate, shared (redis) hits, loads from
+    Postgres, invalidations and LRU evictions.
+    """
+    return jsonify({"tenant_config_cache": get_tenant_config_stats()}), 200
+
+
+# ============================================================
+# 🔢 Challan Number Allocator (per worker process)
+# ============================================================
+@admin_dashboard_bp.route("/dashboard/challan_numbers", methods=["GET"])
+@admin_token_required
+def admin_challan_number_stats():
+    """
+    Returns numbers handed out and blocks reserved by the process serving
+    the request, plus how many reserved values it still holds.
+    """
+    return jsonify({"challan_numbers": get_allocator_stats()}), 200
+
+
+# ============================================================
+# 🐢 Slow Queries (per worker process)
+# ============================================================
+@admin_dashboard_bp.route("/dashboard/slow_queries", methods=["GET"])
+@admin_token_required
+def admin_slow_query_stats():
+    """
+    Returns statement counts for the process serving the request and the
+    slowest normalized statements above SLOW_QUERY_MS (no parameter values).
+    """
+    return jsonify({"queries": get_query_stats()}), 200
@@ -4,6 +4,14 @@ from utils.auth import admin_token_required
 
 logs_bp = Blueprint("logs", __name__)
 
+# also EXPLAINed by `python -m utils.migrations check-indexes`
+RECENT_LOGS_SQL = """
+    SELECT id, admin_user_id, tenant_id, action_type, description, timestamp
+    FROM activity_logs
+    ORDER BY timestamp DESC
+    LIMIT 10
+"""
+
 @logs_bp.route("/logs", methods=["GET"])
 @admin_token_required
 def get_logs():
@@ -11,12 +19,7 @@ def get_logs():
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute("""
-            SELECT id, admin_user_id, tenant_id, action_type, description, timestamp
-            FROM activity_logs
-            ORDER BY timestamp DESC
-            LIMIT 10
-        """)
+        cur.execute(RECENT_LOGS_SQL)
         logs = cur.fetchall()
         cur.close()
         conn.close()
@@ -7,6 +7,12 @@ from datetime import datetime
 
 subscriptions_bp = Blueprint("subscriptions", __name__, url_prefix="/admin/subscriptions")
 
+# also EXPLAINed by `python -m utils.migrations check-indexes`
+TENANT_SUBSCRIPTIONS_SQL = (
+    "SELECT id, tenant_id, plan_name, price, start_date, end_date, is_active "
+    "FROM subscriptions WHERE tenant_id=%s ORDER BY start_date DESC"
+)
+
 
 @subscriptions_bp.route("/<int:tenant_id>", methods=["GET"])
 @admin_token_required
@@ -14,7 +20,7 @@ def list_subscriptions(tenant_id):
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute("SELECT id, tenant_id, plan_name, price, start_date, end_date, is_active FROM subscriptions WHERE tenant_id=%s ORDER BY start_date DESC", (tenant_id,))
+        cur.execute(TENANT_SUBSCRIPTIONS_SQL, (tenant_id,))
         rows = cur.fetchall()
         cur.close()
         conn.close()
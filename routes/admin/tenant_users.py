@@ -7,6 +7,14 @@ import json
 
 tenant_users_bp = Blueprint("tenant_users", __name__)
 
+# also EXPLAINed by `python -m utils.migrations check-indexes`
+LIST_USERS_SQL = """
+    SELECT id, tenant_id, name, email, role, created_at, is_active
+    FROM users
+    WHERE tenant_id=%s
+    ORDER BY created_at DESC
+"""
+
 # --------------------------------------------------------------------
 # 🔹 List All Users for a Tenant
 # --------------------------------------------------------------------
@@ -18,12 +26,7 @@ def list_users(tenant_id):
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute("""
-            SELECT id, tenant_id, name, email, role, created_at, is_active
-            FROM users
-            WHERE tenant_id=%s
-            ORDER BY created_at DESC
-        """, (tenant_id,))
+        cur.execute(LIST_USERS_SQL, (tenant_id,))
         rows = cur.fetchall()
         cur.close()
         conn.close()
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from utils.db import get_db_connection
+from utils.blob_store import sweep_unreferenced_blobs
 from werkzeug.utils import secure_filename
 import os, json, psycopg2.extras
 from datetime import datetime
@@ -238,6 +239,11 @@ def delete_tenant(tenant_id):
 
         cur.close()
         conn.close()
+        # challan images cascaded away with the tenant; free their files
+        try:
+            sweep_unreferenced_blobs()
+        except Exception as e:
+            print("⚠️ Blob sweep after tenant delete failed:", e)
         return jsonify({"message": "🗑️ Tenant deleted successfully"}), 200
 
     except Exception as e:
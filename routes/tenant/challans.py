@@ -1,19 +1,25 @@
 # routes/tenant/challans.py
-from flask import Blueprint, request, jsonify
-from utils.db import get_db_connection
+from flask import Blueprint, request, jsonify, Response
+from werkzeug.exceptions import RequestEntityTooLarge
+from utils.db import get_db_connection, db_connection
 from utils.auth import tenant_token_required
 from datetime import datetime, timedelta
 import json
 import os
-import threading
+import base64
 import random
+from psycopg2.extras import execute_values
 
 # utils that you already have in project
-from utils.pdf_qr_utils import generate_and_save_qr, generate_pdf
-from utils.email_utils import (
-    send_challan_email,
-    send_otp_email,
-    send_delivery_confirmation_email,send_Update_challan_email
+from utils.email_outbox import enqueue_email, dispatch_email
+from utils.challan_artifacts import enqueue_challan_artifacts, enqueue_batch_artifacts, artifact_status
+from utils.jobs import wait_for
+from utils.image_utils import rendition_for
+from utils.blob_store import stage_upload, attach_blobs, detach_blobs, remove_orphaned_blobs
+from utils.challan_numbers import allocate_challan_no, allocate_challan_numbers
+from utils.challan_export import (
+    FORMATS as EXPORT_FORMATS, ExportTooLarge, ExportNotReady, find_export_rows, build_export, merge_available,
+    stream_file,
 )
 
 challans_bp = Blueprint("challans", __name__)
@@ -32,57 +38,12 @@ def _safe_json_load(v):
     except Exception:
         return []
 
-def _safe_json_obj(v):
-    """Return dict from JSON-like data or empty dict."""
-    if v is None:
-        return {}
-    if isinstance(v, dict):
-        return v
-    try:
-        return json.loads(v)
-    except Exception:
-        return {}
-
-def _absolute_static_url(path):
-    """Return absolute URL for static resources; returns None for falsy path."""
-    if not path:
-        return None
-    if path.startswith("http://") or path.startswith("https://"):
-        return path
-    # adjust host/port if deploying elsewhere
-    base = request.host_url.rstrip("/")
-    # ensure path starts with slash
-    if not path.startswith("/"):
-        path = "/" + path
-    return f"{base}{path}"
-
 def _safe_lstrip_path(p):
     """Lstrip leading slash safely, return None if falsy."""
     if not p:
         return None
     return p.lstrip("/")
 
-def _build_qr_payload(challan_record: dict):
-    """
-    Build QR payload string. Per your request, include all data
-    except customer name, customer phone number, and customer city.
-    Return JSON string.
-    """
-    # Copy and remove protected fields
-    payload = dict(challan_record)  # shallow copy
-    for k in ("customer_name", "contact_number", "city", "email"):
-        # remove customer-identifying info except if you want email included — you requested to not include name, phone, city
-        if k in payload:
-            payload.pop(k, None)
-    # Add generated_on timestamp
-    payload["qr_generated_at"] = datetime.utcnow().isoformat()
-    # Convert non-serializable values
-    try:
-        return json.dumps(payload, default=str)
-    except Exception:
-        # fallback: minimal string
-        return f"Challan:{payload.get('challan_no','-')}"
-
 # -----------------------
 # 1) Send OTP
 # -----------------------
@@ -125,20 +86,30 @@ def send_otp(challan_no):
             "UPDATE challans SET otp_code=%s, otp_expires_at=%s WHERE challan_no=%s AND tenant_id=%s",
             (otp_code, otp_expires, challan_no, tenant_id),
         )
+        # queued with the OTP itself; an OTP that cannot go out before it expires is dropped
+        email_id = enqueue_email(
+            cur, tenant_id, "otp", email,
+            {
+                "customer_name": customer_name,
+                "challan_no": challan_no,
+                "otp_code": otp_code,
+                "ttl_minutes": ttl_minutes,
+            },
+            challan_no=challan_no,
+            expires_in_seconds=ttl_minutes * 60,
+        )
         conn.commit()
-
-        # Send email in background
-        def _bg_send():
-            try:
-                send_otp_email(tenant_id, email, customer_name, challan_no, otp_code, ttl_minutes)
-            except Exception as e:
-                print("❌ Error sending OTP email:", e)
-
-        threading.Thread(target=_bg_send, daemon=True).start()
         cur.close()
         conn.close()
 
-        return jsonify({"message": f"OTP sent to {email}", "expires_in_minutes": ttl_minutes}), 200
+        # send now on the shared executor; when it is saturated an outbox worker picks it up
+        immediate = dispatch_email(email_id)
+
+        return jsonify({
+            "message": f"OTP sent to {email}",
+            "expires_in_minutes": ttl_minutes,
+            "email_delivery": "immediate" if immediate else "queued",
+        }), 200
 
     except Exception as e:
         print("❌ send_otp error:", e)
@@ -207,73 +178,50 @@ def verify_otp(challan_no):
             conn.close()
             return jsonify({"error": "OTP has expired. Please generate a new one."}), 400
 
-        # mark delivered
-        delivered_at = datetime.utcnow()
+        # mark delivered; DB clock like created_at, so turnaround and day buckets line up
         cur.execute(
             """UPDATE challans
                SET status='delivered',
-                   delivered_at=%s,
+                   delivered_at=NOW(),
                    delivered_by=%s,
                    otp_code=NULL,
                    otp_expires_at=NULL,
                    updated_at=NOW()
-               WHERE challan_no=%s AND tenant_id=%s""",
-            (delivered_at, user_id, challan_no, tenant_id),
+               WHERE challan_no=%s AND tenant_id=%s
+               RETURNING delivered_at""",
+            (user_id, challan_no, tenant_id),
         )
-        conn.commit()
+        delivered_at = cur.fetchone()[0]
 
-        # prepare attachments if available
-        pdf_file_path = None
-        if pdf_url:
-            safe_pdf_rel = _safe_lstrip_path(pdf_url)
-            if safe_pdf_rel:
-                pdf_file_path = os.path.join(os.getcwd(), safe_pdf_rel)
-                if not os.path.exists(pdf_file_path):
-                    # if not exists, set to None
-                    pdf_file_path = None
-
-        image_paths = []
-        try:
-            imgs = _safe_json_load(images_json)
-            for p in imgs:
+        # confirmation email (PDF + images) goes through the outbox in the same
+        # transaction; email_sent is set by the outbox once it is delivered
+        email_id = None
+        if customer_email:
+            image_paths = []
+            for p in _safe_json_load(images_json):
                 rel = _safe_lstrip_path(str(p))
                 if rel:
-                    full = os.path.join(os.getcwd(), rel)
-                    if os.path.exists(full):
-                        image_paths.append(full)
-        except Exception:
-            image_paths = []
-
-        # send confirmation email in background (if email present)
-        if customer_email:
-            def _bg_confirm():
-                try:
-                    send_delivery_confirmation_email(
-                        tenant_id=tenant_id,
-                        to_email=customer_email,
-                        customer_name=customer_name,
-                        challan_no=challan_no,
-                        delivered_at=delivered_at,
-                        delivered_by=user_name,
-                        pdf_path=pdf_file_path,
-                        image_paths=image_paths,
-                    )
-                except Exception as e:
-                    print("❌ delivery confirmation email error:", e)
-
-            threading.Thread(target=_bg_confirm, daemon=True).start()
-
-            # mark email_sent true
-            try:
-                cur.execute("UPDATE challans SET email_sent=TRUE WHERE challan_no=%s AND tenant_id=%s",
-                            (challan_no, tenant_id))
-                conn.commit()
-            except Exception:
-                pass
+                    image_paths.append(rendition_for(rel, "email"))
+            email_id = enqueue_email(
+                cur, tenant_id, "delivery_confirmation", customer_email,
+                {
+                    "customer_name": customer_name,
+                    "challan_no": challan_no,
+                    "delivered_at": delivered_at.isoformat(),
+                    "delivered_by": user_name,
+                    "pdf_path": _safe_lstrip_path(pdf_url),
+                    "image_paths": image_paths,
+                },
+                challan_no=challan_no,
+            )
+        conn.commit()
 
         cur.close()
         conn.close()
 
+        if email_id:
+            dispatch_email(email_id)
+
         return jsonify({
             "message": "✅ OTP verified successfully. Challan marked as delivered.",
             "delivered_at": delivered_at.strftime("%Y-%m-%d %H:%M:%S")
@@ -295,66 +243,353 @@ def verify_otp(challan_no):
                 pass
 
 # -----------------------
-# 3) Get all challans
+# 3) List challans (keyset paginated)
 # -----------------------
+# output field -> SQL column; "date" is formatted from created_at
+_LIST_COLUMNS = {
+    "challan_no": "challan_no",
+    "customer_name": "customer_name",
+    "serial_number": "serial_number",
+    "problem": "problem",
+    "status": "status",
+    "date": "created_at",
+    "employee_id": "employee_id",
+    "qr_code_url": "qr_code_url",
+    "pdf_url": "pdf_url",
+    "email_sent": "email_sent",
+}
+# GET /challan/<no>
+SINGLE_CHALLAN_SQL = """
+SELECT challan_no, customer_name, email, contact_number, serial_number, city, problem,
+       accessories, warranty, dispatch_through, employee_id, items, status, created_at,
+       qr_code_url, pdf_url, images
+FROM challans WHERE challan_no=%s AND tenant_id=%s
+"""
+_LIST_DEFAULT_LIMIT = 50
+_LIST_MAX_LIMIT = 200
+# estimated totals below this are cheap enough to count exactly
+_EXACT_COUNT_THRESHOLD = 5000
+
+
+def _encode_cursor(created_at, challan_no):
+    raw = json.dumps([created_at.isoformat(), challan_no]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor):
+    """Return (created_at, challan_no) or raise ValueError."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    created_at, challan_no = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    return datetime.fromisoformat(created_at), str(challan_no)
+
+
+def _parse_bool(v):
+    if v is None or v == "":
+        return None
+    v = str(v).strip().lower()
+    if v in ("1", "true", "yes"):
+        return True
+    if v in ("0", "false", "no"):
+        return False
+    raise ValueError("expected true/false")
+
+
+def _estimate_rows(cur, sql, params):
+    """Planner row estimate for a query (no execution)."""
+    cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def challan_list_query(tenant_id, columns, status=None, employee_id=None, email_sent=None,
+                       date_from=None, date_to=None, cursor=None, limit=None):
+    """
+    SQL for one GET /challans page (also EXPLAINed by the index coverage
+    check). Returns (page_sql, page_params, filter_sql, filter_params);
+    the filter part is reused for counting.
+    """
+    where = ["tenant_id=%s"]
+    params = [tenant_id]
+    if status:
+        where.append("status=%s")
+        params.append(status)
+    if employee_id is not None:
+        where.append("employee_id=%s")
+        params.append(employee_id)
+    if email_sent is not None:
+        where.append("email_sent=%s")
+        params.append(email_sent)
+    if date_from:
+        where.append("created_at >= %s")
+        params.append(date_from)
+    if date_to:
+        where.append("created_at < %s")
+        params.append(date_to)
+    filter_sql = " AND ".join(where)
+
+    page_sql = f"SELECT {', '.join(columns)} FROM challans WHERE {filter_sql}"
+    page_params = list(params)
+    if cursor:
+        page_sql += " AND (created_at, challan_no) < (%s, %s)"
+        page_params += list(cursor)
+    page_sql += " ORDER BY created_at DESC, challan_no DESC"
+    if limit is not None:
+        page_sql += " LIMIT %s"
+        page_params.append(limit)
+    return page_sql, page_params, filter_sql, params
+
+
 @challans_bp.route("/challans", methods=["GET"])
 @tenant_token_required
 def get_challans():
     """
-    Return all challans for the logged-in tenant.
+    List challans for the logged-in tenant, newest first.
     Date is returned as string "DD/MM/YYYY, hh:mm:ss AM/PM" for frontend.
+
+    Without `limit` or `cursor` the response is the plain JSON list of every
+    matching challan, as before pagination existed. With either of them it is
+    one page: {"challans", "next_cursor", "total", "total_is_estimate"}.
+
+    Query params:
+      - limit (default 50, max 200), cursor (next_cursor of the previous page)
+      - status, employee_id, email_sent (true/false)
+      - date_from / date_to (YYYY-MM-DD, inclusive)
+      - fields: comma separated subset of the list columns
+      - count: none (default) | estimate | exact (paged responses only)
     """
     try:
         tenant_id = request.tenant.get("tenant_id")
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(
-            """SELECT challan_no, customer_name, serial_number, problem, status, created_at,
-                      employee_id, qr_code_url, pdf_url, email_sent
-               FROM challans
-               WHERE tenant_id=%s
-               ORDER BY created_at DESC""",
-            (tenant_id,),
+        args = request.args
+        paged = "limit" in args or "cursor" in args
+
+        try:
+            limit = min(max(int(args.get("limit", _LIST_DEFAULT_LIMIT)), 1), _LIST_MAX_LIMIT) if paged else None
+            cursor = _decode_cursor(args["cursor"]) if args.get("cursor") else None
+            email_sent = _parse_bool(args.get("email_sent"))
+            employee_id = int(args["employee_id"]) if args.get("employee_id") else None
+            date_from = datetime.strptime(args["date_from"], "%Y-%m-%d") if args.get("date_from") else None
+            date_to = datetime.strptime(args["date_to"], "%Y-%m-%d") + timedelta(days=1) if args.get("date_to") else None
+        except (ValueError, TypeError, KeyError) as e:
+            return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+
+        count_mode = args.get("count", "none")
+        if count_mode not in ("none", "estimate", "exact"):
+            return jsonify({"error": "count must be one of none, estimate, exact"}), 400
+
+        if args.get("fields"):
+            fields = [f.strip() for f in args["fields"].split(",") if f.strip()]
+            unknown = [f for f in fields if f not in _LIST_COLUMNS]
+            if unknown:
+                return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+        else:
+            fields = list(_LIST_COLUMNS)
+
+        # created_at + challan_no are always read: they form the cursor
+        columns = ["created_at", "challan_no"] + [
+            _LIST_COLUMNS[f] for f in fields if _LIST_COLUMNS[f] not in ("created_at", "challan_no")
+        ]
+        page_sql, page_params, filter_sql, params = challan_list_query(
+            tenant_id, columns,
+            status=args.get("status") or None, employee_id=employee_id, email_sent=email_sent,
+            date_from=date_from, date_to=date_to, cursor=cursor,
+            limit=limit + 1 if paged else None,
         )
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
+
+        total = None
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(page_sql, page_params)
+            rows = cur.fetchall()
+
+            if paged and count_mode != "none":
+                count_sql = f"SELECT COUNT(*) FROM challans WHERE {filter_sql}"
+                if count_mode == "estimate":
+                    total = _estimate_rows(cur, count_sql.replace("COUNT(*)", "1", 1), params)
+                if count_mode == "exact" or total < _EXACT_COUNT_THRESHOLD:
+                    cur.execute(count_sql, params)
+                    total = cur.fetchone()[0]
+                    count_mode = "exact"
+            cur.close()
+
+        has_more = paged and len(rows) > limit
+        if paged:
+            rows = rows[:limit]
 
         challans = []
         for r in rows:
-            created_at = r[5]
-            created_str = created_at.strftime("%d/%m/%Y, %I:%M:%S %p") if created_at else ""
-            challans.append({
-                "challan_no": r[0],
-                "customer_name": r[1],
-                "serial_number": r[2],
-                "problem": r[3],
-                "status": r[4],
-                "date": created_str,
-                "employee_id": r[6],
-                "qr_code_url": r[7],
-                "pdf_url": r[8],
-                "email_sent": r[9],
-            })
+            record = dict(zip(columns, r))
+            item = {}
+            for f in fields:
+                if f == "date":
+                    created_at = record["created_at"]
+                    item["date"] = created_at.strftime("%d/%m/%Y, %I:%M:%S %p") if created_at else ""
+                else:
+                    item[f] = record[_LIST_COLUMNS[f]]
+            challans.append(item)
+
+        if not paged:
+            return jsonify(challans), 200
 
-        return jsonify(challans), 200
+        next_cursor = _encode_cursor(rows[-1][0], rows[-1][1]) if has_more and rows else None
+
+        return jsonify({
+            "challans": challans,
+            "next_cursor": next_cursor,
+            "total": total,
+            "total_is_estimate": count_mode == "estimate",
+        }), 200
 
     except Exception as e:
         print("❌ get_challans error:", e)
         return jsonify({"error": "Failed to fetch challans"}), 500
 
+# -----------------------
+# 3b) Export challans (merged PDF / ZIP)
+# -----------------------
+@challans_bp.route("/challans/export", methods=["GET"])
+@tenant_token_required
+def export_challans():
+    """
+    Download the PDFs of a filtered set of challans as one merged PDF
+    (default) or a ZIP, oldest first.
+
+    Query params:
+      - format: pdf | zip
+      - date_from / date_to (YYYY-MM-DD, inclusive), status
+    Challans whose PDF could not be produced are listed in X-Export-Missing.
+    Returns 409 when too many PDFs would have to be rendered inline and 400
+    when the set (or merged PDF) is too large.
+    """
+    try:
+        tenant_id = request.tenant.get("tenant_id")
+        args = request.args
+
+        fmt = args.get("format", "pdf").lower()
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+        if fmt == "pdf" and not merge_available():
+            return jsonify({"error": "Merged PDF export is not available on this server; use format=zip"}), 501
+        try:
+            date_from = datetime.strptime(args["date_from"], "%Y-%m-%d") if args.get("date_from") else None
+            date_to = datetime.strptime(args["date_to"], "%Y-%m-%d") + timedelta(days=1) if args.get("date_to") else None
+        except ValueError as e:
+            return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+
+        try:
+            rows = find_export_rows(tenant_id, date_from, date_to, args.get("status") or None)
+        except ExportTooLarge as e:
+            return jsonify({"error": str(e)}), 400
+        if not rows:
+            return jsonify({"error": "No challans match the filters"}), 404
+
+        try:
+            path, stats = build_export(tenant_id, rows, request.host_url, fmt)
+        except ExportNotReady as e:
+            return jsonify({"error": str(e)}), 409
+        except ExportTooLarge as e:
+            return jsonify({"error": str(e)}), 400
+        if not stats["count"]:
+            os.remove(path)
+            return jsonify({"error": "None of the matching challans has a PDF", "missing": stats["missing"]}), 500
+
+        label = "_".join(
+            v for v in (args.get("date_from"), args.get("date_to"), args.get("status")) if v
+        ) or datetime.now().strftime("%Y-%m-%d")
+        label = "".join(ch if ch.isalnum() or ch in "-_" else "-" for ch in label)
+        headers = {
+            "Content-Disposition": f'attachment; filename="challans_{label}.{fmt}"',
+            "Content-Length": str(os.path.getsize(path)),
+            "X-Export-Count": str(stats["count"]),
+            "X-Export-Rendered": str(stats["rendered"]),
+        }
+        if stats["missing"]:
+            headers["X-Export-Missing"] = ",".join(stats["missing"])
+        return Response(
+            stream_file(path),
+            mimetype="application/pdf" if fmt == "pdf" else "application/zip",
+            headers=headers,
+        )
+
+    except Exception as e:
+        print("❌ export_challans error:", e)
+        return jsonify({"error": "Failed to export challans"}), 500
+
 # -----------------------
 # 4) Create new challan
 # -----------------------
+_INSERT_COLUMNS = """tenant_id, challan_no, customer_name, email, contact_number, serial_number,
+                   city, problem, accessories, warranty, dispatch_through, employee_id,
+                   items, images, status, created_at, email_sent, pdf_status"""
+_INSERT_VALUES = "%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,'pending',NOW(),FALSE,'pending'"
+
+
+def _insert_row(tenant_id, challan_no, data, employee_id, image_paths):
+    """Parameters for one challans row, in _INSERT_COLUMNS order."""
+    return (
+        tenant_id,
+        challan_no,
+        data.get("customer_name"),
+        data.get("email"),
+        data.get("contact_number"),
+        data.get("serial_number"),
+        data.get("city"),
+        data.get("problem"),
+        json.dumps(data.get("accessories", [])),
+        data.get("warranty"),
+        data.get("dispatch_through"),
+        employee_id,
+        json.dumps(data.get("items", [])),
+        json.dumps(image_paths),
+    )
+
+
+def _new_qr_record(challan_no, tenant_id, data):
+    """QR payload for a new challan; excludes customer-identifying fields."""
+    return {
+        "challan_no": challan_no,
+        "tenant_id": tenant_id,
+        "serial_number": data.get("serial_number"),
+        "problem": data.get("problem"),
+        "items": data.get("items", []),
+        "accessories": data.get("accessories", []),
+        "warranty": data.get("warranty"),
+        "dispatch_through": data.get("dispatch_through"),
+        "status": "pending",
+        "created_at": datetime.utcnow().isoformat(),
+    }
+
+
+def _new_pdf_data(challan_no, data, employee_name):
+    return {
+        "challan_no": challan_no,
+        "customer_name": data.get("customer_name"),
+        "email": data.get("email"),
+        "contact_number": data.get("contact_number"),
+        "serial_number": data.get("serial_number"),
+        "city": data.get("city"),
+        "problem": data.get("problem"),
+        "accessories": data.get("accessories", []),
+        "warranty": data.get("warranty"),
+        "dispatch_through": data.get("dispatch_through"),
+        "employee_name": employee_name,
+        "items": data.get("items", []),
+        "status": "pending",
+        "generated_on": datetime.utcnow().isoformat(),
+    }
+
+
 @challans_bp.route("/challan", methods=["POST"])
 @tenant_token_required
 def create_challan():
     """
     Create a new challan. Accepts multipart/form-data (images + data) or JSON.
-    Generates QR (with payload excluding customer personal fields), PDF, saves DB records,
-    and sends email in background if customer email provided.
+    The row and an artifact job are committed together; QR, PDF and the customer
+    email are produced by the job worker. Poll /challan/<no>/artifacts for the PDF.
     """
     conn = None
+    staged = []
     try:
         tenant_id = request.tenant.get("tenant_id")
         employee_name = request.tenant.get("name", "Unknown")
@@ -374,162 +609,194 @@ def create_challan():
         if not all([data.get("customer_name"), data.get("serial_number"), data.get("problem")]):
             return jsonify({"error": "Missing required fields (customer_name, serial_number, problem)"}), 400
 
-        # challan number
-        challan_no = f"CH-{datetime.now().strftime('%d%m%Y%H%M%S')}"
-
-        # handle image uploads (store file paths relative to cwd)
-        image_paths = []
-        if uploaded_files:
-            upload_dir = os.path.join("static", "uploads")
-            os.makedirs(upload_dir, exist_ok=True)
-            for f in uploaded_files:
-                safe_name = f"{challan_no}_{f.filename}"
-                save_path = os.path.join(upload_dir, safe_name)
-                f.save(save_path)
-                # store relative path for DB, use leading slash
-                rel = os.path.join("static", "uploads", safe_name)
-                image_paths.append(rel)
-
-        # insert into DB
+        # challan number (per-tenant sequence, formatted from challan_config)
+        challan_no = allocate_challan_no(tenant_id)
+
+        # hash uploads into staging; they are published to the blob store with the row
+        staged = [stage_upload(f) for f in uploaded_files if f and f.filename]
+
+        # insert row + artifact job in one transaction
         conn = get_db_connection()
         cur = conn.cursor()
+        image_paths = attach_blobs(cur, tenant_id, challan_no, staged)
         cur.execute(
-            """INSERT INTO challans (
-                   tenant_id, challan_no, customer_name, email, contact_number, serial_number,
-                   city, problem, accessories, warranty, dispatch_through, employee_id,
-                   items, images, status, created_at, email_sent
-               ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,'pending',NOW(),FALSE)""",
-            (
-                tenant_id,
-                challan_no,
-                data.get("customer_name"),
-                data.get("email"),
-                data.get("contact_number"),
-                data.get("serial_number"),
-                data.get("city"),
-                data.get("problem"),
-                json.dumps(data.get("accessories", [])),
-                data.get("warranty"),
-                data.get("dispatch_through"),
-                request.tenant.get("user_id"),
-                json.dumps(data.get("items", [])),
-                json.dumps(image_paths),
-            ),
+            f"INSERT INTO challans ({_INSERT_COLUMNS}) VALUES ({_INSERT_VALUES})",
+            _insert_row(tenant_id, challan_no, data, request.tenant.get("user_id"), image_paths),
+        )
+        enqueue_challan_artifacts(
+            cur, tenant_id, challan_no,
+            base_url=request.host_url,
+            pdf_data=_new_pdf_data(challan_no, data, employee_name),
+            image_paths=image_paths,
+            qr_record=_new_qr_record(challan_no, tenant_id, data),
+            email_kind="created" if data.get("email") else None,
         )
         conn.commit()
 
-        # Build QR payload excluding customer-identifying fields
-        # Fetch a little more context to include useful data
-        qr_record = {
-            "challan_no": challan_no,
-            "tenant_id": tenant_id,
-            "serial_number": data.get("serial_number"),
-            "problem": data.get("problem"),
-            "items": data.get("items", []),
-            "accessories": data.get("accessories", []),
-            "warranty": data.get("warranty"),
-            "dispatch_through": data.get("dispatch_through"),
-            "created_at": datetime.utcnow().isoformat(),
-        }
-        qr_payload = _build_qr_payload(qr_record)
+        cur.close()
+        conn.close()
 
-        # generate and save qr
-        try:
-            qr_path = generate_and_save_qr(qr_record['challan_no'],qr_payload)
-            # make absolute for DB and client
-            qr_url = _absolute_static_url(qr_path) if qr_path else None
-        except Exception as e:
-            print("⚠️ QR generation failed:", e)
-            qr_url = None
-
-        # fetch tenant settings for design
-        cur.execute("SELECT branding_config, challan_config FROM tenant_settings WHERE tenant_id=%s", (tenant_id,))
-        ts_row = cur.fetchone()
-        branding = _safe_json_obj(ts_row[0]) if ts_row else {}
-        challan_cfg = _safe_json_obj(ts_row[1]) if ts_row else {}
-        tenant_design = {**challan_cfg, **branding}
-        if tenant_design.get("logo_url"):
-            tenant_design["logo_url"] = _absolute_static_url(tenant_design["logo_url"])
-
-        # prepare pdf data, images for PDF should be absolute URLs
-        pdf_data = {
+        return jsonify({
+            "message": "✅ Challan created",
             "challan_no": challan_no,
-            "customer_name": data.get("customer_name"),
-            "email": data.get("email"),
-            "contact_number": data.get("contact_number"),
-            "serial_number": data.get("serial_number"),
-            "city": data.get("city"),
-            "problem": data.get("problem"),
-            "accessories": data.get("accessories", []),
-            "warranty": data.get("warranty"),
-            "dispatch_through": data.get("dispatch_through"),
-            "employee_name": employee_name,
-            "items": data.get("items", []),
-            "status": "pending",
-            "images": [_absolute_static_url(p) for p in image_paths],
-            "qr_code_url": qr_url,
-            "generated_on": datetime.utcnow().isoformat(),
-        }
+            "pdf_status": "pending",
+            "pdf_url": None,
+            "qr_url": None,
+            "artifacts_url": f"/api/tenant/challan/{challan_no}/artifacts",
+        }), 201
 
-        # generate PDF (helper should return relative path e.g. /static/pdfs/CH-...pdf)
-        try:
-            pdf_rel = generate_pdf(pdf_data, tenant_design)
-        except Exception as e:
-            # if pdf generation fails, keep process going but warn
-            print("❌ Error generating PDF:", e)
-            pdf_rel = None
-
-        # update DB with qr and pdf urls (store absolute or relative - prefer relative in DB, absolute for client)
-        db_qr = qr_url if qr_url else None
-        db_pdf = pdf_rel if pdf_rel else None
-        try:
-            cur.execute("UPDATE challans SET qr_code_url=%s, pdf_url=%s WHERE challan_no=%s",
-                        (db_qr, db_pdf, challan_no))
-            conn.commit()
-        except Exception as e:
-            print("⚠️ Could not update qr/pdf in DB:", e)
-
-        # send email asynchronously if email present & pdf exists
-        if data.get("email") and pdf_rel:
-            pdf_full_path = None
-            safe_rel = _safe_lstrip_path(pdf_rel)
-            if safe_rel:
-                candidate = os.path.join(os.getcwd(), safe_rel)
-                if os.path.exists(candidate):
-                    pdf_full_path = candidate
-            # fire-and-forget
-            def _bg_send_mail():
-                try:
-                    send_challan_email(tenant_id, data["email"], pdf_data, pdf_full_path, [os.path.join(os.getcwd(), _safe_lstrip_path(p)) for p in image_paths])
-                except Exception as e:
-                    print("❌ send_challan_email error:", e)
-            threading.Thread(target=_bg_send_mail, daemon=True).start()
-            # mark email_sent true
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        print("❌ create_challan error:", e)
+        if conn:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        return jsonify({"error": "Failed to create challan"}), 500
+    finally:
+        for b in staged:
+            b.discard()
+        if conn:
             try:
-                cur.execute("UPDATE challans SET email_sent=TRUE WHERE challan_no=%s", (challan_no,))
-                conn.commit()
+                conn.close()
             except Exception:
                 pass
 
+# -----------------------
+# 4b) Bulk create (corporate pickups)
+# -----------------------
+BULK_MAX_CHALLANS = int(os.environ.get("BULK_MAX_CHALLANS", 100))
+
+
+@challans_bp.route("/challans/bulk", methods=["POST"])
+@tenant_token_required
+def create_challans_bulk():
+    """
+    Create many challans in one request and one transaction.
+
+    JSON body (or multipart `data` field):
+        {"challans": [{customer_name, serial_number, problem, email, ...}, ...],
+         "consolidated_email": true}
+    Multipart uploads for item i go in the `images_<i>` file field.
+
+    Rows go in with a single multi-row INSERT and their QR/PDF jobs with one
+    more, so the workers render them in parallel. With consolidated_email,
+    each customer gets one email with all their challan PDFs once the batch
+    is rendered, instead of one email per device. Items failing validation
+    are reported and skipped; the rest are created.
+    """
+    conn = None
+    staged = {}
+    try:
+        tenant_id = request.tenant.get("tenant_id")
+        employee_id = request.tenant.get("user_id")
+        employee_name = request.tenant.get("name", "Unknown")
+
+        if request.content_type and request.content_type.startswith("multipart/form-data"):
+            try:
+                body = json.loads(request.form.get("data", "{}"))
+            except Exception:
+                body = {}
+        else:
+            body = request.get_json(silent=True) or {}
+
+        items = body.get("challans")
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "challans must be a non-empty list"}), 400
+        if len(items) > BULK_MAX_CHALLANS:
+            return jsonify({"error": f"At most {BULK_MAX_CHALLANS} challans per request"}), 400
+        consolidated = bool(body.get("consolidated_email"))
+
+        # validate every item up front; invalid ones are reported, not fatal
+        results = []
+        valid = []
+        for index, data in enumerate(items):
+            if not isinstance(data, dict) or not all([data.get("customer_name"), data.get("serial_number"), data.get("problem")]):
+                results.append({"index": index, "status": "error",
+                                "error": "Missing required fields (customer_name, serial_number, problem)"})
+                continue
+            uploads = request.files.getlist(f"images_{index}") if request.files else []
+            staged[index] = [stage_upload(f) for f in uploads if f and f.filename]
+            valid.append((index, data))
+            results.append({"index": index, "status": "created"})
+
+        if not valid:
+            return jsonify({"error": "No valid challans", "results": results}), 400
+
+        # one block of numbers for the whole batch
+        numbers = iter(allocate_challan_numbers(tenant_id, len(valid)))
+        valid = [(index, next(numbers), data) for index, data in valid]
+        by_index = {index: challan_no for index, challan_no, _ in valid}
+        for r in results:
+            if r["status"] == "created":
+                r["challan_no"] = by_index[r["index"]]
+
+        # one consolidated email per customer address
+        batches = {}
+        if consolidated:
+            for index, challan_no, data in valid:
+                email = (data.get("email") or "").strip().lower()
+                if email:
+                    batch = batches.setdefault(email, {
+                        "id": f"{tenant_id}:{valid[0][1]}:{email}", "email": data.get("email").strip(), "challan_nos": [],
+                    })
+                    batch["challan_nos"].append(challan_no)
+
+        conn = get_db_connection()
+        cur = conn.cursor()
+        rows = []
+        jobs = []
+        for index, challan_no, data in valid:
+            image_paths = attach_blobs(cur, tenant_id, challan_no, staged.get(index, []))
+            rows.append(_insert_row(tenant_id, challan_no, data, employee_id, image_paths))
+            batch = batches.get((data.get("email") or "").strip().lower()) if consolidated else None
+            jobs.append({
+                "challan_no": challan_no,
+                "pdf_data": _new_pdf_data(challan_no, data, employee_name),
+                "image_paths": image_paths,
+                "qr_record": _new_qr_record(challan_no, tenant_id, data),
+                "email_kind": "created" if data.get("email") and not consolidated else None,
+                "batch": batch,
+            })
+        execute_values(
+            cur,
+            f"INSERT INTO challans ({_INSERT_COLUMNS}) VALUES %s",
+            rows,
+            template=f"({_INSERT_VALUES})",
+            page_size=len(rows),
+        )
+        enqueue_batch_artifacts(cur, tenant_id, jobs, base_url=request.host_url)
+        conn.commit()
         cur.close()
         conn.close()
 
+        for r in results:
+            if r["status"] == "created":
+                r["artifacts_url"] = f"/api/tenant/challan/{r['challan_no']}/artifacts"
         return jsonify({
-            "message": "✅ Challan created",
-            "challan_no": challan_no,
-            "pdf_url": pdf_rel,
-            "qr_url": qr_url,
+            "message": f"✅ {len(valid)} challan(s) created",
+            "created": len(valid),
+            "failed": len(results) - len(valid),
+            "consolidated_emails": len(batches),
+            "results": results,
         }), 201
 
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
-        print("❌ create_challan error:", e)
+        print("❌ create_challans_bulk error:", e)
         if conn:
             try:
                 conn.rollback()
             except Exception:
                 pass
-        return jsonify({"error": "Failed to create challan"}), 500
+        return jsonify({"error": "Failed to create challans"}), 500
     finally:
+        for blobs in staged.values():
+            for b in blobs:
+                b.discard()
         if conn:
             try:
                 conn.close()
@@ -544,9 +811,11 @@ def create_challan():
 def update_challan(challan_no):
     """
     Update challan fields (supports multipart form with images or JSON).
-    Regenerates PDF and optionally re-sends email.
+    Queues PDF regeneration and the update email; the old PDF stays
+    downloadable until the new one replaces it.
     """
     conn = None
+    staged = []
     try:
         tenant_id = request.tenant.get("tenant_id")
         employee_name = request.tenant.get("name", "Unknown")
@@ -562,31 +831,19 @@ def update_challan(challan_no):
             data = request.get_json(silent=True) or {}
             uploaded_files = []
 
-        # Save new uploaded images
-        image_paths = []
-        if uploaded_files:
-            upload_dir = os.path.join("static", "uploads")
-            os.makedirs(upload_dir, exist_ok=True)
-            for f in uploaded_files:
-                safe_name = f"{challan_no}_{f.filename}"
-                save_path = os.path.join(upload_dir, safe_name)
-                f.save(save_path)
-                image_paths.append(os.path.join("static", "uploads", safe_name))
+        # Stage new uploaded images (they replace the challan's current images)
+        staged = [stage_upload(f) for f in uploaded_files if f and f.filename]
 
         conn = get_db_connection()
         cur = conn.cursor()
 
-        # get old pdf (to optionally remove)
-        cur.execute("SELECT pdf_url FROM challans WHERE challan_no=%s AND tenant_id=%s", (challan_no, tenant_id))
-        old_pdf_row = cur.fetchone()
-        old_pdf = old_pdf_row[0] if old_pdf_row else None
-
         # update record
         cur.execute(
             """UPDATE challans SET customer_name=%s, email=%s, contact_number=%s, serial_number=%s, city=%s,
-               problem=%s, accessories=%s, warranty=%s, dispatch_through=%s, items=%s, images=%s,
+               problem=%s, accessories=%s, warranty=%s, dispatch_through=%s, items=%s,
                updated_at=NOW(), email_sent=FALSE
-               WHERE challan_no=%s AND tenant_id=%s""",
+               WHERE challan_no=%s AND tenant_id=%s
+               RETURNING created_at""",
             (
                 data.get("customer_name"),
                 data.get("email"),
@@ -598,32 +855,24 @@ def update_challan(challan_no):
                 data.get("warranty"),
                 data.get("dispatch_through"),
                 json.dumps(data.get("items", [])),
-                json.dumps(image_paths),
                 challan_no,
                 tenant_id,
             ),
         )
-        conn.commit()
+        updated = cur.fetchone()
+        if not updated:
+            conn.rollback()
+            cur.close()
+            conn.close()
+            return jsonify({"error": "Challan not found"}), 404
 
-        # remove old pdf file if it exists and new pdf will be created
-        if old_pdf:
-            safe_rel = _safe_lstrip_path(old_pdf)
-            if safe_rel:
-                candidate = os.path.join(os.getcwd(), safe_rel)
-                try:
-                    if os.path.exists(candidate):
-                        os.remove(candidate)
-                except Exception as e:
-                    print("⚠️ Could not remove old pdf:", e)
-
-        # fetch tenant design
-        cur.execute("SELECT branding_config, challan_config FROM tenant_settings WHERE tenant_id=%s", (tenant_id,))
-        ts_row = cur.fetchone()
-        branding = _safe_json_obj(ts_row[0]) if ts_row else {}
-        challan_cfg = _safe_json_obj(ts_row[1]) if ts_row else {}
-        tenant_design = {**challan_cfg, **branding}
-        if tenant_design.get("logo_url"):
-            tenant_design["logo_url"] = _absolute_static_url(tenant_design["logo_url"])
+        # release the old images first, so a re-uploaded photo is re-referenced
+        orphaned = detach_blobs(cur, tenant_id, challan_no)
+        image_paths = attach_blobs(cur, tenant_id, challan_no, staged)
+        cur.execute(
+            "UPDATE challans SET images=%s WHERE challan_no=%s AND tenant_id=%s",
+            (json.dumps(image_paths), challan_no, tenant_id),
+        )
 
         # prepare data for PDF
         pdf_data = {
@@ -640,50 +889,31 @@ def update_challan(challan_no):
             "employee_name": employee_name,
             "items": data.get("items", []),
             "status": data.get("status", "pending"),
-            "images": [_absolute_static_url(p) for p in image_paths],
-            "created_at": datetime.now().strftime("%d/%m/%Y, %I:%M %p"),
+            "created_at": updated[0].strftime("%d/%m/%Y, %I:%M %p") if updated[0] else None,
         }
 
-        # generate pdf
-        try:
-            pdf_rel = generate_pdf(pdf_data, tenant_design)
-        except Exception as e:
-            print("❌ Error generating PDF on update:", e)
-            pdf_rel = None
-
-        if pdf_rel:
-            try:
-                cur.execute("UPDATE challans SET pdf_url=%s WHERE challan_no=%s AND tenant_id=%s",
-                            (pdf_rel, challan_no, tenant_id))
-                conn.commit()
-            except Exception:
-                pass
-
-        # optionally email updated pdf to customer
-        if data.get("email") and pdf_rel:
-            # resolve full path
-            pdf_full_path = None
-            safe_rel = _safe_lstrip_path(pdf_rel)
-            if safe_rel:
-                candidate = os.path.join(os.getcwd(), safe_rel)
-                if os.path.exists(candidate):
-                    pdf_full_path = candidate
-            def _bg_resend():
-                try:
-                    send_Update_challan_email(tenant_id, data.get("email"), pdf_data, pdf_full_path, [os.path.join(os.getcwd(), _safe_lstrip_path(p)) for p in image_paths])
-                except Exception as e:
-                    print("❌ resend email error:", e)
-            threading.Thread(target=_bg_resend, daemon=True).start()
-            try:
-                cur.execute("UPDATE challans SET email_sent=TRUE WHERE challan_no=%s", (challan_no,))
-                conn.commit()
-            except Exception:
-                pass
+        enqueue_challan_artifacts(
+            cur, tenant_id, challan_no,
+            base_url=request.host_url,
+            pdf_data=pdf_data,
+            image_paths=image_paths,
+            email_kind="updated" if data.get("email") else None,
+        )
+        conn.commit()
 
         cur.close()
         conn.close()
-        return jsonify({"message": "✅ Challan updated, PDF regenerated (if possible)"}), 200
+        # only now that the new references are durable
+        remove_orphaned_blobs(orphaned)
+        return jsonify({
+            "message": "✅ Challan updated, PDF regeneration queued",
+            "challan_no": challan_no,
+            "pdf_status": "pending",
+            "artifacts_url": f"/api/tenant/challan/{challan_no}/artifacts",
+        }), 200
 
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         print("❌ update_challan error:", e)
         if conn:
@@ -693,12 +923,49 @@ def update_challan(challan_no):
                 pass
         return jsonify({"error": "Failed to update challan"}), 500
     finally:
+        for b in staged:
+            b.discard()
         if conn:
             try:
                 conn.close()
             except Exception:
                 pass
 
+# -----------------------
+# 5b) Artifact readiness (poll / long-poll)
+# -----------------------
+@challans_bp.route("/challan/<string:challan_no>/artifacts", methods=["GET"])
+@tenant_token_required
+def get_challan_artifacts(challan_no):
+    """
+    Report QR/PDF readiness for a challan. `?wait=<seconds>` (max 30) holds the
+    request until the PDF is ready or failed, without keeping a DB connection.
+    """
+    try:
+        tenant_id = request.tenant.get("tenant_id")
+        try:
+            wait = min(max(float(request.args.get("wait", 0)), 0.0), 30.0)
+        except ValueError:
+            wait = 0.0
+
+        result = artifact_status(tenant_id, challan_no)
+        if not result:
+            return jsonify({"error": "Challan not found"}), 404
+
+        if wait and result["pdf_status"] not in ("ready", "failed"):
+            def _settled():
+                status = artifact_status(tenant_id, challan_no)
+                if status and status["pdf_status"] in ("ready", "failed"):
+                    return status
+                return None
+            result = wait_for(_settled, wait) or artifact_status(tenant_id, challan_no) or result
+
+        return jsonify(result), 200
+
+    except Exception as e:
+        print("❌ get_challan_artifacts error:", e)
+        return jsonify({"error": "Failed to fetch artifact status"}), 500
+
 # -----------------------
 # 6) Delete challan
 # -----------------------
@@ -708,19 +975,18 @@ def delete_challan(challan_no):
     """Delete challan for tenant."""
     try:
         tenant_id = request.tenant.get("tenant_id")
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM challans WHERE challan_no=%s AND tenant_id=%s", (challan_no, tenant_id))
-        conn.commit()
-        cur.close()
-        conn.close()
+        with db_connection() as conn:
+            cur = conn.cursor()
+            # drop image references first (the delete would cascade them away);
+            # files go once no other challan uses them
+            orphaned = detach_blobs(cur, tenant_id, challan_no)
+            cur.execute("DELETE FROM challans WHERE challan_no=%s AND tenant_id=%s", (challan_no, tenant_id))
+            conn.commit()
+            cur.close()
+        remove_orphaned_blobs(orphaned)
         return jsonify({"message": "🗑️ Challan deleted successfully"}), 200
     except Exception as e:
         print("❌ delete_challan error:", e)
-        try:
-            conn.rollback()
-        except Exception:
-            pass
         return jsonify({"error": "Failed to delete challan"}), 500
 
 # -----------------------
@@ -732,18 +998,11 @@ def get_single_challan(challan_no):
     """Fetch a single challan record for editing/viewing."""
     try:
         tenant_id = request.tenant.get("tenant_id")
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(
-            """SELECT challan_no, customer_name, email, contact_number, serial_number, city, problem,
-                      accessories, warranty, dispatch_through, employee_id, items, status, created_at,
-                      qr_code_url, pdf_url, images
-               FROM challans WHERE challan_no=%s AND tenant_id=%s""",
-            (challan_no, tenant_id),
-        )
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(SINGLE_CHALLAN_SQL, (challan_no, tenant_id))
+            row = cur.fetchone()
+            cur.close()
 
         if not row:
             return jsonify({"error": "Challan not found"}), 404
@@ -775,6 +1034,7 @@ def get_single_challan(challan_no):
             "pdf_url": row[15],
             "images": _safe_json_load(row[16]),
         }
+        challan["thumbnails"] = [rendition_for(p, "thumb") for p in challan["images"] or []]
 
         return jsonify(challan), 200
 
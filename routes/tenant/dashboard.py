@@ -1,5 +1,7 @@
 from flask import Blueprint, jsonify, request
-from utils.db import get_db_connection
+from datetime import date, datetime, timedelta
+from utils.dashboard_counters import get_counters
+from utils.challan_rollups import timeseries
 from utils.auth import tenant_token_required
 
 dashboard_bp = Blueprint("tenant_dashboard", __name__)
@@ -16,36 +18,52 @@ def tenant_dashboard():
     try:
         tenant_id = request.tenant.get("tenant_id")
 
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # Total challans count
-        cur.execute("""
-            SELECT COUNT(*) FROM challans WHERE tenant_id = %s
-        """, (tenant_id,))
-        total = cur.fetchone()[0]
-
-        # Pending challans
-        cur.execute("""
-            SELECT COUNT(*) FROM challans WHERE tenant_id = %s AND status = 'pending'
-        """, (tenant_id,))
-        pending = cur.fetchone()[0]
-
-        # Delivered challans
-        cur.execute("""
-            SELECT COUNT(*) FROM challans WHERE tenant_id = %s AND status = 'delivered'
-        """, (tenant_id,))
-        delivered = cur.fetchone()[0]
-
-        cur.close()
-        conn.close()
+        # O(1) read of the trigger-maintained counter row
+        counters = get_counters(tenant_id)
 
         return jsonify({
-            "total": total,
-            "pending": pending,
-            "delivered": delivered
+            "total": counters["total"],
+            "pending": counters["pending"],
+            "delivered": counters["delivered"]
         }), 200
 
     except Exception as e:
         print("❌ Error fetching dashboard data:", e)
         return jsonify({"error": "Failed to fetch dashboard data"}), 500
+
+
+@dashboard_bp.route("/dashboard/timeseries", methods=["GET"])
+@tenant_token_required
+def tenant_dashboard_timeseries():
+    """
+    Challan throughput over time, served from the daily rollup table:
+    - created / delivered per day or week
+    - median & average turnaround (created -> delivered) in hours
+    - per-employee throughput
+
+    Query params: from, to (YYYY-MM-DD, default last 30 days),
+    bucket=day|week, employee_id
+    """
+    try:
+        tenant_id = request.tenant.get("tenant_id")
+        try:
+            end = datetime.strptime(request.args["to"], "%Y-%m-%d").date() if request.args.get("to") else date.today()
+            start = (datetime.strptime(request.args["from"], "%Y-%m-%d").date()
+                     if request.args.get("from") else end - timedelta(days=29))
+            employee_id = int(request.args["employee_id"]) if request.args.get("employee_id") else None
+        except ValueError:
+            return jsonify({"error": "Invalid from/to (YYYY-MM-DD) or employee_id"}), 400
+
+        bucket = request.args.get("bucket", "day")
+        if bucket not in ("day", "week"):
+            return jsonify({"error": "bucket must be day or week"}), 400
+        if start > end:
+            return jsonify({"error": "from must be before to"}), 400
+        if (end - start).days > 731:
+            return jsonify({"error": "Range is limited to 2 years"}), 400
+
+        return jsonify(timeseries(tenant_id, start, end, bucket, employee_id)), 200
+
+    except Exception as e:
+        print("❌ Error fetching dashboard timeseries:", e)
+        return jsonify({"error": "Failed to fetch dashboard timeseries"}), 500
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
-from utils.db import get_db_connection
+from utils.db import db_connection
 from utils.auth import tenant_token_required
+from utils.email_utils import invalidate_tenant_mailer
+from utils.tenant_config import get_tenant_config, invalidate_tenant_config
 import json
 
 email_settings_bp = Blueprint("email_settings", __name__)
@@ -13,18 +15,12 @@ email_settings_bp = Blueprint("email_settings", __name__)
 def get_email_settings():
     try:
         tenant_id = request.tenant.get("tenant_id")
+        config = get_tenant_config(tenant_id)
 
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT email_config FROM tenant_settings WHERE tenant_id=%s", (tenant_id,))
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
-
-        if not row or not row[0]:
+        if not config or not config["email"]:
             return jsonify({"email_config": {}}), 200
 
-        email_config = json.loads(row[0]) if isinstance(row[0], str) else row[0]
+        email_config = config["email"]
         return jsonify({"email_config": email_config}), 200
 
     except Exception as e:
@@ -69,19 +65,20 @@ def update_email_settings():
             "use_ssl": use_ssl
         }
 
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO tenant_settings (tenant_id, email_config, updated_at)
-            VALUES (%s, %s, NOW())
-            ON CONFLICT (tenant_id)
-            DO UPDATE SET 
-                email_config = EXCLUDED.email_config,
-                updated_at = NOW();
-        """, (tenant_id, json.dumps(email_config)))
-        conn.commit()
-        cur.close()
-        conn.close()
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO tenant_settings (tenant_id, email_config, updated_at)
+                VALUES (%s, %s, NOW())
+                ON CONFLICT (tenant_id)
+                DO UPDATE SET 
+                    email_config = EXCLUDED.email_config,
+                    updated_at = NOW();
+            """, (tenant_id, json.dumps(email_config)))
+            conn.commit()
+            cur.close()
+        invalidate_tenant_config(tenant_id)
+        invalidate_tenant_mailer(tenant_id)
 
         return jsonify({
             "message": "✅ Email settings updated successfully",
@@ -1,6 +1,10 @@
 from flask import Blueprint, request, jsonify
-from utils.db import get_db_connection
+from utils.db import db_connection
 from utils.auth import tenant_token_required
+from utils.tenant_config import get_tenant_config, invalidate_tenant_config
+from utils.email_utils import invalidate_tenant_mailer
+from utils.pdf_renderer import ENGINES as PDF_ENGINES
+from utils.challan_numbers import number_format_error, prefix_error
 import json, os
 from werkzeug.utils import secure_filename
 
@@ -32,24 +36,9 @@ def get_tenant_settings():
     """Fetch branding, challan, email, and terms conditions."""
     try:
         tenant_id = request.tenant.get("tenant_id")
+        config = get_tenant_config(tenant_id)
 
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT 
-                ts.branding_config, 
-                ts.challan_config,
-                ts.terms_conditions,
-                t.email
-            FROM tenants t
-            LEFT JOIN tenant_settings ts ON ts.tenant_id = t.id
-            WHERE t.id = %s
-        """, (tenant_id,))
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
-
-        if not row:
+        if not config:
             return jsonify({
                 "branding": {},
                 "challan": {},
@@ -57,10 +46,10 @@ def get_tenant_settings():
                 "terms_conditions": ""
             }), 200
 
-        branding = safe_json(row[0])
-        challan = safe_json(row[1])
-        terms_conditions = row[2] or ""
-        tenant_email = row[3]
+        branding = config["branding"]
+        challan = config["challan"]
+        terms_conditions = config["terms_conditions"]
+        tenant_email = config["tenant_email"]
 
         branding["company_email"] = tenant_email
 
@@ -93,25 +82,35 @@ def update_tenant_settings():
 
         if not branding and not challan and not terms_conditions:
             return jsonify({"error": "Missing data"}), 400
+        if challan.get("pdf_engine") and challan["pdf_engine"] not in PDF_ENGINES:
+            return jsonify({"error": f"pdf_engine must be one of: {', '.join(PDF_ENGINES)}"}), 400
+        if challan.get("challan_number_format"):
+            error = number_format_error(challan["challan_number_format"])
+            if error:
+                return jsonify({"error": error}), 400
+        if challan.get("challan_prefix"):
+            error = prefix_error(challan["challan_prefix"])
+            if error:
+                return jsonify({"error": error}), 400
+
+        with db_connection() as conn:
+            cur = conn.cursor()
 
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        cur.execute("""
-            INSERT INTO tenant_settings 
-                (tenant_id, branding_config, challan_config, terms_conditions, updated_at)
-            VALUES (%s, %s, %s, %s, NOW())
-            ON CONFLICT (tenant_id)
-            DO UPDATE SET 
-                branding_config = EXCLUDED.branding_config,
-                challan_config = EXCLUDED.challan_config,
-                terms_conditions = EXCLUDED.terms_conditions,
-                updated_at = NOW();
-        """, (tenant_id, json.dumps(branding), json.dumps(challan), terms_conditions))
-
-        conn.commit()
-        cur.close()
-        conn.close()
+            cur.execute("""
+                INSERT INTO tenant_settings 
+                    (tenant_id, branding_config, challan_config, terms_conditions, updated_at)
+                VALUES (%s, %s, %s, %s, NOW())
+                ON CONFLICT (tenant_id)
+                DO UPDATE SET 
+                    branding_config = EXCLUDED.branding_config,
+                    challan_config = EXCLUDED.challan_config,
+                    terms_conditions = EXCLUDED.terms_conditions,
+                    updated_at = NOW();
+            """, (tenant_id, json.dumps(branding), json.dumps(challan), terms_conditions))
+
+            conn.commit()
+            cur.close()
+        invalidate_tenant_config(tenant_id)
         return jsonify({"message": "✅ Settings updated successfully"}), 200
 
     except Exception as e:
@@ -128,41 +127,38 @@ def manage_terms_conditions():
     """Add, update, view or delete tenant terms & conditions."""
     try:
         tenant_id = request.tenant.get("tenant_id")
-        conn = get_db_connection()
-        cur = conn.cursor()
-
         if request.method == "GET":
-            cur.execute("SELECT terms_conditions FROM tenant_settings WHERE tenant_id=%s", (tenant_id,))
-            row = cur.fetchone()
-            cur.close()
-            conn.close()
+            config = get_tenant_config(tenant_id)
             return jsonify({
-                "terms_conditions": row[0] if row else ""
+                "terms_conditions": config["terms_conditions"] if config else ""
             }), 200
 
-        elif request.method in ("POST", "PUT"):
-            data = request.get_json(silent=True) or {}
-            terms_text = data.get("terms_conditions", "").strip()
-            if not terms_text:
-                return jsonify({"error": "Terms text is required"}), 400
-
-            cur.execute("""
-                INSERT INTO tenant_settings (tenant_id, terms_conditions, updated_at)
-                VALUES (%s, %s, NOW())
-                ON CONFLICT (tenant_id)
-                DO UPDATE SET terms_conditions = EXCLUDED.terms_conditions, updated_at = NOW();
-            """, (tenant_id, terms_text))
-            conn.commit()
-            cur.close()
-            conn.close()
-            return jsonify({"message": "✅ Terms & Conditions saved successfully"}), 200
-
-        elif request.method == "DELETE":
-            cur.execute("UPDATE tenant_settings SET terms_conditions=NULL WHERE tenant_id=%s", (tenant_id,))
-            conn.commit()
-            cur.close()
-            conn.close()
-            return jsonify({"message": "🗑️ Terms removed successfully"}), 200
+        with db_connection() as conn:
+            cur = conn.cursor()
+
+            if request.method in ("POST", "PUT"):
+                data = request.get_json(silent=True) or {}
+                terms_text = data.get("terms_conditions", "").strip()
+                if not terms_text:
+                    return jsonify({"error": "Terms text is required"}), 400
+
+                cur.execute("""
+                    INSERT INTO tenant_settings (tenant_id, terms_conditions, updated_at)
+                    VALUES (%s, %s, NOW())
+                    ON CONFLICT (tenant_id)
+                    DO UPDATE SET terms_conditions = EXCLUDED.terms_conditions, updated_at = NOW();
+                """, (tenant_id, terms_text))
+                conn.commit()
+                cur.close()
+                invalidate_tenant_config(tenant_id)
+                return jsonify({"message": "✅ Terms & Conditions saved successfully"}), 200
+
+            elif request.method == "DELETE":
+                cur.execute("UPDATE tenant_settings SET terms_conditions=NULL WHERE tenant_id=%s", (tenant_id,))
+                conn.commit()
+                cur.close()
+                invalidate_tenant_config(tenant_id)
+                return jsonify({"message": "🗑️ Terms removed successfully"}), 200
 
     except Exception as e:
         print(f"❌ Error managing terms: {e}")
@@ -178,12 +174,13 @@ def delete_tenant_settings():
     """Reset tenant design."""
     try:
         tenant_id = request.tenant.get("tenant_id")
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM tenant_settings WHERE tenant_id=%s", (tenant_id,))
-        conn.commit()
-        cur.close()
-        conn.close()
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM tenant_settings WHERE tenant_id=%s", (tenant_id,))
+            conn.commit()
+            cur.close()
+        invalidate_tenant_config(tenant_id)
+        invalidate_tenant_mailer(tenant_id)
         return jsonify({"message": "🗑️ Settings cleared"}), 200
     except Exception as e:
         print(f"❌ Error deleting settings: {e}")
@@ -215,19 +212,19 @@ def upload_logo():
         base_url = request.host_url.rstrip('/')
         public_url = f"{base_url}/static/logos/{filename}"
 
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            UPDATE tenant_settings
-            SET branding_config = jsonb_set(
-                COALESCE(branding_config, '{}'::jsonb),
-                '{logo_url}', %s::jsonb, true
-            )
-            WHERE tenant_id = %s
-        """, (json.dumps(public_url), tenant_id))
-        conn.commit()
-        cur.close()
-        conn.close()
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE tenant_settings
+                SET branding_config = jsonb_set(
+                    COALESCE(branding_config, '{}'::jsonb),
+                    '{logo_url}', %s::jsonb, true
+                )
+                WHERE tenant_id = %s
+            """, (json.dumps(public_url), tenant_id))
+            conn.commit()
+            cur.close()
+        invalidate_tenant_config(tenant_id)
 
         return jsonify({"message": "✅ Logo uploaded", "logo_url": public_url}), 200
     except Exception as e:
@@ -243,30 +240,11 @@ def get_merged_tenant_design():
     """
     try:
         tenant_id = request.tenant.get("tenant_id")
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT branding_config, challan_config,terms_conditions
-            FROM tenant_settings
-            WHERE tenant_id=%s
-        """, (tenant_id,))
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
-
-        def safe_json(v):
-            if not v:
-                return {}
-            if isinstance(v, dict):
-                return v
-            try:
-                return json.loads(v)
-            except:
-                return {}
-
-        branding = safe_json(row[0]) if row else {}
-        challan = safe_json(row[1]) if row else {}
-        terms_conditions = row[2] if row else ""
+        config = get_tenant_config(tenant_id)
+
+        branding = config["branding"] if config else {}
+        challan = config["challan"] if config else {}
+        terms_conditions = config["terms_conditions"] if config else ""
 
         merged = {**challan, **branding,'terms_conditions':terms_conditions}
 
@@ -6,6 +6,17 @@ from datetime import datetime
 
 tenant_auth_bp = Blueprint("tenant_auth", __name__)
 
+# also EXPLAINed by `python -m utils.migrations check-indexes`
+LOGIN_SQL = """
+    SELECT
+        u.id, u.name, u.email, u.password_hash, u.role,
+        u.tenant_id, u.is_active,
+        t.name AS tenant_name
+    FROM users u
+    JOIN tenants t ON u.tenant_id = t.id
+    WHERE u.email = %s
+"""
+
 # ============================================================
 # 🧠 TENANT USER LOGIN
 # ============================================================
@@ -23,15 +34,7 @@ def tenant_login():
         conn = get_db_connection()
         cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
-        cur.execute("""
-            SELECT 
-                u.id, u.name, u.email, u.password_hash, u.role, 
-                u.tenant_id, u.is_active, 
-                t.name AS tenant_name
-            FROM users u
-            JOIN tenants t ON u.tenant_id = t.id
-            WHERE u.email = %s
-        """, (email,))
+        cur.execute(LOGIN_SQL, (email,))
         user = cur.fetchone()
 
         cur.close()
@@ -0,0 +1,49 @@
+"""
+Every hot route / worker query must be servable from an index.
+
+Runs the migrations on a scratch database next to DB_NAME (dropped again
+afterwards) and EXPLAINs the SQL the routes and workers actually execute
+(utils.migrations.hot_queries). Skipped when Postgres is not reachable.
+"""
+import os
+import pytest
+import psycopg2
+import utils.db as db
+from utils.migrations import upgrade, check_indexes, hot_queries
+
+SCRATCH_DB = f"{db.DB_CONFIG['dbname']}_index_check_{os.getpid()}".lower()
+
+
+def _admin_connection():
+    conn = psycopg2.connect(**{**db.DB_CONFIG, "dbname": "postgres"})
+    conn.autocommit = True
+    return conn
+
+
+@pytest.fixture(scope="module")
+def index_results():
+    try:
+        admin = _admin_connection()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"Postgres not reachable: {e}")
+
+    original_db, original_pool = db.DB_CONFIG["dbname"], db._pool
+    cur = admin.cursor()
+    cur.execute(f'DROP DATABASE IF EXISTS "{SCRATCH_DB}"')
+    cur.execute(f'CREATE DATABASE "{SCRATCH_DB}"')
+    db.DB_CONFIG["dbname"], db._pool = SCRATCH_DB, None
+    try:
+        upgrade()
+        yield {r["route"]: r for r in check_indexes()}
+    finally:
+        if db._pool is not None and db._pool_pid == os.getpid():
+            db._pool.closeall()
+        db.DB_CONFIG["dbname"], db._pool = original_db, original_pool
+        cur.execute(f'DROP DATABASE IF EXISTS "{SCRATCH_DB}"')
+        cur.close()
+        admin.close()
+
+
+@pytest.mark.parametrize("route,table", [(q[0], q[1]) for q in hot_queries()], ids=[q[0] for q in hot_queries()])
+def test_hot_query_uses_an_index(index_results, route, table):
+    assert index_results[route]["ok"], f"{route} seq-scans {table}"
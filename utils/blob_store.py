@@ -0,0 +1,341 @@
+"""
+Content-addressed storage for challan uploads.
+
+Files live at static/blobs/<aa>/<bb>/<sha256>.<ext>, so a photo uploaded for
+several challans is stored once. `challan_images` maps challans to blobs and
+`blobs.ref_count` tracks how many challan images point at each file.
+
+One-time migration of existing uploads:
+
+    python -m utils.blob_store migrate-uploads [--dry-run]
+
+Files of blobs left unreferenced by cascaded deletes (e.g. a deleted tenant):
+
+    python -m utils.blob_store sweep
+"""
+import os
+import sys
+import json
+import uuid
+import hashlib
+import argparse
+from utils.db import db_connection
+from utils.image_utils import RENDITIONS, rendition_rel_path
+
+# ============================================================
+# 🔹 CONFIGURATION
+# ============================================================
+BLOBS_DIR = os.path.join("static", "blobs")
+UPLOADS_DIR = os.path.join("static", "uploads")
+STAGING_DIR = os.path.join(BLOBS_DIR, ".staging")
+CHUNK_SIZE = 64 * 1024
+
+# Schema: migrations/0003_blobs.sql
+
+
+# ============================================================
+# 🔹 PATHS
+# ============================================================
+def _ext_for(filename):
+    ext = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    return ext if ext.isalnum() and len(ext) <= 8 else ""
+
+
+def blob_rel_path(sha, ext=""):
+    """static/blobs/ab/cd/<sha>.<ext> (relative to the project root)."""
+    name = f"{sha}.{ext}" if ext else sha
+    return os.path.join(BLOBS_DIR, sha[:2], sha[2:4], name)
+
+
+def _abs(rel):
+    return os.path.join(os.getcwd(), rel)
+
+
+class StagedBlob:
+    """An upload hashed into the staging area, not yet published or referenced."""
+
+    def __init__(self, sha256, ext, size, staging_path, original_name):
+        self.sha256 = sha256
+        self.ext = ext
+        self.size = size
+        self.staging_path = staging_path
+        self.original_name = original_name
+
+    @property
+    def rel_path(self):
+        return blob_rel_path(self.sha256, self.ext)
+
+    def discard(self):
+        if self.staging_path and os.path.exists(self.staging_path):
+            try:
+                os.remove(self.staging_path)
+            except OSError:
+                pass
+        self.staging_path = None
+
+
+# ============================================================
+# 🔹 WRITE SIDE
+# ============================================================
+def stage_stream(stream, filename):
+    """Copy a file-like object into staging while hashing it."""
+    os.makedirs(_abs(STAGING_DIR), exist_ok=True)
+    staging_path = _abs(os.path.join(STAGING_DIR, f"{uuid.uuid4().hex}.part"))
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(staging_path, "wb") as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except Exception:
+        if os.path.exists(staging_path):
+            os.remove(staging_path)
+        raise
+    return StagedBlob(digest.hexdigest(), _ext_for(filename), size, staging_path, filename)
+
+
+def stage_upload(file_storage):
+    """
+    Stage a werkzeug FileStorage from request.files. Uploads parsed by
+    StreamingUploadRequest are already hashed in staging and are claimed as-is.
+    """
+    claim = getattr(file_storage.stream, "claim", None)
+    if callable(claim):
+        return claim(file_storage.filename)
+    return stage_stream(file_storage.stream, file_storage.filename)
+
+
+def _publish(staged):
+    """Move the staged file to its content address (dropping it if already stored)."""
+    dest = _abs(staged.rel_path)
+    if os.path.exists(dest):
+        staged.discard()
+        return
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    os.replace(staged.staging_path, dest)
+    staged.staging_path = None
+
+
+def attach_blobs(cur, tenant_id, challan_no, staged_blobs):
+    """
+    Reference staged uploads from a challan in the caller's transaction and
+    return their stored relative paths (in order). The blob row is upserted before
+    the file is published, so a concurrent delete of the same content waits
+    on the row lock instead of removing the file underneath us.
+    """
+    cur.execute(
+        "SELECT COALESCE(MAX(position), -1) FROM challan_images WHERE tenant_id=%s AND challan_no=%s",
+        (tenant_id, challan_no),
+    )
+    position = cur.fetchone()[0] + 1
+    paths = []
+    for staged in staged_blobs:
+        # the first upload's extension wins, so identical bytes map to one path
+        cur.execute(
+            """INSERT INTO blobs (sha256, ext, size_bytes, ref_count) VALUES (%s, %s, %s, 1)
+               ON CONFLICT (sha256) DO UPDATE SET ref_count = blobs.ref_count + 1
+               RETURNING ext""",
+            (staged.sha256, staged.ext, staged.size),
+        )
+        staged.ext = cur.fetchone()[0]
+        _publish(staged)
+        cur.execute(
+            """INSERT INTO challan_images (tenant_id, challan_no, position, sha256, original_name)
+               VALUES (%s, %s, %s, %s, %s)""",
+            (tenant_id, challan_no, position, staged.sha256, staged.original_name),
+        )
+        position += 1
+        paths.append(staged.rel_path)
+    return paths
+
+
+def detach_blobs(cur, tenant_id, challan_no):
+    """
+    Drop a challan's image references in the caller's transaction and return
+    the paths of blobs no longer referenced by any challan. Call it before
+    deleting the challan itself (which would cascade the references away).
+    Nothing is removed from disk here: pass the paths to
+    remove_orphaned_blobs() once the transaction has committed, so a
+    rollback never leaves rows without files.
+    """
+    # lock the blob rows in a fixed order; the delete trigger decrements ref_count
+    cur.execute(
+        """SELECT sha256 FROM blobs WHERE sha256 IN (
+               SELECT sha256 FROM challan_images WHERE tenant_id=%s AND challan_no=%s
+           ) ORDER BY sha256 FOR UPDATE""",
+        (tenant_id, challan_no),
+    )
+    shas = [r[0] for r in cur.fetchall()]
+    cur.execute("DELETE FROM challan_images WHERE tenant_id=%s AND challan_no=%s", (tenant_id, challan_no))
+    if not shas:
+        return []
+    cur.execute(
+        "DELETE FROM blobs WHERE sha256 = ANY(%s) AND ref_count=0 RETURNING sha256, ext",
+        (shas,),
+    )
+    return [blob_rel_path(sha, ext) for sha, ext in cur.fetchall()]
+
+
+def sweep_unreferenced_blobs():
+    """
+    Remove blobs whose references went away without detach_blobs(), e.g.
+    challans cascaded away with their tenant. Returns the number of files removed.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM blobs WHERE ref_count=0 RETURNING sha256, ext")
+        paths = [blob_rel_path(sha, ext) for sha, ext in cur.fetchall()]
+        conn.commit()
+        cur.close()
+    return remove_orphaned_blobs(paths)
+
+
+def remove_orphaned_blobs(paths):
+    """
+    Delete the files of blobs returned by detach_blobs(), after its commit.
+    Each file is removed while holding a placeholder row for its sha, so an
+    upload of the same content re-created in the meantime keeps its file and
+    one arriving now waits for the removal instead of racing it.
+    Returns the number of files removed.
+    """
+    removed = 0
+    if not paths:
+        return removed
+    try:
+        with db_connection() as conn:
+            cur = conn.cursor()
+            for rel in paths:
+                sha, _, ext = os.path.basename(rel).partition(".")
+                cur.execute(
+                    """INSERT INTO blobs (sha256, ext, size_bytes, ref_count) VALUES (%s, %s, 0, 0)
+                       ON CONFLICT (sha256) DO NOTHING RETURNING sha256""",
+                    (sha, ext),
+                )
+                if cur.fetchone() is None:
+                    conn.commit()  # referenced again since the detach: keep the file
+                    continue
+                removed += _remove_files(rel)
+                cur.execute("DELETE FROM blobs WHERE sha256=%s AND ref_count=0", (sha,))
+                conn.commit()
+            cur.close()
+    except Exception as e:
+        # the caller's change is already committed; a leftover file is only wasted space
+        print("⚠️ remove_orphaned_blobs error:", e)
+    return removed
+
+
+def _remove_files(rel):
+    removed = 0
+    for path in [rel] + [rendition_rel_path(rel, kind) for kind in RENDITIONS]:
+        try:
+            os.remove(_abs(path))
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+# ============================================================
+# 🔹 ONE-TIME MIGRATION OF static/uploads
+# ============================================================
+def _image_list(v):
+    if isinstance(v, list):
+        return v
+    try:
+        return json.loads(v) if v else []
+    except Exception:
+        return []
+
+
+def _is_upload(p):
+    return str(p).lstrip("/").startswith(UPLOADS_DIR + os.sep)
+
+
+def migrate_uploads(dry_run=False):
+    """
+    Move every challan image under static/uploads into the blob store,
+    rewrite `challans.images` to the blob paths and remove the old copies.
+    Safe to re-run: challans already pointing at blobs are skipped.
+    """
+    stats = {"challans": 0, "files": 0, "blobs": 0, "bytes_before": 0, "bytes_after": 0, "missing": 0}
+    migrated_files = set()
+    seen_blobs = set()
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT tenant_id, challan_no, images FROM challans ORDER BY id")
+        rows = cur.fetchall()
+
+        for tenant_id, challan_no, images_json in rows:
+            images = _image_list(images_json)
+            if not any(_is_upload(p) for p in images):
+                continue
+
+            # index in `images` -> staged blob
+            staged = {}
+            for i, p in enumerate(images):
+                rel = str(p).lstrip("/")
+                if not _is_upload(rel):
+                    continue
+                full = _abs(rel)
+                if not os.path.isfile(full):
+                    stats["missing"] += 1
+                    continue
+                with open(full, "rb") as fh:
+                    blob = stage_stream(fh, os.path.basename(rel))
+                stats["files"] += 1
+                stats["bytes_before"] += blob.size
+                if blob.sha256 not in seen_blobs:
+                    seen_blobs.add(blob.sha256)
+                    stats["bytes_after"] += blob.size
+                migrated_files.add(rel)
+                staged[i] = blob
+
+            stats["challans"] += 1
+            if dry_run or not staged:
+                for blob in staged.values():
+                    blob.discard()
+                continue
+
+            order = sorted(staged)
+            blob_paths = attach_blobs(cur, tenant_id, challan_no, [staged[i] for i in order])
+            rewritten = list(images)
+            for i, path in zip(order, blob_paths):
+                rewritten[i] = path
+            cur.execute(
+                "UPDATE challans SET images=%s WHERE tenant_id=%s AND challan_no=%s",
+                (json.dumps(rewritten), tenant_id, challan_no),
+            )
+            conn.commit()
+
+        cur.close()
+
+    stats["blobs"] = len(seen_blobs)
+    if not dry_run:
+        for rel in migrated_files:
+            _remove_files(rel)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Challan upload blob store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate-uploads", help="dedupe static/uploads into the blob store")
+    migrate.add_argument("--dry-run", action="store_true")
+    sub.add_parser("sweep", help="delete files of blobs no challan references any more")
+    args = parser.parse_args()
+
+    from utils.migrations import upgrade
+    upgrade(verbose=False)
+    if args.command == "migrate-uploads":
+        result = migrate_uploads(dry_run=args.dry_run)
+        print(("🔎 Dry run: " if args.dry_run else "✅ Migrated: ") + json.dumps(result))
+        sys.exit(0)
+    if args.command == "sweep":
+        print(f"✅ Removed {sweep_unreferenced_blobs()} unreferenced blob file(s)")
+        sys.exit(0)
@@ -0,0 +1,289 @@
+import os
+from datetime import datetime
+from utils.db import db_connection
+from utils.jobs import register_handler, enqueue_job, enqueue_jobs
+from utils.pdf_qr_utils import generate_and_save_qr, generate_pdf, challan_pdf_url
+from utils.email_outbox import enqueue_email
+from utils.image_utils import create_renditions, rendition_for
+from utils.tenant_config import get_tenant_config
+
+ARTIFACTS_JOB = "challan_artifacts"
+
+
+# ----------------------------------------------------
+# 🔹 Helpers
+# ----------------------------------------------------
+def absolute_url(base_url, path):
+    """Join a stored relative static path onto the base URL captured at request time."""
+    if not path:
+        return None
+    if path.startswith("http://") or path.startswith("https://"):
+        return path
+    if not path.startswith("/"):
+        path = "/" + path
+    return f"{(base_url or '').rstrip('/')}{path}"
+
+
+def local_path(rel):
+    """Absolute filesystem path for a stored relative path, or None."""
+    if not rel:
+        return None
+    return os.path.join(os.getcwd(), str(rel).lstrip("/"))
+
+
+def load_tenant_design(tenant_id, base_url):
+    """Merged challan + branding config used by the PDF template."""
+    config = get_tenant_config(tenant_id) or {}
+    tenant_design = {**config.get("challan", {}), **config.get("branding", {})}
+    if tenant_design.get("logo_url"):
+        tenant_design["logo_url"] = absolute_url(base_url, tenant_design["logo_url"])
+    return tenant_design
+
+
+def enqueue_challan_artifacts(cur, tenant_id, challan_no, base_url, pdf_data, image_paths,
+                              qr_record=None, email_kind=None):
+    """
+    Queue QR/PDF/email generation for a challan in the caller's transaction.
+
+    - qr_record: non-sensitive fields for a fresh QR (None keeps the existing QR)
+    - email_kind: "created" / "updated" to queue the customer email once the PDF exists
+
+    The new job becomes the challan's latest_artifact_job_id: an older job
+    that is already running finishes without publishing anything.
+    """
+    payload = {
+        "base_url": base_url,
+        "pdf_data": pdf_data,
+        "image_paths": image_paths,
+        "qr_record": qr_record,
+        "email_kind": email_kind,
+    }
+    job_id = enqueue_job(cur, ARTIFACTS_JOB, tenant_id=tenant_id, challan_no=challan_no,
+                         payload=payload, supersede=True)
+    cur.execute(
+        """UPDATE challans SET pdf_status='pending', pdf_error=NULL, latest_artifact_job_id=%s
+           WHERE challan_no=%s AND tenant_id=%s""",
+        (job_id, challan_no, tenant_id),
+    )
+    return job_id
+
+
+def enqueue_batch_artifacts(cur, tenant_id, items, base_url):
+    """
+    Queue artifact jobs for freshly inserted challans (pdf_status already
+    'pending') with one multi-row INSERT. Each item is a dict with
+    challan_no, pdf_data, image_paths, qr_record, email_kind and optionally
+    `batch` ({id, email, challan_nos}) for a consolidated customer email.
+    The jobs run on all workers in parallel.
+    """
+    job_ids = enqueue_jobs(cur, ARTIFACTS_JOB, [
+        (tenant_id, item["challan_no"], {
+            "base_url": base_url,
+            "pdf_data": item["pdf_data"],
+            "image_paths": item.get("image_paths") or [],
+            "qr_record": item.get("qr_record"),
+            "email_kind": item.get("email_kind"),
+            "batch": item.get("batch"),
+        })
+        for item in items
+    ])
+    cur.execute(
+        """UPDATE challans c SET latest_artifact_job_id = j.id
+           FROM challan_jobs j
+           WHERE j.id = ANY(%s) AND c.tenant_id = j.tenant_id AND c.challan_no = j.challan_no""",
+        (job_ids,),
+    )
+    return job_ids
+
+
+def _queue_batch_email_if_settled(cur, tenant_id, batch):
+    """
+    Queue the consolidated email once every challan in `batch` has a final
+    PDF status. Serialized on an advisory lock so exactly one of the
+    batch's jobs (the last to finish) queues it.
+    """
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (batch["id"],))
+    cur.execute(
+        """SELECT challan_no, pdf_status, pdf_url, customer_name, serial_number, problem
+           FROM challans WHERE tenant_id=%s AND challan_no = ANY(%s)
+           ORDER BY challan_no""",
+        (tenant_id, batch["challan_nos"]),
+    )
+    rows = cur.fetchall()
+    if not rows or any(r[1] not in ("ready", "failed") for r in rows):
+        return None
+    cur.execute(
+        "SELECT 1 FROM email_outbox WHERE kind='challan_batch' AND tenant_id=%s AND payload->>'batch_id'=%s",
+        (tenant_id, batch["id"]),
+    )
+    if cur.fetchone():
+        return None  # a retried job already queued it
+    return enqueue_email(
+        cur, tenant_id, "challan_batch", batch["email"],
+        {
+            "batch_id": batch["id"],
+            "customer_name": rows[0][3],
+            "challan_nos": [r[0] for r in rows],
+            "challans": [
+                {"challan_no": r[0], "serial_number": r[4], "problem": r[5]} for r in rows
+            ],
+            "pdf_paths": [r[2] for r in rows if r[1] == "ready" and r[2]],
+        },
+    )
+
+
+# ----------------------------------------------------
+# 🔹 Worker handler
+# ----------------------------------------------------
+# rows this job may still write to; NULL covers jobs queued before 0010
+_LATEST_JOB = "(latest_artifact_job_id = %s OR latest_artifact_job_id IS NULL)"
+
+
+@register_handler(ARTIFACTS_JOB)
+def build_challan_artifacts(job):
+    """Generate QR + PDF for a challan, store the URLs and queue the customer email."""
+    tenant_id = job["tenant_id"]
+    challan_no = job["challan_no"]
+    payload = job["payload"]
+    base_url = payload.get("base_url")
+    pdf_data = dict(payload.get("pdf_data") or {})
+    image_paths = payload.get("image_paths") or []
+    qr_record = payload.get("qr_record")
+    email_kind = payload.get("email_kind")
+    batch = payload.get("batch")
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT qr_code_url, pdf_url, latest_artifact_job_id FROM challans WHERE challan_no=%s AND tenant_id=%s",
+            (challan_no, tenant_id),
+        )
+        row = cur.fetchone()
+        if not row:
+            print(f"⚠️ Challan {challan_no} no longer exists, skipping artifacts")
+            cur.close()
+            return
+        existing_qr_url, old_pdf, latest_job_id = row
+        if latest_job_id is not None and latest_job_id != job["id"]:
+            print(f"⏭️ Artifact job {job['id']} for {challan_no} superseded by {latest_job_id}, skipping")
+            cur.close()
+            return
+
+        cur.execute(
+            f"UPDATE challans SET pdf_status='processing' WHERE challan_no=%s AND tenant_id=%s AND {_LATEST_JOB}",
+            (challan_no, tenant_id, job["id"]),
+        )
+        conn.commit()
+        cur.close()
+
+    tenant_design = load_tenant_design(tenant_id, base_url)
+
+    # 🖼️ Renditions: downscaled copies for the PDF, emails and thumbnails
+    for p in image_paths:
+        create_renditions(p)
+
+    # 🔳 QR code
+    qr_url = existing_qr_url
+    qr_rel = None
+    if qr_record:
+        qr_rel = generate_and_save_qr(challan_no, qr_record, tenant_id=tenant_id)
+        qr_url = absolute_url(base_url, qr_rel) if qr_rel else None
+    elif existing_qr_url and "/static/" in existing_qr_url:
+        qr_rel = "/static/" + existing_qr_url.split("/static/", 1)[1]
+
+    # 🧾 PDF
+    pdf_data["images"] = [absolute_url(base_url, rendition_for(p, "print")) for p in image_paths]
+    pdf_data["qr_code_url"] = qr_rel
+    # rendered next to the published file and moved into place only if this
+    # job is still the latest one, so a superseded job never overwrites it
+    pdf_rel = challan_pdf_url(challan_no, tenant_id)
+    staging = f"{local_path(pdf_rel)}.job-{job['id']}"
+    if not generate_pdf(pdf_data, tenant_design, tenant_id=tenant_id, output_path=staging):
+        raise RuntimeError("PDF generation failed")
+
+    # ✉️ Email is queued with the PDF update, so it only goes out for a published PDF
+    to_email = pdf_data.get("email")
+    with db_connection() as conn:
+        cur = conn.cursor()
+        # the row lock serializes publishing with newer enqueues and jobs
+        cur.execute(
+            f"SELECT 1 FROM challans WHERE challan_no=%s AND tenant_id=%s AND {_LATEST_JOB} FOR UPDATE",
+            (challan_no, tenant_id, job["id"]),
+        )
+        if not cur.fetchone():
+            conn.rollback()
+            cur.close()
+            os.remove(staging)
+            print(f"⏭️ Artifact job {job['id']} for {challan_no} was superseded while rendering, discarded")
+            return
+        os.replace(staging, local_path(pdf_rel))
+        cur.execute(
+            """UPDATE challans SET qr_code_url=%s, pdf_url=%s, pdf_status='ready', pdf_error=NULL
+               WHERE challan_no=%s AND tenant_id=%s""",
+            (qr_url, pdf_rel, challan_no, tenant_id),
+        )
+        if email_kind and to_email:
+            enqueue_email(
+                cur, tenant_id, f"challan_{email_kind}", to_email,
+                {
+                    "challan": pdf_data,
+                    "pdf_path": pdf_rel,
+                    "image_paths": [rendition_for(p, "email") for p in image_paths],
+                },
+                challan_no=challan_no,
+            )
+        if batch:
+            _queue_batch_email_if_settled(cur, tenant_id, batch)
+        conn.commit()
+        cur.close()
+
+    if old_pdf and old_pdf != pdf_rel:
+        try:
+            old_full = local_path(old_pdf)
+            if os.path.exists(old_full):
+                os.remove(old_full)
+        except Exception as e:
+            print("⚠️ Could not remove old pdf:", e)
+
+
+def _mark_failed(job, error):
+    with db_connection() as conn:
+        cur = conn.cursor()
+        # a newer job owns the status once this one is superseded
+        cur.execute(
+            f"UPDATE challans SET pdf_status='failed', pdf_error=%s WHERE challan_no=%s AND tenant_id=%s AND {_LATEST_JOB}",
+            (error, job["challan_no"], job["tenant_id"], job["id"]),
+        )
+        # a failed PDF must not hold back the rest of a consolidated email
+        batch = (job.get("payload") or {}).get("batch")
+        if batch:
+            _queue_batch_email_if_settled(cur, job["tenant_id"], batch)
+        conn.commit()
+        cur.close()
+
+
+build_challan_artifacts.on_final_failure = _mark_failed
+
+
+def artifact_status(tenant_id, challan_no):
+    """Current artifact state for a challan, or None when it does not exist."""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT pdf_status, pdf_url, qr_code_url, pdf_error, email_sent
+               FROM challans WHERE challan_no=%s AND tenant_id=%s""",
+            (challan_no, tenant_id),
+        )
+        row = cur.fetchone()
+        cur.close()
+    if not row:
+        return None
+    return {
+        "challan_no": challan_no,
+        "pdf_status": row[0],
+        "pdf_url": row[1] if row[0] == "ready" else None,
+        "qr_code_url": row[2],
+        "error": row[3],
+        "email_sent": row[4],
+        "checked_at": datetime.utcnow().isoformat(),
+    }
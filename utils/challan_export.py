@@ -0,0 +1,255 @@
+"""
+Multi-challan export: one merged PDF (or a ZIP of the individual PDFs) for a
+filtered set of challans, e.g. a day's job sheets.
+
+Published challan PDFs are reused as they are; challans whose PDF is missing
+or failed are rendered into a scratch directory in parallel through the
+shared renderer pool (the challan's own PDF and status are left to the
+artifact job). The result is assembled into a temporary file on disk and
+streamed back in chunks, so the response body never sits in memory.
+
+Everything happens inside the request, so both halves are bounded: at most
+EXPORT_MAX_INLINE_RENDERS missing PDFs are rendered per export, and a merged
+PDF (which pypdf builds in memory before writing) may total at most
+EXPORT_MAX_MERGE_MB of source PDFs. ZIP exports are written file by file and
+only have the render limit.
+"""
+import os
+import json
+import shutil
+import zipfile
+import tempfile
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from utils.db import db_connection
+from utils.pdf_qr_utils import generate_pdf
+from utils.pdf_renderer import PDF_RENDER_WORKERS
+from utils.challan_artifacts import absolute_url, local_path, load_tenant_design
+from utils.image_utils import rendition_for
+
+try:
+    from pypdf import PdfWriter
+except ImportError:  # optional; ZIP exports work without it
+    PdfWriter = None
+
+# ============================================================
+# 🔹 CONFIGURATION
+# ============================================================
+EXPORT_MAX_CHALLANS = int(os.environ.get("EXPORT_MAX_CHALLANS", 500))
+# renders done inside the request; keep well within the gunicorn timeout
+EXPORT_MAX_INLINE_RENDERS = int(os.environ.get("EXPORT_MAX_INLINE_RENDERS", 20))
+# size of the source PDFs a merged export may hold in memory
+EXPORT_MAX_MERGE_MB = float(os.environ.get("EXPORT_MAX_MERGE_MB", 64))
+# threads feeding missing renders to the renderer pool (which caps wkhtmltopdf itself)
+EXPORT_RENDER_WORKERS = int(os.environ.get("EXPORT_RENDER_WORKERS", PDF_RENDER_WORKERS))
+EXPORT_CHUNK_BYTES = int(os.environ.get("EXPORT_CHUNK_BYTES", 64 * 1024))
+EXPORT_TMP_DIR = os.environ.get("EXPORT_TMP_DIR") or None
+
+FORMATS = ("pdf", "zip")
+
+EXPORT_SQL = """
+SELECT c.challan_no, c.customer_name, c.email, c.contact_number, c.serial_number, c.city,
+       c.problem, c.accessories, c.warranty, c.dispatch_through, c.items, c.status,
+       c.created_at, c.qr_code_url, c.pdf_url, c.pdf_status, c.images, u.name
+FROM challans c
+LEFT JOIN users u ON u.id = c.employee_id AND u.tenant_id = c.tenant_id
+WHERE {where}
+ORDER BY c.created_at, c.challan_no
+LIMIT %s
+"""
+
+
+class ExportTooLarge(ValueError):
+    """More challans match than EXPORT_MAX_CHALLANS, or a merge would exceed EXPORT_MAX_MERGE_MB."""
+
+
+class ExportNotReady(ValueError):
+    """More challans lack a published PDF than EXPORT_MAX_INLINE_RENDERS."""
+
+
+def merge_available():
+    return PdfWriter is not None
+
+
+def _json_list(v):
+    if isinstance(v, list):
+        return v
+    try:
+        parsed = json.loads(v) if v else []
+        return parsed if isinstance(parsed, list) else []
+    except Exception:
+        return []
+
+
+def find_export_rows(tenant_id, date_from=None, date_to=None, status=None):
+    """
+    Challans to export, oldest first. `date_to` is exclusive. Raises
+    ExportTooLarge instead of silently truncating the set.
+    """
+    where = ["c.tenant_id=%s"]
+    params = [tenant_id]
+    if status:
+        where.append("c.status=%s")
+        params.append(status)
+    if date_from:
+        where.append("c.created_at >= %s")
+        params.append(date_from)
+    if date_to:
+        where.append("c.created_at < %s")
+        params.append(date_to)
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(EXPORT_SQL.format(where=" AND ".join(where)), params + [EXPORT_MAX_CHALLANS + 1])
+        rows = cur.fetchall()
+        cur.close()
+
+    if len(rows) > EXPORT_MAX_CHALLANS:
+        raise ExportTooLarge(f"More than {EXPORT_MAX_CHALLANS} challans match; narrow the date range")
+
+    return [
+        {
+            "challan_no": r[0],
+            "customer_name": r[1],
+            "email": r[2],
+            "contact_number": r[3],
+            "serial_number": r[4],
+            "city": r[5],
+            "problem": r[6],
+            "accessories": _json_list(r[7]),
+            "warranty": r[8],
+            "dispatch_through": r[9],
+            "items": _json_list(r[10]),
+            "status": r[11],
+            "created_at": r[12],
+            "qr_code_url": r[13],
+            "pdf_url": r[14],
+            "pdf_status": r[15],
+            "images": _json_list(r[16]),
+            "employee_name": r[17],
+        }
+        for r in rows
+    ]
+
+
+def _published_pdf(row):
+    """Local path of the challan's current PDF, if it is ready and on disk."""
+    if row["pdf_status"] != "ready" or not row["pdf_url"]:
+        return None
+    path = local_path(row["pdf_url"])
+    return path if path and os.path.isfile(path) else None
+
+
+def _render(tenant_id, row, tenant_design, base_url, dest):
+    """Render a challan without a usable PDF into `dest` (same template as the artifact job)."""
+    qr_rel = None
+    if row["qr_code_url"] and "/static/" in row["qr_code_url"]:
+        qr_rel = "/static/" + row["qr_code_url"].split("/static/", 1)[1]
+    pdf_data = {
+        key: row[key] for key in (
+            "challan_no", "customer_name", "email", "contact_number", "serial_number", "city",
+            "problem", "accessories", "warranty", "dispatch_through", "employee_name", "items", "status",
+        )
+    }
+    pdf_data["created_at"] = row["created_at"].strftime("%d/%m/%Y, %I:%M %p") if row["created_at"] else None
+    pdf_data["images"] = [absolute_url(base_url, rendition_for(p, "print")) for p in row["images"]]
+    pdf_data["qr_code_url"] = qr_rel
+    return generate_pdf(pdf_data, tenant_design, tenant_id=tenant_id, output_path=dest)
+
+
+def collect_pdfs(tenant_id, rows, base_url, scratch_dir):
+    """
+    One local PDF path per row (None when it could not be produced), in row
+    order, plus counts of reused and rendered documents. Raises
+    ExportNotReady before rendering anything if too many PDFs are missing.
+    """
+    paths = [_published_pdf(row) for row in rows]
+    missing = [i for i, p in enumerate(paths) if p is None]
+    if len(missing) > EXPORT_MAX_INLINE_RENDERS:
+        raise ExportNotReady(
+            f"{len(missing)} of these challans have no PDF yet (at most {EXPORT_MAX_INLINE_RENDERS} "
+            "are rendered per export); retry once their PDFs are ready or narrow the date range"
+        )
+    rendered = 0
+    if missing:
+        tenant_design = load_tenant_design(tenant_id, base_url)
+        with ThreadPoolExecutor(max_workers=max(1, EXPORT_RENDER_WORKERS), thread_name_prefix="export") as pool:
+            # renders are charged to the calling request's Server-Timing
+            futures = {
+                i: pool.submit(contextvars.copy_context().run, _render, tenant_id, rows[i], tenant_design,
+                               base_url, os.path.join(scratch_dir, f"{i:05d}.pdf"))
+                for i in missing
+            }
+            for i, future in futures.items():
+                paths[i] = future.result()
+                rendered += 1 if paths[i] else 0
+    return paths, {"reused": len(rows) - len(missing), "rendered": rendered}
+
+
+def _zip_name(challan_no):
+    return "".join(ch if ch.isalnum() or ch in "-_." else "-" for ch in str(challan_no)) + ".pdf"
+
+
+def build_export(tenant_id, rows, base_url, fmt="pdf"):
+    """
+    Write the export to a temporary file and return (path, stats). The
+    caller owns the file (stream_file() removes it once sent).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    if fmt == "pdf" and not merge_available():
+        raise RuntimeError("Merged PDF export needs the pypdf package; use format=zip")
+
+    scratch_dir = tempfile.mkdtemp(prefix="challan-export-", dir=EXPORT_TMP_DIR)
+    try:
+        paths, stats = collect_pdfs(tenant_id, rows, base_url, scratch_dir)
+        stats["missing"] = [row["challan_no"] for row, p in zip(rows, paths) if not p]
+        if fmt == "pdf":
+            merge_mb = sum(os.path.getsize(p) for p in paths if p) / (1024 * 1024)
+            if merge_mb > EXPORT_MAX_MERGE_MB:
+                raise ExportTooLarge(
+                    f"Merged PDF would be {merge_mb:.0f} MB (limit {EXPORT_MAX_MERGE_MB:.0f} MB); "
+                    "use format=zip or narrow the date range"
+                )
+
+        fd, out_path = tempfile.mkstemp(suffix=f".{fmt}", prefix="challan-export-", dir=EXPORT_TMP_DIR)
+        os.close(fd)
+        try:
+            if fmt == "zip":
+                # PDFs are already compressed; store them as-is
+                with zipfile.ZipFile(out_path, "w", zipfile.ZIP_STORED) as zf:
+                    for row, path in zip(rows, paths):
+                        if path:
+                            zf.write(path, arcname=_zip_name(row["challan_no"]))
+            else:
+                writer = PdfWriter()
+                for row, path in zip(rows, paths):
+                    if path:
+                        writer.append(path, outline_item=str(row["challan_no"]))
+                with open(out_path, "wb") as f:
+                    writer.write(f)
+                writer.close()
+        except Exception:
+            os.remove(out_path)
+            raise
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    stats["count"] = len(rows) - len(stats["missing"])
+    return out_path, stats
+
+
+def stream_file(path, chunk_size=EXPORT_CHUNK_BYTES):
+    """Yield a file in chunks and delete it afterwards (also if the client goes away)."""
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,203 @@
+"""
+Collision-free challan numbers from a per-tenant counter
+(migrations/0008_challan_number_counters.sql).
+
+Each process reserves a block of CHALLAN_NO_BLOCK_SIZE sequence values per
+tenant with a single upsert and hands them out from memory, so creating
+challans does not serialize on one row. Numbers are unique per tenant and
+increase within a process; blocks held by different processes interleave,
+and values reserved by a process that exits are skipped. Set the block size
+to 1 for strictly gap-free, ordered numbering.
+
+The human-readable form comes from the tenant's challan_config:
+
+    {"challan_prefix": "PC", "challan_number_format": "{prefix}-{yyyy}-{seq:05d}"}
+
+Placeholders: {prefix} {seq} {yyyy} {yy} {mm} {dd}, optionally with a
+format spec ({seq:05d}); {seq} is required. Characters other than
+letters, digits, '.', '_' and '-' are replaced with '-' so numbers stay
+safe in URLs and file names.
+"""
+import os
+import re
+import string
+import threading
+from datetime import datetime
+from utils.db import db_connection
+from utils.tenant_config import get_tenant_config
+
+# ============================================================
+# 🔹 CONFIGURATION
+# ============================================================
+CHALLAN_NO_BLOCK_SIZE = int(os.environ.get("CHALLAN_NO_BLOCK_SIZE", 50))
+DEFAULT_PREFIX = "CH"
+DEFAULT_FORMAT = "{prefix}-{seq:06d}"
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9._-]+")
+_PREFIX_RE = re.compile(r"^[A-Za-z0-9._-]{1,20}$")
+FORMAT_FIELDS = ("prefix", "seq", "yyyy", "yy", "mm", "dd")
+
+RESERVE_SQL = """
+INSERT INTO challan_number_counters (tenant_id, next_value) VALUES (%s, 1 + %s)
+ON CONFLICT (tenant_id) DO UPDATE
+    SET next_value = challan_number_counters.next_value + EXCLUDED.next_value - 1,
+        updated_at = NOW()
+RETURNING next_value
+"""
+
+
+def _fields(prefix, seq, when):
+    return {
+        "prefix": prefix,
+        "seq": seq,
+        "yyyy": when.strftime("%Y"),
+        "yy": when.strftime("%y"),
+        "mm": when.strftime("%m"),
+        "dd": when.strftime("%d"),
+    }
+
+
+def number_format_error(fmt):
+    """Why `fmt` is not a usable challan_number_format, or None if it is."""
+    if not isinstance(fmt, str) or not fmt.strip():
+        return "challan_number_format must be a non-empty string"
+    try:
+        parsed = list(string.Formatter().parse(fmt))
+    except ValueError as e:
+        return f"challan_number_format is malformed: {e}"
+    names = []
+    for _, name, spec, conversion in parsed:
+        if name is None:
+            continue
+        # plain documented fields only: no {seq[0]}, {seq.real}, {0}, {seq!r} or nested specs
+        if name not in FORMAT_FIELDS or conversion is not None or "{" in (spec or ""):
+            return f"challan_number_format may only use {', '.join('{' + f + '}' for f in FORMAT_FIELDS)}"
+        names.append(name)
+    if "seq" not in names:
+        return "challan_number_format must contain {seq}"
+    try:
+        sample = fmt.format(**_fields(DEFAULT_PREFIX, 1, datetime.now()))
+    except (ValueError, TypeError) as e:
+        return f"challan_number_format has an invalid format spec: {e}"
+    if not _UNSAFE_CHARS.sub("-", sample).strip("-"):
+        return "challan_number_format renders an empty challan number"
+    return None
+
+
+def prefix_error(prefix):
+    """Why `prefix` is not a usable challan_prefix, or None if it is."""
+    if not isinstance(prefix, str) or not _PREFIX_RE.match(prefix):
+        return "challan_prefix must be 1-20 letters, digits, '.', '_' or '-'"
+    return None
+
+
+def format_challan_no(fmt, prefix, seq, when=None):
+    """Render one challan number; falls back to the default format if `fmt` is unusable."""
+    fields = _fields(prefix, seq, when or datetime.now())
+    error = number_format_error(fmt)
+    if error is None:
+        try:
+            value = fmt.format(**fields)
+        except Exception as e:  # never let a tenant setting break challan creation
+            error = str(e)
+    if error is not None:
+        print(f"⚠️ Invalid challan_number_format {fmt!r} ({error}); using default")
+        value = DEFAULT_FORMAT.format(**fields)
+    return _UNSAFE_CHARS.sub("-", value).strip("-")
+
+
+def tenant_number_format(tenant_id):
+    """(format, prefix) from the tenant's challan_config."""
+    config = get_tenant_config(tenant_id) or {}
+    challan_cfg = config.get("challan", {})
+    fmt = str(challan_cfg.get("challan_number_format") or DEFAULT_FORMAT)
+    prefix = str(challan_cfg.get("challan_prefix") or DEFAULT_PREFIX)
+    return fmt, prefix
+
+
+class ChallanNumberAllocator:
+    """Hands out per-tenant sequence values from blocks reserved in Postgres."""
+
+    def __init__(self, block_size=CHALLAN_NO_BLOCK_SIZE):
+        self.block_size = max(1, block_size)
+        self._lock = threading.Lock()
+        self._tenant_locks = {}
+        self._blocks = {}   # tenant_id -> [next_value, end_exclusive]
+        self._stats = {"allocated": 0, "reservations": 0}
+
+    def _tenant_lock(self, tenant_id):
+        with self._lock:
+            return self._tenant_locks.setdefault(tenant_id, threading.Lock())
+
+    def _reserve(self, tenant_id, size):
+        """Reserve `size` values for this process; returns [start, end)."""
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(RESERVE_SQL, (tenant_id, size))
+            end = cur.fetchone()[0]
+            conn.commit()
+            cur.close()
+        with self._lock:
+            self._stats["reservations"] += 1
+        return [end - size, end]
+
+    def next_values(self, tenant_id, count=1):
+        """`count` unique sequence values for a tenant."""
+        values = []
+        with self._tenant_lock(tenant_id):
+            block = self._blocks.get(tenant_id)
+            while len(values) < count:
+                if not block or block[0] >= block[1]:
+                    block = self._reserve(tenant_id, max(self.block_size, count - len(values)))
+                    self._blocks[tenant_id] = block
+                take = min(count - len(values), block[1] - block[0])
+                values.extend(range(block[0], block[0] + take))
+                block[0] += take
+        with self._lock:
+            self._stats["allocated"] += count
+        return values
+
+    def allocate(self, tenant_id, count=1, when=None):
+        """`count` formatted challan numbers for a tenant."""
+        fmt, prefix = tenant_number_format(tenant_id)
+        when = when or datetime.now()
+        return [format_challan_no(fmt, prefix, seq, when) for seq in self.next_values(tenant_id, count)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                "block_size": self.block_size,
+                "tenants": len(self._blocks),
+                "cached_values": sum(max(0, b[1] - b[0]) for b in self._blocks.values()),
+            }
+
+
+_allocator = None
+_allocator_pid = None
+_allocator_lock = threading.Lock()
+
+
+def get_allocator():
+    """Process-wide allocator (recreated after fork so blocks are never shared)."""
+    global _allocator, _allocator_pid
+    pid = os.getpid()
+    if _allocator is None or _allocator_pid != pid:
+        with _allocator_lock:
+            if _allocator is None or _allocator_pid != pid:
+                _allocator, _allocator_pid = ChallanNumberAllocator(), pid
+    return _allocator
+
+
+def allocate_challan_numbers(tenant_id, count=1):
+    return get_allocator().allocate(tenant_id, count)
+
+
+def allocate_challan_no(tenant_id):
+    return get_allocator().allocate(tenant_id, 1)[0]
+
+
+def get_allocator_stats():
+    if _allocator is None or _allocator_pid != os.getpid():
+        return {"allocated": 0, "reservations": 0, "block_size": max(1, CHALLAN_NO_BLOCK_SIZE),
+                "tenants": 0, "cached_values": 0}
+    return _allocator.stats()
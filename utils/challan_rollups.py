@@ -0,0 +1,140 @@
+"""
+Daily challan rollups (migrations/0006_challan_daily_rollups.sql) and the
+queries behind /api/tenant/dashboard/timeseries.
+
+Rebuild a tenant's rollups from `challans` (or all tenants):
+
+    python -m utils.challan_rollups rebuild [--tenant 12]
+"""
+import argparse
+from datetime import timedelta
+from utils.db import db_connection
+
+# upper bounds (hours) of the turnaround histogram buckets; the last bucket is open-ended
+TURNAROUND_BUCKET_HOURS = [1, 2, 4, 8, 12, 24, 48, 72, 120, 168, 336, 720]
+
+
+def _sum_hist(a, b):
+    if not a:
+        return list(b or [])
+    return [x + y for x, y in zip(a, b or [0] * len(a))]
+
+
+def median_turnaround_hours(hist):
+    """Median from a turnaround histogram, interpolated inside the median bucket."""
+    total = sum(hist or [])
+    if not total:
+        return None
+    half = total / 2.0
+    seen = 0
+    for i, count in enumerate(hist):
+        if count and seen + count >= half:
+            lower = TURNAROUND_BUCKET_HOURS[i - 1] if i > 0 else 0
+            if i >= len(TURNAROUND_BUCKET_HOURS):
+                return float(lower)
+            upper = TURNAROUND_BUCKET_HOURS[i]
+            return round(lower + (upper - lower) * (half - seen) / count, 2)
+        seen += count
+    return None
+
+
+def _summary(created, delivered, seconds, hist):
+    return {
+        "created": created,
+        "delivered": delivered,
+        "median_turnaround_hours": median_turnaround_hours(hist),
+        "avg_turnaround_hours": round(seconds / delivered / 3600, 2) if delivered else None,
+    }
+
+
+def _period_start(day, bucket):
+    return day - timedelta(days=day.weekday()) if bucket == "week" else day
+
+
+def timeseries(tenant_id, start, end, bucket="day", employee_id=None):
+    """
+    Created/delivered counts and turnaround per day or ISO week in
+    [start, end] plus per-employee throughput, read from the rollup table.
+    """
+    where = "r.tenant_id = %s AND r.day BETWEEN %s AND %s"
+    params = [tenant_id, start, end]
+    if employee_id is not None:
+        where += " AND r.employee_id = %s"
+        params.append(employee_id)
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"""SELECT r.day, r.employee_id, u.name, r.created, r.delivered,
+                       r.turnaround_seconds, r.turnaround_hist
+                FROM challan_daily_rollups r
+                LEFT JOIN users u ON u.id = r.employee_id AND u.tenant_id = r.tenant_id
+                WHERE {where}
+                ORDER BY r.day""",
+            params,
+        )
+        rows = cur.fetchall()
+        cur.close()
+
+    # fill every period so charts get a continuous axis
+    periods = {}
+    day = _period_start(start, bucket)
+    while day <= end:
+        periods[day] = [0, 0, 0, []]
+        day += timedelta(days=7 if bucket == "week" else 1)
+
+    employees = {}
+    totals = [0, 0, 0, []]
+    for day, emp_id, name, created, delivered, seconds, hist in rows:
+        for acc in (periods.setdefault(_period_start(day, bucket), [0, 0, 0, []]),
+                    employees.setdefault(emp_id, [0, 0, 0, [], name]),
+                    totals):
+            acc[0] += created
+            acc[1] += delivered
+            acc[2] += seconds
+            acc[3] = _sum_hist(acc[3], hist)
+
+    return {
+        "bucket": bucket,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "series": [
+            {"period": p.isoformat(), **_summary(*periods[p])} for p in sorted(periods)
+        ],
+        "employees": sorted(
+            [
+                {"employee_id": emp_id or None, "name": v[4] or ("Unknown" if not emp_id else None), **_summary(*v[:4])}
+                for emp_id, v in employees.items()
+            ],
+            key=lambda e: -e["created"],
+        ),
+        "totals": _summary(*totals),
+    }
+
+
+def rebuild(tenant_id=None):
+    """Recompute rollups from `challans` while holding off concurrent writers."""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("LOCK TABLE challans IN SHARE ROW EXCLUSIVE MODE")
+        if tenant_id is None:
+            cur.execute("DELETE FROM challan_daily_rollups")
+            cur.execute("SELECT challan_rollup_apply(c, 1) FROM challans c")
+        else:
+            cur.execute("DELETE FROM challan_daily_rollups WHERE tenant_id = %s", (tenant_id,))
+            cur.execute("SELECT challan_rollup_apply(c, 1) FROM challans c WHERE tenant_id = %s", (tenant_id,))
+        applied = cur.rowcount
+        conn.commit()
+        cur.close()
+    return applied
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Challan daily rollups")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--tenant", type=int, default=None)
+    args = parser.parse_args()
+
+    count = rebuild(args.tenant)
+    print(f"✅ Rebuilt rollups from {count} challan(s)")
+
@@ -0,0 +1,120 @@
+"""
+Per-tenant challan counters (migrations/0005_tenant_challan_counters.sql).
+
+The counters are maintained by a trigger on `challans`; reconciliation
+recounts the source table and repairs any drift:
+
+    python -m utils.dashboard_counters reconcile [--dry-run]
+
+It is also registered as the "reconcile_counters" job type.
+"""
+import argparse
+from utils.db import db_connection
+from utils.jobs import register_handler
+
+RECONCILE_JOB = "reconcile_counters"
+
+COUNTERS_SQL = "SELECT total, pending, delivered FROM tenant_challan_counters WHERE tenant_id = %s"
+
+AGGREGATE_SQL = """
+SELECT COUNT(*),
+       COUNT(*) FILTER (WHERE status = 'pending'),
+       COUNT(*) FILTER (WHERE status = 'delivered')
+FROM challans WHERE tenant_id = %s
+"""
+
+
+def get_counters(tenant_id):
+    """(total, pending, delivered) for a tenant from the counter row."""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(COUNTERS_SQL, (tenant_id,))
+        row = cur.fetchone()
+        if row is None:
+            # tenant has never had a challan (or counters were never seeded)
+            cur.execute(AGGREGATE_SQL, (tenant_id,))
+            row = cur.fetchone()
+        cur.close()
+    return {"total": row[0], "pending": row[1], "delivered": row[2]}
+
+
+def reconcile_counters(fix=True):
+    """
+    Compare every tenant's counters with a grouped count of `challans`.
+    Drifted tenants are recounted under the counter row lock (so concurrent
+    triggers queue behind the fix) and corrected when `fix` is set.
+    Returns a list of {tenant_id, counters, actual}.
+    """
+    mismatches = []
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            WITH actual AS (
+                SELECT tenant_id,
+                       COUNT(*) AS total,
+                       COUNT(*) FILTER (WHERE status = 'pending') AS pending,
+                       COUNT(*) FILTER (WHERE status = 'delivered') AS delivered
+                FROM challans GROUP BY tenant_id
+            )
+            SELECT COALESCE(a.tenant_id, c.tenant_id),
+                   c.total, c.pending, c.delivered,
+                   COALESCE(a.total, 0), COALESCE(a.pending, 0), COALESCE(a.delivered, 0)
+            FROM actual a
+            FULL OUTER JOIN tenant_challan_counters c ON c.tenant_id = a.tenant_id
+            WHERE c.tenant_id IS NULL
+               OR a.tenant_id IS NULL AND (c.total, c.pending, c.delivered) <> (0, 0, 0)
+               OR (c.total, c.pending, c.delivered) <> (a.total, a.pending, a.delivered)
+        """)
+        drifted = cur.fetchall()
+        conn.commit()
+
+        for row in drifted:
+            tenant_id = row[0]
+            if fix:
+                cur.execute(
+                    "INSERT INTO tenant_challan_counters (tenant_id) VALUES (%s) ON CONFLICT DO NOTHING",
+                    (tenant_id,),
+                )
+                cur.execute(
+                    "SELECT 1 FROM tenant_challan_counters WHERE tenant_id = %s FOR UPDATE",
+                    (tenant_id,),
+                )
+                cur.execute(AGGREGATE_SQL, (tenant_id,))
+                actual = cur.fetchone()
+                cur.execute(
+                    """UPDATE tenant_challan_counters
+                       SET total=%s, pending=%s, delivered=%s, updated_at=NOW()
+                       WHERE tenant_id=%s""",
+                    (actual[0], actual[1], actual[2], tenant_id),
+                )
+                conn.commit()
+            else:
+                actual = row[4:7]
+            mismatches.append({
+                "tenant_id": tenant_id,
+                "counters": None if row[1] is None else {"total": row[1], "pending": row[2], "delivered": row[3]},
+                "actual": {"total": actual[0], "pending": actual[1], "delivered": actual[2]},
+            })
+        cur.close()
+
+    for m in mismatches:
+        print(f"⚠️ Counter drift for tenant {m['tenant_id']}: {m['counters']} -> {m['actual']}")
+    return mismatches
+
+
+@register_handler(RECONCILE_JOB)
+def reconcile_counters_job(job):
+    reconcile_counters(fix=not (job.get("payload") or {}).get("dry_run"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tenant dashboard counters")
+    parser.add_argument("command", choices=["reconcile"])
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    result = reconcile_counters(fix=not args.dry_run)
+    if not result:
+        print("✅ Counters match")
+    else:
+        print(f"{'🔎' if args.dry_run else '✅'} {len(result)} tenant(s) {'drifted' if args.dry_run else 'repaired'}")
@@ -1,4 +1,10 @@
 import psycopg2, os
+import threading
+import time
+from contextlib import contextmanager
+from psycopg2 import extensions
+from utils.metrics import observe_component
+from utils.query_log import InstrumentedCursor, instrumented_factory
 
 DB_CONFIG = {
     "dbname": os.environ.get("DB_NAME", "Challan_maker_enterprise"),
@@ -8,9 +14,340 @@ DB_CONFIG = {
     "port": os.environ.get("DB_PORT", "5432"),
 }
 
+# ============================================================
+# 🔹 POOL CONFIGURATION
+# ============================================================
+DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+# Idle connections older than this are pinged with SELECT 1 before reuse
+DB_POOL_HEALTHCHECK_SECONDS = float(os.environ.get("DB_POOL_HEALTHCHECK_SECONDS", 30))
+# Connections are recycled after this many seconds (0 disables)
+DB_POOL_MAX_LIFETIME = float(os.environ.get("DB_POOL_MAX_LIFETIME", 1800))
+
+
+class PoolTimeoutError(psycopg2.OperationalError):
+    """Raised when no pooled connection frees up within DB_POOL_TIMEOUT."""
+
+
+class PooledConnection:
+    """
+    Thin proxy around a psycopg2 connection checked out from the pool.
+    close() hands the connection back instead of closing the socket, so
+    existing `conn.close()` call sites keep working unchanged.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._released = False
+        self._checked_out_at = time.perf_counter()
+
+    def __getattr__(self, name):
+        if self.__dict__.get("_released", True):
+            raise psycopg2.InterfaceError("connection already closed")
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        if self.__dict__.get("_released", True):
+            raise psycopg2.InterfaceError("connection already closed")
+        # explicit factories (RealDictCursor, ...) get the instrumented subclass too
+        if kwargs.get("cursor_factory") is not None:
+            kwargs["cursor_factory"] = instrumented_factory(kwargs["cursor_factory"])
+        return self._raw.cursor(*args, **kwargs)
+
+    @property
+    def closed(self):
+        if self._released:
+            return 1
+        return self._raw.closed
+
+    def close(self):
+        if self.__dict__.get("_released", True):
+            return
+        self._released = True
+        self._pool.release(self._raw)
+        # time the connection was held ("db" in Server-Timing / metrics)
+        observe_component("db", time.perf_counter() - self._checked_out_at)
+
+    def __del__(self):
+        # safety net for call sites that bail out before close()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self._released:
+            if exc_type is not None:
+                try:
+                    self._raw.rollback()
+                except Exception:
+                    pass
+            self.close()
+        return False
+
+
+class ConnectionPool:
+    """
+    Process-wide, thread-safe PostgreSQL connection pool.
+
+    - keeps between `minconn` and `maxconn` connections open
+    - callers block up to `timeout` seconds when every connection is in use
+    - idle connections are health-checked on checkout and reset on return
+    """
+
+    def __init__(self, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT,
+                 healthcheck_seconds=DB_POOL_HEALTHCHECK_SECONDS, max_lifetime=DB_POOL_MAX_LIFETIME,
+                 **connect_kwargs):
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn, self.minconn)
+        self.timeout = timeout
+        self.healthcheck_seconds = healthcheck_seconds
+        self.max_lifetime = max_lifetime
+        self.connect_kwargs = connect_kwargs or dict(DB_CONFIG)
+
+        self._cond = threading.Condition(threading.RLock())
+        self._idle = []            # [(raw_conn, created_at, last_used_at)]
+        self._created_at = {}      # id(raw_conn) -> created_at
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+
+        # counters for monitoring
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._checkout_time_total = 0.0
+        self._checkout_time_max = 0.0
+
+    # ---------------- internal helpers ----------------
+    @property
+    def _size(self):
+        return self._in_use + len(self._idle)
+
+    def _connect(self):
+        # every cursor is timed / slow-logged (utils/query_log.py)
+        raw = psycopg2.connect(cursor_factory=InstrumentedCursor, **self.connect_kwargs)
+        self._created_at[id(raw)] = time.monotonic()
+        return raw
+
+    def _discard(self, raw):
+        self._created_at.pop(id(raw), None)
+        self._discarded += 1
+        try:
+            if not raw.closed:
+                raw.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, raw, created_at, last_used_at):
+        if raw.closed:
+            return False
+        now = time.monotonic()
+        if self.max_lifetime and now - created_at > self.max_lifetime:
+            return False
+        if now - last_used_at < self.healthcheck_seconds:
+            return True
+        try:
+            cur = raw.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            cur.close()
+            raw.rollback()
+            return True
+        except Exception:
+            return False
+
+    # ---------------- public API ----------------
+    def getconn(self):
+        """Check out a connection, blocking while the pool is exhausted."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while True:
+            candidate = None
+            with self._cond:
+                if self._closed:
+                    raise psycopg2.InterfaceError("connection pool is closed")
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"Timed out after {self.timeout}s waiting for a DB connection "
+                            f"(pool max={self.maxconn})"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                if self._idle:
+                    candidate = self._idle.pop()
+                # reserve the slot before leaving the lock so concurrent callers respect maxconn
+                self._in_use += 1
+
+            try:
+                if candidate is None:
+                    raw = self._connect()
+                else:
+                    raw, created_at, last_used_at = candidate
+                    if not self._is_healthy(raw, created_at, last_used_at):
+                        with self._cond:
+                            self._discard(raw)
+                            self._in_use -= 1
+                            self._cond.notify()
+                        continue
+            except Exception:
+                with self._cond:
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+
+            elapsed = time.monotonic() - started
+            with self._cond:
+                self._checkouts += 1
+                self._checkout_time_total += elapsed
+                self._checkout_time_max = max(self._checkout_time_max, elapsed)
+            return raw
+
+    def release(self, raw):
+        """Return a connection to the pool, resetting its session state."""
+        healthy = not raw.closed
+        if healthy:
+            try:
+                status = raw.get_transaction_status()
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    healthy = False
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    raw.rollback()
+                if healthy and raw.autocommit:
+                    raw.autocommit = False
+            except Exception:
+                healthy = False
+
+        with self._cond:
+            self._in_use -= 1
+            if healthy and not self._closed:
+                self._idle.append((raw, self._created_at.get(id(raw), time.monotonic()), time.monotonic()))
+            else:
+                self._discard(raw)
+            self._cond.notify()
+
+    def fill(self):
+        """Open connections up to `minconn` (used on first use and after fork)."""
+        with self._cond:
+            missing = self.minconn - self._size
+            self._in_use += max(0, missing)
+        opened = []
+        try:
+            for _ in range(max(0, missing)):
+                opened.append(self._connect())
+        finally:
+            with self._cond:
+                self._in_use -= max(0, missing)
+                now = time.monotonic()
+                self._idle.extend((raw, now, now) for raw in opened)
+                self._cond.notify_all()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            for raw, _, _ in self._idle:
+                self._discard(raw)
+            self._idle = []
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "min": self.minconn,
+                "max": self.maxconn,
+                "checkouts": checkouts,
+                "timeouts": self._timeouts,
+                "discarded": self._discarded,
+                "checkout_latency_avg_ms": round(self._checkout_time_total / checkouts * 1000, 3) if checkouts else 0.0,
+                "checkout_latency_max_ms": round(self._checkout_time_max * 1000, 3),
+            }
+
+
+# ============================================================
+# 🔹 PROCESS-WIDE POOL
+# ============================================================
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Return the pool for the current process, creating it lazily.
+    A pool inherited across fork (gunicorn --preload) is dropped without
+    closing its sockets, since the parent still owns them.
+    """
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            pool = ConnectionPool(**DB_CONFIG)
+            pool.fill()
+            _pool, _pool_pid = pool, pid
+    return _pool
+
+
 def get_db_connection():
-    return psycopg2.connect(**DB_CONFIG)
+    """
+    Check out a pooled connection. Calling close() on it (or leaving a
+    `with` block) returns it to the pool.
+    """
+    pool = get_pool()
+    started = time.perf_counter()
+    raw = pool.getconn()
+    observe_component("db_wait", time.perf_counter() - started)
+    return PooledConnection(pool, raw)
+
+
+@contextmanager
+def db_connection():
+    """
+    Context manager around a pooled connection:
+
+        with db_connection() as conn:
+            cur = conn.cursor()
+            ...
+
+    Uncommitted work is rolled back and the connection is returned on exit.
+    """
+    conn = get_db_connection()
+    try:
+        yield conn
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
+        conn.close()
+
 
+def get_pool_stats():
+    """Snapshot of pool usage for monitoring endpoints."""
+    if _pool is None or _pool_pid != os.getpid():
+        return {"size": 0, "in_use": 0, "idle": 0, "waiting": 0,
+                "min": DB_POOL_MIN, "max": DB_POOL_MAX, "checkouts": 0, "timeouts": 0,
+                "discarded": 0, "checkout_latency_avg_ms": 0.0, "checkout_latency_max_ms": 0.0}
+    return _pool.stats()
 
 
 # import psycopg2
@@ -0,0 +1,275 @@
+"""
+Durable outbox for customer emails (migrations/0007_email_outbox.sql).
+
+Producers insert a row in the same transaction as the change that triggers
+the email; the job workers (utils/jobs.run_worker) drain it. Interactive
+emails (OTP, delivery confirmation) are also handed to the bounded background
+executor right after commit, so they do not wait for a worker. A failed send
+is rescheduled with exponential backoff and jitter instead of sleeping in a
+thread, and `challans.email_sent` is only set once the SMTP server accepted
+the message.
+
+    python -m utils.email_outbox status
+    python -m utils.email_outbox requeue-failed [--tenant 12]
+"""
+import os
+import json
+import random
+import argparse
+import traceback
+from utils.db import db_connection
+from utils.email_utils import send_email
+from utils.executor import get_executor, ExecutorSaturated
+from utils.metrics import timed
+
+# ============================================================
+# 🔹 CONFIGURATION
+# ============================================================
+EMAIL_CHANNEL = "email_outbox"
+EMAIL_MAX_ATTEMPTS = int(os.environ.get("EMAIL_MAX_ATTEMPTS", 8))
+EMAIL_RETRY_BASE_SECONDS = float(os.environ.get("EMAIL_RETRY_BASE_SECONDS", 30))
+EMAIL_RETRY_MAX_SECONDS = float(os.environ.get("EMAIL_RETRY_MAX_SECONDS", 3600))
+# A 'sending' row whose worker died is handed out again after this window
+EMAIL_LOCK_TIMEOUT_SECONDS = int(os.environ.get("EMAIL_LOCK_TIMEOUT_SECONDS", 300))
+
+# kinds that mean "the customer has their challan" once delivered
+MARKS_EMAIL_SENT = {"challan_created", "challan_updated", "challan_batch", "delivery_confirmation"}
+# an older queued email for the same challan is pointless once a newer one is queued
+_SUPERSEDABLE = {"challan_created", "challan_updated"}
+# payload keys dropped once the message is out
+_SENSITIVE_KEYS = ["otp_code"]
+
+
+# ============================================================
+# 🔹 PRODUCER SIDE
+# ============================================================
+@timed("email_enqueue")
+def enqueue_email(cur, tenant_id, kind, to_email, payload, challan_no=None,
+                  expires_in_seconds=None, max_attempts=EMAIL_MAX_ATTEMPTS):
+    """
+    Queue an email using the caller's cursor so it commits atomically with
+    the row it is about. `expires_in_seconds` drops the email if it could not
+    be delivered in time (e.g. an OTP). Returns the outbox id.
+    """
+    if challan_no and kind in _SUPERSEDABLE:
+        cur.execute(
+            """UPDATE email_outbox SET status='superseded', locked_by=NULL, locked_at=NULL
+               WHERE tenant_id=%s AND challan_no=%s AND kind = ANY(%s) AND status='queued'""",
+            (tenant_id, challan_no, list(_SUPERSEDABLE)),
+        )
+    cur.execute(
+        """INSERT INTO email_outbox (tenant_id, challan_no, kind, to_email, payload, max_attempts, expires_at)
+           VALUES (%s, %s, %s, %s, %s, %s,
+                   CASE WHEN %s::float IS NULL THEN NULL ELSE NOW() + make_interval(secs => %s::float) END)
+           RETURNING id""",
+        (tenant_id, challan_no, kind, to_email, json.dumps(payload or {}, default=str),
+         max_attempts, expires_in_seconds, expires_in_seconds),
+    )
+    email_id = cur.fetchone()[0]
+    cur.execute(f"NOTIFY {EMAIL_CHANNEL}")
+    return email_id
+
+
+# ============================================================
+# 🔹 CONSUMER SIDE
+# ============================================================
+_CLAIM_SQL = """
+UPDATE email_outbox
+SET status='sending', locked_by=%s, locked_at=NOW(), attempts=attempts+1
+WHERE id = (
+    SELECT id FROM email_outbox
+    WHERE {where}
+    ORDER BY next_attempt_at, id
+    FOR UPDATE SKIP LOCKED
+    LIMIT 1
+)
+RETURNING id, tenant_id, challan_no, kind, to_email, payload, attempts, max_attempts
+"""
+# worker claim: due queued rows, or unexpired rows whose sender died (params: worker_name, lock timeout)
+CLAIM_DUE_WHERE = """(status='queued' AND next_attempt_at <= NOW())
+   OR (status='sending' AND locked_at < NOW() - make_interval(secs => %s)
+       AND (expires_at IS NULL OR expires_at >= NOW()))"""
+# expired rows, queued or abandoned mid-send, are settled before the claim rather than sent late
+# (param: lock timeout)
+EXPIRE_SQL = """UPDATE email_outbox SET status='expired', locked_by=NULL, locked_at=NULL
+WHERE expires_at < NOW()
+  AND (status='queued' OR (status='sending' AND locked_at < NOW() - make_interval(secs => %s)))"""
+
+def claim_email(worker_name, email_id=None):
+    """
+    Lock and return the next due email as a dict, or None. With `email_id`,
+    only that row is claimed (and only if it is still queued and unexpired).
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        if email_id is None:
+            cur.execute(EXPIRE_SQL, (EMAIL_LOCK_TIMEOUT_SECONDS,))
+            cur.execute(_CLAIM_SQL.format(where=CLAIM_DUE_WHERE), (worker_name, EMAIL_LOCK_TIMEOUT_SECONDS))
+        else:
+            cur.execute(
+                _CLAIM_SQL.format(where="""id = %s AND status='queued' AND next_attempt_at <= NOW()
+                   AND (expires_at IS NULL OR expires_at >= NOW())"""),
+                (worker_name, email_id),
+            )
+        row = cur.fetchone()
+        conn.commit()
+        cur.close()
+
+    if not row:
+        return None
+    payload = row[5] if isinstance(row[5], dict) else json.loads(row[5] or "{}")
+    return {
+        "id": row[0],
+        "tenant_id": row[1],
+        "challan_no": row[2],
+        "kind": row[3],
+        "to_email": row[4],
+        "payload": payload,
+        "attempts": row[6],
+        "max_attempts": row[7],
+    }
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter: half fixed, half random, capped."""
+    delay = min(EMAIL_RETRY_MAX_SECONDS, EMAIL_RETRY_BASE_SECONDS * (2 ** max(0, attempts - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _mark_sent(email):
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """UPDATE email_outbox
+               SET status='sent', sent_at=NOW(), locked_by=NULL, locked_at=NULL, last_error=NULL,
+                   payload = payload - %s::text[]
+               WHERE id=%s""",
+            (_SENSITIVE_KEYS, email["id"]),
+        )
+        if email["kind"] in MARKS_EMAIL_SENT:
+            challan_nos = email["payload"].get("challan_nos") or [email["challan_no"]]
+            cur.execute(
+                "UPDATE challans SET email_sent=TRUE WHERE challan_no = ANY(%s) AND tenant_id=%s",
+                ([c for c in challan_nos if c], email["tenant_id"]),
+            )
+        conn.commit()
+        cur.close()
+
+
+def _mark_failed(email, error):
+    retry_in = retry_delay(email["attempts"]) if email["attempts"] < email["max_attempts"] else None
+    with db_connection() as conn:
+        cur = conn.cursor()
+        if retry_in is not None:
+            cur.execute(
+                """UPDATE email_outbox
+                   SET status='queued', locked_by=NULL, locked_at=NULL, last_error=%s,
+                       next_attempt_at=NOW() + make_interval(secs => %s)
+                   WHERE id=%s""",
+                (error, retry_in, email["id"]),
+            )
+        else:
+            cur.execute(
+                "UPDATE email_outbox SET status='failed', locked_by=NULL, locked_at=NULL, last_error=%s WHERE id=%s",
+                (error, email["id"]),
+            )
+        conn.commit()
+        cur.close()
+    return retry_in
+
+
+def deliver(email):
+    """Send a claimed email and record the outcome. Returns True when sent."""
+    try:
+        send_email(email["tenant_id"], email["kind"], email["to_email"], email["payload"])
+    except Exception as e:
+        error = f"{e.__class__.__name__}: {e}"
+        retry_in = _mark_failed(email, error)
+        if retry_in is None:
+            print(f"❌ Email {email['id']} ({email['kind']}) to {email['to_email']} failed permanently:", error)
+            traceback.print_exc()
+        else:
+            print(f"⚠️ Email {email['id']} attempt {email['attempts']} failed, retrying in {retry_in:.0f}s:", error)
+        return False
+    _mark_sent(email)
+    return True
+
+
+def process_next_email(worker_name):
+    """Claim and deliver one due email. Returns True if one was handled."""
+    email = claim_email(worker_name)
+    if email is None:
+        return False
+    deliver(email)
+    return True
+
+
+def dispatch_email(email_id):
+    """
+    Try to send a just-committed email right away on the shared background
+    executor. Returns False when the executor is saturated; the row stays
+    queued and an outbox worker delivers it instead.
+    """
+    def _send_now():
+        email = claim_email(f"express-{os.getpid()}", email_id=email_id)
+        if email is not None:  # a worker may already have taken it
+            deliver(email)
+
+    try:
+        get_executor().submit(_send_now)
+        return True
+    except ExecutorSaturated:
+        return False
+
+
+# ============================================================
+# 🔹 OPERATIONS
+# ============================================================
+def outbox_stats():
+    """Row counts by status plus the age of the oldest due email."""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT status, COUNT(*) FROM email_outbox GROUP BY status")
+        by_status = dict(cur.fetchall())
+        cur.execute(
+            """SELECT EXTRACT(EPOCH FROM NOW() - MIN(next_attempt_at))
+               FROM email_outbox WHERE status='queued' AND next_attempt_at <= NOW()"""
+        )
+        lag = cur.fetchone()[0]
+        cur.close()
+    return {
+        "by_status": by_status,
+        "oldest_due_seconds": round(float(lag), 1) if lag is not None else 0.0,
+        "max_attempts": EMAIL_MAX_ATTEMPTS,
+        "retry_base_s": EMAIL_RETRY_BASE_SECONDS,
+        "retry_max_s": EMAIL_RETRY_MAX_SECONDS,
+    }
+
+
+def requeue_failed(tenant_id=None):
+    """Give permanently failed emails a fresh set of attempts."""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """UPDATE email_outbox
+               SET status='queued', attempts=0, next_attempt_at=NOW()
+               WHERE status='failed' AND (%s::int IS NULL OR tenant_id=%s)""",
+            (tenant_id, tenant_id),
+        )
+        count = cur.rowcount
+        cur.execute(f"NOTIFY {EMAIL_CHANNEL}")
+        conn.commit()
+        cur.close()
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Email outbox")
+    parser.add_argument("command", choices=["status", "requeue-failed"])
+    parser.add_argument("--tenant", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == "status":
+        print(json.dumps(outbox_stats(), indent=2))
+    else:
+        print(f"✅ Requeued {requeue_failed(args.tenant)} email(s)")
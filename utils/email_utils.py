@@ -1,165 +1,183 @@
 import os
 import json
-import time
-from flask_mail import Message, Mail
-from flask import current_app
-from utils.db import get_db_connection
-from app import mail as global_mail
-from app import create_app  # Avoid circular import
+import hashlib
+import threading
+from datetime import datetime
+from flask import Flask
 from flask_mail import Mail, Message
-import time
-import os
+from utils.tenant_config import get_tenant_config
+from utils.smtp_pool import get_smtp_pool
+
+# ============================================================
+# 🔹 GLOBAL SENDER (used if tenant email not configured)
+# ============================================================
+MAIL_DEFAULTS = {
+    "MAIL_SERVER": os.environ.get("MAIL_SERVER", "smtp.gmail.com"),
+    "MAIL_PORT": int(os.environ.get("MAIL_PORT", 587)),
+    "MAIL_USE_TLS": os.environ.get("MAIL_USE_TLS", "true").lower() == "true",
+    "MAIL_USERNAME": os.environ.get("MAIL_USERNAME", "yourcompanyemail@gmail.com"),
+    "MAIL_PASSWORD": os.environ.get("MAIL_PASSWORD", "your_app_password"),  # Gmail app password
+    "MAIL_DEFAULT_SENDER": (
+        os.environ.get("MAIL_SENDER_NAME", "Phoenix Computers"),
+        os.environ.get("MAIL_SENDER_EMAIL", "yourcompanyemail@gmail.com"),
+    ),
+}
+
+
+# ============================================================
+# 🔹 MAIL APP (one per process, never create_app())
+# ============================================================
+_mail_app = None
+_mail_app_lock = threading.Lock()
+
+
+def get_mail_app():
+    """Minimal Flask app that only carries the Flask-Mail state for app contexts."""
+    global _mail_app
+    if _mail_app is None:
+        with _mail_app_lock:
+            if _mail_app is None:
+                app = Flask("mailer")
+                app.config.update(MAIL_DEFAULTS)
+                Mail().init_app(app)
+                _mail_app = app
+    return _mail_app
 
 
 def get_tenant_mail_config(tenant_id):
-    """Fetch tenant-specific SMTP credentials from DB."""
+    """Tenant-specific SMTP credentials (from the tenant config cache)."""
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT email_config FROM tenant_settings WHERE tenant_id=%s", (tenant_id,))
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
-
-        if not row or not row[0]:
+        config = get_tenant_config(tenant_id)
+        if not config or not config["email"]:
             print(f"⚠️ No email settings found for tenant {tenant_id}")
             return None
-
-        if isinstance(row[0], dict):
-            return row[0]
-        return json.loads(row[0])
+        return config["email"]
     except Exception as e:
         print("❌ Error fetching tenant email config:", e)
         return None
 
 
-def send_challan_email(tenant_id, to_email, challan_data, pdf_path, image_paths=[]):
+def _tenant_mail_settings(cfg):
     """
-    Sends challan email with PDF + image attachments.
-    Supports tenant-based SMTP credentials + retry mechanism.
+    Flask-Mail settings from a tenant email_config. The settings API stores
+    smtp_server/smtp_port; older rows use mail_server/mail_port.
+    Returns None when the tenant has no usable sender.
     """
-    from app import create_app  # ✅ Import here to avoid circular dependency
-
-    try:
-        app = create_app()  # Create new Flask app for context
-        tenant_mail_cfg = get_tenant_mail_config(tenant_id)
-
-        # ✅ Configure tenant mail if available
-        if tenant_mail_cfg and tenant_mail_cfg.get("sender_email") and tenant_mail_cfg.get("sender_password"):
-            print(f"📧 Using tenant-specific email: {tenant_mail_cfg['sender_email']}")
-            mail_instance = Mail()
-            app.config.update({
-                "MAIL_SERVER": tenant_mail_cfg.get("mail_server", "smtp.gmail.com"),
-                "MAIL_PORT": tenant_mail_cfg.get("mail_port", 587),
-                "MAIL_USE_TLS": tenant_mail_cfg.get("use_tls", True),
-                "MAIL_USERNAME": tenant_mail_cfg["sender_email"],
-                "MAIL_PASSWORD": tenant_mail_cfg["sender_password"],
-                "MAIL_DEFAULT_SENDER": (
-                    tenant_mail_cfg.get("sender_name", "Service Center"),
-                    tenant_mail_cfg["sender_email"]
-                ),
-            })
-            mail_instance.init_app(app)
-        else:
-            print("⚠️ Tenant email not configured — using global sender.")
-            mail_instance = global_mail
-
-        with app.app_context():
-            msg = Message(
-                subject=f"Challan - {challan_data.get('challan_no', '')}",
-                recipients=[to_email],
-            )
-
-            # 🧾 Email Body
-            msg.html = f"""
-            <div style='font-family: Arial, sans-serif; color: #333'>
-                <h3>Dear {challan_data.get('customer_name', 'Customer')},</h3>
-                <p>Your service challan has been successfully created/updated.</p>
-                <p><b>Challan No:</b> {challan_data.get('challan_no')}<br/>
-                <b>Problem:</b> {challan_data.get('problem')}<br/>
-                <b>Serial No:</b> {challan_data.get('serial_number')}<br/>
-                <b>Accessories:</b> {', '.join(challan_data.get('accessories', []))}</p>
-                <p>Please find attached your challan PDF and related images.</p>
-                <p>Regards,<br/><b>{challan_data.get('company_name', 'Service Center')}</b></p>
-            </div>
-            """
+    if not cfg or not cfg.get("sender_email") or not cfg.get("sender_password"):
+        return None
+    use_ssl = bool(cfg.get("use_ssl", False))
+    return {
+        "MAIL_SERVER": cfg.get("smtp_server") or cfg.get("mail_server") or "smtp.gmail.com",
+        "MAIL_PORT": int(cfg.get("smtp_port") or cfg.get("mail_port") or (465 if use_ssl else 587)),
+        "MAIL_USE_TLS": bool(cfg.get("use_tls", True)) and not use_ssl,
+        "MAIL_USE_SSL": use_ssl,
+        "MAIL_USERNAME": cfg["sender_email"],
+        "MAIL_PASSWORD": cfg["sender_password"],
+        "MAIL_DEFAULT_SENDER": (cfg.get("sender_name") or "Service Center", cfg["sender_email"]),
+    }
+
+
+class TenantMailer:
+    """Flask-Mail state + sender for one tenant config version."""
+
+    def __init__(self, settings, version, is_default=False):
+        self.state = Mail().init_mail(settings)
+        self.sender = settings["MAIL_DEFAULT_SENDER"]
+        self.sender_name = self.sender[0] if isinstance(self.sender, tuple) else None
+        self.version = version
+        self.is_default = is_default
+
+
+# tenant_id -> TenantMailer; rebuilt only when the tenant's config version changes
+_mailers = {}
+_mailers_lock = threading.Lock()
+
+
+def _config_version(settings):
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def get_tenant_mailer(tenant_id):
+    """Cached mailer for a tenant, falling back to the global sender."""
+    settings = _tenant_mail_settings(get_tenant_mail_config(tenant_id))
+    is_default = settings is None
+    if is_default:
+        settings = MAIL_DEFAULTS
+    version = _config_version(settings)
+
+    mailer = _mailers.get(tenant_id)
+    if mailer is None or mailer.version != version:
+        if mailer is not None and not mailer.is_default:
+            # credentials changed: don't keep sessions logged in with the old ones
+            get_smtp_pool().close_key(get_smtp_pool().key_for(mailer.state))
+        mailer = TenantMailer(settings, version, is_default=is_default)
+        with _mailers_lock:
+            _mailers[tenant_id] = mailer
+    if mailer.is_default:
+        print("⚠️ Tenant email not configured — using global sender.")
+    else:
+        print(f"📧 Using tenant-specific email: {mailer.sender[1]}")
+    return mailer
+
+
+def invalidate_tenant_mailer(tenant_id):
+    """Drop the cached mailer and its idle SMTP sessions (e.g. after email settings change)."""
+    with _mailers_lock:
+        mailer = _mailers.pop(tenant_id, None)
+    if mailer is not None and not mailer.is_default:
+        get_smtp_pool().close_key(get_smtp_pool().key_for(mailer.state))
+
+
+# ============================================================
+# 🔹 DELIVERY
+# ============================================================
+def _local(path):
+    """Existing absolute paths pass through; stored static paths resolve against the app root."""
+    if not path:
+        return None
+    if os.path.isabs(path) and os.path.exists(path):
+        return path
+    return os.path.join(os.getcwd(), str(path).lstrip("/"))
 
-            # 📎 Attach PDF
-            if pdf_path and os.path.exists(pdf_path):
-                with open(pdf_path, "rb") as f:
-                    msg.attach(os.path.basename(pdf_path), "application/pdf", f.read())
-
-            # 📷 Attach images
-            for img_path in image_paths:
-                if img_path and os.path.exists(img_path):
-                    with open(img_path, "rb") as f:
-                        msg.attach(os.path.basename(img_path), "image/jpeg", f.read())
-
-            # 🌀 Retry Mechanism (3 attempts)
-            max_retries = 3
-            delay_seconds = 5
-            for attempt in range(1, max_retries + 1):
-                try:
-                    mail_instance.send(msg)
-                    print(f"✅ Email sent successfully to {to_email} (Attempt {attempt})")
-                    return True
-                except Exception as e:
-                    print(f"⚠️ Attempt {attempt} failed: {e}")
-                    if attempt < max_retries:
-                        print(f"⏳ Retrying in {delay_seconds} seconds...")
-                        time.sleep(delay_seconds)
-                    else:
-                        print("❌ All attempts failed. Email not sent.")
-                        return False
 
-    except Exception as e:
-        print("❌ Fatal email sending error:", e)
-        return False
+def _attach_files(msg, pdf_path=None, image_paths=None):
+    # 📎 Attach PDF(s)
+    for pdf in [pdf_path] if isinstance(pdf_path, str) else pdf_path or []:
+        pdf = _local(pdf)
+        if pdf and os.path.exists(pdf):
+            with open(pdf, "rb") as f:
+                msg.attach(os.path.basename(pdf), "application/pdf", f.read())
 
+    # 📷 Attach images
+    for img_path in image_paths or []:
+        img_path = _local(img_path)
+        if img_path and os.path.exists(img_path):
+            with open(img_path, "rb") as f:
+                msg.attach(os.path.basename(img_path), "image/jpeg", f.read())
 
 
-def send_Update_challan_email(tenant_id, to_email, challan_data, pdf_path, image_paths=[]):
+def _deliver(mailer, subject, to_email, html, pdf_path=None, image_paths=None, label="Email"):
     """
-    Sends challan email with PDF + image attachments.
-    Supports tenant-based SMTP credentials + retry mechanism.
+    Build and send one message through the tenant's pooled SMTP sessions.
+    Single attempt: raises on failure, retries are the outbox's job.
     """
-    from app import create_app  # ✅ Import here to avoid circular dependency
-
-    try:
-        app = create_app()  # Create new Flask app for context
-        tenant_mail_cfg = get_tenant_mail_config(tenant_id)
-
-        # ✅ Configure tenant mail if available
-        if tenant_mail_cfg and tenant_mail_cfg.get("sender_email") and tenant_mail_cfg.get("sender_password"):
-            print(f"📧 Using tenant-specific email: {tenant_mail_cfg['sender_email']}")
-            mail_instance = Mail()
-            app.config.update({
-                "MAIL_SERVER": tenant_mail_cfg.get("mail_server", "smtp.gmail.com"),
-                "MAIL_PORT": tenant_mail_cfg.get("mail_port", 587),
-                "MAIL_USE_TLS": tenant_mail_cfg.get("use_tls", True),
-                "MAIL_USERNAME": tenant_mail_cfg["sender_email"],
-                "MAIL_PASSWORD": tenant_mail_cfg["sender_password"],
-                "MAIL_DEFAULT_SENDER": (
-                    tenant_mail_cfg.get("sender_name", "Service Center"),
-                    tenant_mail_cfg["sender_email"]
-                ),
-            })
-            mail_instance.init_app(app)
-        else:
-            print("⚠️ Tenant email not configured — using global sender.")
-            mail_instance = global_mail
-
-        with app.app_context():
-            msg = Message(
-                subject=f"Challan - {challan_data.get('challan_no', '')}",
-                recipients=[to_email],
-            )
-
-            # 🧾 Email Body
-            msg.html = f"""
+    with get_mail_app().app_context():
+        msg = Message(subject=subject, recipients=[to_email], sender=mailer.sender)
+        msg.html = html
+        _attach_files(msg, pdf_path, image_paths)
+        get_smtp_pool().send(mailer.state, msg)
+    print(f"✅ {label} sent successfully to {to_email}")
+    return True
+
+
+# ============================================================
+# 🔹 MESSAGES
+# ============================================================
+def _challan_html(challan_data, action):
+    return f"""
             <div style='font-family: Arial, sans-serif; color: #333'>
                 <h3>Dear {challan_data.get('customer_name', 'Customer')},</h3>
-                <p>Your service challan has been successfully updated.</p>
+                <p>Your service challan has been successfully {action}.</p>
                 <p><b>Challan No:</b> {challan_data.get('challan_no')}<br/>
                 <b>Problem:</b> {challan_data.get('problem')}<br/>
                 <b>Serial No:</b> {challan_data.get('serial_number')}<br/>
@@ -169,203 +187,103 @@ def send_Update_challan_email(tenant_id, to_email, challan_data, pdf_path, image
             </div>
             """
 
-            # 📎 Attach PDF
-            if pdf_path and os.path.exists(pdf_path):
-                with open(pdf_path, "rb") as f:
-                    msg.attach(os.path.basename(pdf_path), "application/pdf", f.read())
-
-            # 📷 Attach images
-            for img_path in image_paths:
-                if img_path and os.path.exists(img_path):
-                    with open(img_path, "rb") as f:
-                        msg.attach(os.path.basename(img_path), "image/jpeg", f.read())
-
-            # 🌀 Retry Mechanism (3 attempts)
-            max_retries = 3
-            delay_seconds = 5
-            for attempt in range(1, max_retries + 1):
-                try:
-                    mail_instance.send(msg)
-                    print(f"✅ Email sent successfully to {to_email} (Attempt {attempt})")
-                    return True
-                except Exception as e:
-                    print(f"⚠️ Attempt {attempt} failed: {e}")
-                    if attempt < max_retries:
-                        print(f"⏳ Retrying in {delay_seconds} seconds...")
-                        time.sleep(delay_seconds)
-                    else:
-                        print("❌ All attempts failed. Email not sent.")
-                        return False
-
-    except Exception as e:
-        print("❌ Fatal email sending error:", e)
-        return False
 
+def _compose_challan(action):
+    def compose(mailer, p):
+        challan_data = p.get("challan") or {}
+        return (
+            f"Challan - {challan_data.get('challan_no', '')}",
+            _challan_html(challan_data, action),
+            "Email",
+        )
+    return compose
+
+
+def _compose_challan_batch(mailer, p):
+    rows = "".join(
+        f"<tr><td style='padding:4px 8px'>{c.get('challan_no')}</td>"
+        f"<td style='padding:4px 8px'>{c.get('serial_number') or ''}</td>"
+        f"<td style='padding:4px 8px'>{c.get('problem') or ''}</td></tr>"
+        for c in p.get("challans", [])
+    )
+    html = f"""
+            <div style='font-family: Arial, sans-serif; color: #333'>
+                <h3>Dear {p.get('customer_name') or 'Customer'},</h3>
+                <p>We have received {len(p.get('challans', []))} device(s) from you for service.</p>
+                <table style='border-collapse:collapse' border='1'>
+                    <tr><th style='padding:4px 8px'>Challan No</th><th style='padding:4px 8px'>Serial No</th>
+                        <th style='padding:4px 8px'>Problem</th></tr>
+                    {rows}
+                </table>
+                <p>Please find attached the challan PDFs.</p>
+                <p>Regards,<br/><b>{mailer.sender_name or 'Service Center'}</b></p>
+            </div>
+            """
+    return f"Challans - {len(p.get('challans', []))} device(s) received", html, "Batch challan email"
 
-# ---------------------------------------------------------------------
-# 🔐 NEW: Send OTP Email
-# ---------------------------------------------------------------------
-def send_otp_email(tenant_id, to_email, customer_name, challan_no, otp_code, ttl_minutes=10):
-    """
-    Sends an OTP email to the customer when verifying pickup.
-    """
-    from app import create_app  # avoid circular import
 
-    try:
-        app = create_app()
-        tenant_mail_cfg = get_tenant_mail_config(tenant_id)
-
-        # ✅ Configure tenant-specific mail
-        if tenant_mail_cfg and tenant_mail_cfg.get("sender_email") and tenant_mail_cfg.get("sender_password"):
-            mail_instance = Mail()
-            app.config.update({
-                "MAIL_SERVER": tenant_mail_cfg.get("mail_server", "smtp.gmail.com"),
-                "MAIL_PORT": tenant_mail_cfg.get("mail_port", 587),
-                "MAIL_USE_TLS": tenant_mail_cfg.get("use_tls", True),
-                "MAIL_USERNAME": tenant_mail_cfg["sender_email"],
-                "MAIL_PASSWORD": tenant_mail_cfg["sender_password"],
-                "MAIL_DEFAULT_SENDER": (
-                    tenant_mail_cfg.get("sender_name", "Service Center"),
-                    tenant_mail_cfg["sender_email"]
-                ),
-            })
-            mail_instance.init_app(app)
-        else:
-            print("⚠️ Tenant email not configured — using global sender.")
-            mail_instance = global_mail
-
-        with app.app_context():
-            msg = Message(
-                subject=f"🔐 OTP for Challan {challan_no}",
-                recipients=[to_email],
-            )
-
-            msg.html = f"""
+def _compose_otp(mailer, p):
+    html = f"""
             <div style='font-family: Arial, sans-serif; color: #333'>
-                <h3>Dear {customer_name or 'Customer'},</h3>
-                <p>Your device associated with <b>Challan No: {challan_no}</b> is ready for collection.</p>
+                <h3>Dear {p.get('customer_name') or 'Customer'},</h3>
+                <p>Your device associated with <b>Challan No: {p.get('challan_no')}</b> is ready for collection.</p>
                 <p>Please use the following One-Time Password (OTP) to verify your identity at pickup:</p>
                 <div style='background:#f5f5f5;padding:10px 20px;border:1px dashed #aaa;
                     display:inline-block;font-size:20px;font-weight:bold;color:#000;margin:10px 0;'>
-                    {otp_code}
+                    {p.get('otp_code')}
                 </div>
-                <p>This OTP will expire in <b>{ttl_minutes} minutes</b>.</p>
+                <p>This OTP will expire in <b>{p.get('ttl_minutes', 10)} minutes</b>.</p>
                 <p>If you did not request this, please ignore this email or contact our support.</p>
-                <p>Regards,<br/><b>{tenant_mail_cfg.get('sender_name', 'Service Center')}</b></p>
+                <p>Regards,<br/><b>{mailer.sender_name or 'Service Center'}</b></p>
             </div>
             """
+    return f"🔐 OTP for Challan {p.get('challan_no')}", html, "OTP email"
 
-            # 🌀 Retry Mechanism (3 attempts)
-            max_retries = 3
-            delay_seconds = 5
-            for attempt in range(1, max_retries + 1):
-                try:
-                    mail_instance.send(msg)
-                    print(f"✅ OTP email sent successfully to {to_email} (Attempt {attempt})")
-                    return True
-                except Exception as e:
-                    print(f"⚠️ Attempt {attempt} failed: {e}")
-                    if attempt < max_retries:
-                        print(f"⏳ Retrying in {delay_seconds} seconds...")
-                        time.sleep(delay_seconds)
-                    else:
-                        print("❌ All attempts failed. OTP email not sent.")
-                        return False
 
-    except Exception as e:
-        print("❌ Error sending OTP email:", e)
-        return False
-    
-    
-    
-    
-    
-    
-def send_delivery_confirmation_email(tenant_id, to_email, customer_name, challan_no, delivered_at, delivered_by, pdf_path=None, image_paths=None):
-    """
-    Sends a delivery confirmation email to the customer after OTP verification.
-    """
-  
-    try:
-        app = create_app()
-        tenant_mail_cfg = get_tenant_mail_config(tenant_id)
-        image_paths = image_paths or []
-
-        # ✅ Configure tenant mail
-        if tenant_mail_cfg and tenant_mail_cfg.get("sender_email") and tenant_mail_cfg.get("sender_password"):
-            mail_instance = Mail()
-            app.config.update({
-                "MAIL_SERVER": tenant_mail_cfg.get("mail_server", "smtp.gmail.com"),
-                "MAIL_PORT": tenant_mail_cfg.get("mail_port", 587),
-                "MAIL_USE_TLS": tenant_mail_cfg.get("use_tls", True),
-                "MAIL_USERNAME": tenant_mail_cfg["sender_email"],
-                "MAIL_PASSWORD": tenant_mail_cfg["sender_password"],
-                "MAIL_DEFAULT_SENDER": (
-                    tenant_mail_cfg.get("sender_name", "Service Center"),
-                    tenant_mail_cfg["sender_email"]
-                ),
-            })
-            mail_instance.init_app(app)
-        else:
-            print("⚠️ Tenant email not configured — using global sender.")
-            mail_instance = global_mail
-
-        with app.app_context():
-            msg = Message(
-                subject=f"✅ Delivery Confirmation - Challan {challan_no}",
-                recipients=[to_email],
-            )
-
-            # 💌 Email body
-            msg.html = f"""
+def _compose_delivery_confirmation(mailer, p):
+    delivered_at = p.get("delivered_at")
+    if isinstance(delivered_at, str):
+        delivered_at = datetime.fromisoformat(delivered_at)
+    html = f"""
             <div style="font-family: Arial, sans-serif; color: #333;">
-                <h3>Dear {customer_name or 'Customer'},</h3>
+                <h3>Dear {p.get('customer_name') or 'Customer'},</h3>
                 <p>
-                    We are pleased to inform you that your device associated with 
-                    <strong>Challan No:</strong> {challan_no} has been successfully delivered.
+                    We are pleased to inform you that your device associated with
+                    <strong>Challan No:</strong> {p.get('challan_no')} has been successfully delivered.
                 </p>
                 <p>
-                    <strong>Delivered By:</strong> {delivered_by}<br>
-                    <strong>Date:</strong> {delivered_at.strftime('%d/%m/%Y, %I:%M %p')}
+                    <strong>Delivered By:</strong> {p.get('delivered_by')}<br>
+                    <strong>Date:</strong> {delivered_at.strftime('%d/%m/%Y, %I:%M %p') if delivered_at else ''}
                 </p>
                 <p>Attached is your service challan and related images for your records.</p>
                 <p style="margin-top:20px;">
-                    Thank you for trusting <b>{tenant_mail_cfg.get('sender_name', 'our service center')}</b>!<br>
+                    Thank you for trusting <b>{mailer.sender_name or 'our service center'}</b>!<br>
                     We look forward to serving you again.
                 </p>
                 <hr>
                 <small style="color:#777;">This is an automated confirmation email. Please do not reply.</small>
             </div>
             """
-
-            # 📎 Attach PDF if exists
-            if pdf_path and os.path.exists(pdf_path):
-                with open(pdf_path, "rb") as f:
-                    msg.attach(os.path.basename(pdf_path), "application/pdf", f.read())
-
-            # 📸 Attach images if available
-            for img_path in image_paths:
-                if img_path and os.path.exists(img_path):
-                    with open(img_path, "rb") as f:
-                        msg.attach(os.path.basename(img_path), "image/jpeg", f.read())
-
-            # 🌀 Retry mechanism
-            max_retries = 3
-            delay_seconds = 5
-            for attempt in range(1, max_retries + 1):
-                try:
-                    mail_instance.send(msg)
-                    print(f"✅ Delivery confirmation email sent to {to_email} (Attempt {attempt})")
-                    return True
-                except Exception as e:
-                    print(f"⚠️ Attempt {attempt} failed: {e}")
-                    if attempt < max_retries:
-                        print(f"⏳ Retrying in {delay_seconds} seconds...")
-                        time.sleep(delay_seconds)
-                    else:
-                        print("❌ All attempts failed. Delivery confirmation email not sent.")
-                        return False
-
-    except Exception as e:
-        print("❌ Error sending delivery confirmation email:", e)
-        return False
+    return f"✅ Delivery Confirmation - Challan {p.get('challan_no')}", html, "Delivery confirmation email"
+
+
+# kind -> compose(mailer, payload) -> (subject, html, label)
+# payload keys "pdf_path" / "pdf_paths" / "image_paths" are attached when present
+COMPOSERS = {
+    "challan_created": _compose_challan("created/updated"),
+    "challan_updated": _compose_challan("updated"),
+    "challan_batch": _compose_challan_batch,
+    "otp": _compose_otp,
+    "delivery_confirmation": _compose_delivery_confirmation,
+}
+
+
+def send_email(tenant_id, kind, to_email, payload):
+    """Compose and send one email of `kind` now. Raises on failure."""
+    compose = COMPOSERS.get(kind)
+    if compose is None:
+        raise ValueError(f"Unknown email kind {kind}")
+    mailer = get_tenant_mailer(tenant_id)
+    subject, html, label = compose(mailer, payload)
+    pdfs = payload.get("pdf_paths") or payload.get("pdf_path")
+    return _deliver(mailer, subject, to_email, html, pdfs, payload.get("image_paths"), label)
@@ -0,0 +1,176 @@
+import os
+import time
+import atexit
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# ============================================================
+# 🔹 CONFIGURATION
+# ============================================================
+# Threads for request-side background work (per Python process)
+BACKGROUND_WORKERS = int(os.environ.get("BACKGROUND_WORKERS", 4))
+# Tasks allowed to wait for a free thread before submit() refuses new ones
+BACKGROUND_QUEUE = int(os.environ.get("BACKGROUND_QUEUE", 64))
+# How long shutdown waits for queued/in-flight tasks
+BACKGROUND_DRAIN_SECONDS = float(os.environ.get("BACKGROUND_DRAIN_SECONDS", 10))
+
+
+class ExecutorSaturated(RuntimeError):
+    """Raised when the background queue is full or shutting down."""
+
+
+# ============================================================
+# 🔹 EXECUTOR
+# ============================================================
+class BackgroundExecutor:
+    """
+    Shared, bounded pool for fire-and-forget work started by requests.
+    At most `workers` tasks run and `queue_size` wait; beyond that submit()
+    raises ExecutorSaturated so the caller can fall back (e.g. leave an
+    email to the outbox workers) instead of piling up threads.
+    """
+
+    def __init__(self, workers=BACKGROUND_WORKERS, queue_size=BACKGROUND_QUEUE):
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="background")
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._accepting = True
+
+        self._stats_lock = threading.Lock()
+        self._idle = threading.Condition(self._stats_lock)
+        self._queued = 0
+        self._running = 0
+        self._peak_depth = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._recent_wait = deque(maxlen=500)
+        self._recent_run = deque(maxlen=500)
+
+    def _run(self, fn, args, kwargs, submitted):
+        picked_up = time.perf_counter()
+        with self._stats_lock:
+            self._queued -= 1
+            self._running += 1
+        ok = True
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            ok = False
+            print(f"❌ Background task {getattr(fn, '__name__', fn)} failed:", e)
+            traceback.print_exc()
+        finally:
+            finished = time.perf_counter()
+            self._slots.release()
+            with self._stats_lock:
+                self._running -= 1
+                if ok:
+                    self._completed += 1
+                else:
+                    self._failed += 1
+                self._recent_wait.append((picked_up - submitted) * 1000)
+                self._recent_run.append((finished - picked_up) * 1000)
+                if not self._queued and not self._running:
+                    self._idle.notify_all()
+
+    # ---------------- public API ----------------
+    def submit(self, fn, *args, **kwargs):
+        """Queue `fn(*args, **kwargs)`; raises ExecutorSaturated when full."""
+        if not self._accepting or not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self._rejected += 1
+            raise ExecutorSaturated("Background queue is full" if self._accepting else "Shutting down")
+
+        with self._stats_lock:
+            self._submitted += 1
+            self._queued += 1
+            self._peak_depth = max(self._peak_depth, self._queued)
+        try:
+            self._executor.submit(self._run, fn, args, kwargs, time.perf_counter())
+        except RuntimeError:
+            # executor already shut down underneath us
+            self._slots.release()
+            with self._stats_lock:
+                self._queued -= 1
+                self._rejected += 1
+            raise ExecutorSaturated("Shutting down")
+
+    def saturated(self):
+        with self._stats_lock:
+            return self._queued + self._running >= self.workers + self.queue_size
+
+    def shutdown(self, timeout=BACKGROUND_DRAIN_SECONDS):
+        """
+        Stop accepting tasks and wait up to `timeout` seconds for queued and
+        running ones. Returns the number of tasks still unfinished.
+        """
+        self._accepting = False
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._queued or self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._idle.wait(remaining)
+            left = self._queued + self._running
+        self._executor.shutdown(wait=False)
+        if left:
+            print(f"⚠️ Background executor stopped with {left} unfinished task(s)")
+        return left
+
+    def stats(self):
+        with self._stats_lock:
+            waits = sorted(self._recent_wait)
+            runs = sorted(self._recent_run)
+
+            def _pct(values, p):
+                if not values:
+                    return 0.0
+                return round(values[min(len(values) - 1, int(p * len(values)))], 2)
+
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "queue_depth": self._queued,
+                "peak_queue_depth": self._peak_depth,
+                "running": self._running,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "accepting": self._accepting,
+                "wait_p50_ms": _pct(waits, 0.50),
+                "wait_p95_ms": _pct(waits, 0.95),
+                "run_p50_ms": _pct(runs, 0.50),
+                "run_p95_ms": _pct(runs, 0.95),
+            }
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Process-wide background executor (recreated after fork, like the DB pool)."""
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor, _executor_pid = BackgroundExecutor(), pid
+                atexit.register(_executor.shutdown)
+    return _executor
+
+
+def get_executor_stats():
+    if _executor is None or _executor_pid != os.getpid():
+        return {"workers": max(1, BACKGROUND_WORKERS), "queue_size": max(0, BACKGROUND_QUEUE),
+                "queue_depth": 0, "peak_queue_depth": 0, "running": 0, "submitted": 0,
+                "completed": 0, "failed": 0, "rejected": 0, "accepting": True,
+                "wait_p50_ms": 0.0, "wait_p95_ms": 0.0, "run_p50_ms": 0.0, "run_p95_ms": 0.0}
+    return _executor.stats()
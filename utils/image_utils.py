@@ -0,0 +1,95 @@
+import os
+import threading
+from PIL import Image, ImageOps
+
+# ============================================================
+# 🔹 RENDITION SETTINGS
+# ============================================================
+# kind -> (max long edge in px, JPEG quality)
+# "print" is sized for the 120px-wide thumbnails in challan_template.html at print DPI
+RENDITIONS = {
+    "print": (int(os.environ.get("IMG_PRINT_MAX_PX", 800)), 80),
+    "email": (int(os.environ.get("IMG_EMAIL_MAX_PX", 1280)), 82),
+    "thumb": (int(os.environ.get("IMG_THUMB_MAX_PX", 320)), 75),
+}
+RENDITIONS_DIR = "renditions"
+
+
+def rendition_rel_path(rel_path, kind):
+    """
+    Derived location of a rendition, next to the original:
+    static/uploads/a.jpg -> static/uploads/renditions/a__print.jpg
+    """
+    rel_path = str(rel_path).lstrip("/")
+    folder, filename = os.path.split(rel_path)
+    stem, _ = os.path.splitext(filename)
+    return os.path.join(folder, RENDITIONS_DIR, f"{stem}__{kind}.jpg")
+
+
+def rendition_for(rel_path, kind, root=None):
+    """Return the rendition's relative path if it exists, else the original path."""
+    if not rel_path:
+        return rel_path
+    root = root or os.getcwd()
+    candidate = rendition_rel_path(rel_path, kind)
+    if os.path.exists(os.path.join(root, candidate)):
+        return candidate
+    return rel_path
+
+
+def _flatten(img):
+    """JPEG has no alpha channel: composite transparent images onto white."""
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        return background
+    if img.mode != "RGB":
+        return img.convert("RGB")
+    return img
+
+
+def create_renditions(rel_path, root=None, kinds=None):
+    """
+    Write size-bounded, orientation-normalized JPEG renditions of an upload.
+    The original is left untouched. Idempotent: renditions newer than the
+    original are kept. Returns {kind: rel_path} for the renditions available.
+    """
+    root = root or os.getcwd()
+    src = os.path.join(root, str(rel_path).lstrip("/"))
+    if not os.path.isfile(src):
+        return {}
+
+    kinds = kinds or list(RENDITIONS)
+    src_mtime = os.path.getmtime(src)
+    todo = []
+    result = {}
+    for kind in kinds:
+        rel = rendition_rel_path(rel_path, kind)
+        dest = os.path.join(root, rel)
+        if os.path.exists(dest) and os.path.getmtime(dest) >= src_mtime:
+            result[kind] = rel
+        else:
+            todo.append((kind, rel, dest))
+    if not todo:
+        return result
+
+    try:
+        with Image.open(src) as opened:
+            # apply the camera's EXIF orientation so phones' portrait shots are upright
+            base = _flatten(ImageOps.exif_transpose(opened))
+            # biggest first, so each smaller rendition is resampled from a smaller image
+            for kind, rel, dest in sorted(todo, key=lambda t: -RENDITIONS[t[0]][0]):
+                max_px, quality = RENDITIONS[kind]
+                img = base.copy()
+                img.thumbnail((max_px, max_px), Image.LANCZOS)
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                tmp = f"{dest}.tmp-{os.getpid()}-{threading.get_ident()}"
+                img.save(tmp, "JPEG", quality=quality, optimize=True, progressive=True)
+                os.replace(tmp, dest)
+                result[kind] = rel
+                base = img if img.size != base.size else base
+    except Exception as e:
+        print(f"⚠️ Could not create renditions for {rel_path}:", e)
+
+    return result
@@ -0,0 +1,367 @@
+import os
+import json
+import time
+import random
+import select
+import socket
+import threading
+import traceback
+import psycopg2
+from psycopg2.extras import execute_values
+from utils.db import DB_CONFIG, db_connection
+
+# ============================================================
+# 🔹 CONFIGURATION
+# ============================================================
+JOBS_POLL_INTERVAL = float(os.environ.get("JOBS_POLL_INTERVAL", 2))
+# A 'running' job whose worker has not finished within this window is reclaimed
+JOBS_LOCK_TIMEOUT_SECONDS = int(os.environ.get("JOBS_LOCK_TIMEOUT_SECONDS", 300))
+JOBS_RETRY_BASE_SECONDS = float(os.environ.get("JOBS_RETRY_BASE_SECONDS", 10))
+# Settled jobs are deleted after this many days (failed ones are kept longer for inspection)
+JOBS_RETENTION_DAYS = float(os.environ.get("JOBS_RETENTION_DAYS", 7))
+JOBS_FAILED_RETENTION_DAYS = float(os.environ.get("JOBS_FAILED_RETENTION_DAYS", 30))
+# Minimum seconds between two prune passes in one process
+JOBS_PRUNE_INTERVAL = float(os.environ.get("JOBS_PRUNE_INTERVAL", 3600))
+JOBS_PRUNE_BATCH = 5000
+JOBS_CHANNEL = "challan_jobs"
+
+# Schema: migrations/0002_challan_jobs.sql
+
+# job_type -> callable(job: dict)
+HANDLERS = {}
+
+
+def register_handler(job_type):
+    """Decorator registering a worker handler for `job_type`."""
+    def decorator(fn):
+        HANDLERS[job_type] = fn
+        return fn
+    return decorator
+
+
+# ============================================================
+# 🔹 PRODUCER SIDE
+# ============================================================
+def enqueue_job(cur, job_type, tenant_id=None, challan_no=None, payload=None, max_attempts=3, supersede=False):
+    """
+    Insert a job using the caller's cursor, so it commits atomically with
+    the challan row it belongs to. With `supersede=True`, older queued jobs
+    of the same type for the same challan are dropped (their output would be
+    overwritten anyway). Returns the job id.
+    """
+    if supersede and challan_no:
+        cur.execute(
+            """UPDATE challan_jobs SET status='superseded', finished_at=NOW()
+               WHERE job_type=%s AND tenant_id=%s AND challan_no=%s AND status='queued'""",
+            (job_type, tenant_id, challan_no),
+        )
+    cur.execute(
+        """INSERT INTO challan_jobs (job_type, tenant_id, challan_no, payload, max_attempts)
+           VALUES (%s, %s, %s, %s, %s) RETURNING id""",
+        (job_type, tenant_id, challan_no, json.dumps(payload or {}, default=str), max_attempts),
+    )
+    job_id = cur.fetchone()[0]
+    # delivered to listening workers when the transaction commits
+    cur.execute(f"NOTIFY {JOBS_CHANNEL}")
+    return job_id
+
+
+def enqueue_jobs(cur, job_type, jobs, max_attempts=3):
+    """
+    Insert many jobs of one type in a single statement (caller's cursor).
+    `jobs` is a list of (tenant_id, challan_no, payload). Returns the ids.
+    """
+    if not jobs:
+        return []
+    rows = execute_values(
+        cur,
+        """INSERT INTO challan_jobs (job_type, tenant_id, challan_no, payload, max_attempts)
+           VALUES %s RETURNING id""",
+        [(job_type, t, c, json.dumps(p or {}, default=str), max_attempts) for t, c, p in jobs],
+        fetch=True,
+    )
+    cur.execute(f"NOTIFY {JOBS_CHANNEL}")
+    return [r[0] for r in rows]
+
+
+# ============================================================
+# 🔹 CONSUMER SIDE
+# ============================================================
+# also EXPLAINed by `python -m utils.migrations check-indexes`
+CLAIM_JOB_SQL = """
+UPDATE challan_jobs
+SET status='running', locked_by=%s, locked_at=NOW(), attempts=attempts+1
+WHERE id = (
+    SELECT id FROM challan_jobs
+    WHERE (status='queued' AND run_after <= NOW())
+       OR (status='running' AND locked_at < NOW() - make_interval(secs => %s) AND attempts < max_attempts)
+    ORDER BY run_after, id
+    FOR UPDATE SKIP LOCKED
+    LIMIT 1
+)
+RETURNING id, job_type, tenant_id, challan_no, payload, attempts, max_attempts
+"""
+# jobs whose worker died on the last allowed attempt (e.g. wkhtmltopdf OOM-killed it);
+# they are not reclaimed, so settle them (param: lock timeout)
+FAIL_ABANDONED_SQL = """
+UPDATE challan_jobs
+SET status='failed', finished_at=NOW(), locked_by=NULL, locked_at=NULL,
+    last_error='Worker died while running the job on its last attempt'
+WHERE status='running' AND locked_at < NOW() - make_interval(secs => %s) AND attempts >= max_attempts
+RETURNING id, job_type, tenant_id, challan_no, payload, attempts, max_attempts, last_error
+"""
+
+
+def _job_from_row(row):
+    payload = row[4] if isinstance(row[4], dict) else json.loads(row[4] or "{}")
+    return {
+        "id": row[0],
+        "job_type": row[1],
+        "tenant_id": row[2],
+        "challan_no": row[3],
+        "payload": payload,
+        "attempts": row[5],
+        "max_attempts": row[6],
+    }
+
+
+def claim_job(worker_name):
+    """Lock and return the next runnable job as a dict, or None."""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(CLAIM_JOB_SQL, (worker_name, JOBS_LOCK_TIMEOUT_SECONDS))
+        row = cur.fetchone()
+        conn.commit()
+        cur.close()
+
+    if not row:
+        return None
+    return _job_from_row(row)
+
+
+def _finish_job(job_id, error=None, retry_in=None):
+    with db_connection() as conn:
+        cur = conn.cursor()
+        if error is None:
+            cur.execute(
+                "UPDATE challan_jobs SET status='done', finished_at=NOW(), last_error=NULL WHERE id=%s",
+                (job_id,),
+            )
+        elif retry_in is not None:
+            cur.execute(
+                """UPDATE challan_jobs
+                   SET status='queued', locked_by=NULL, locked_at=NULL, last_error=%s,
+                       run_after=NOW() + make_interval(secs => %s)
+                   WHERE id=%s""",
+                (error, retry_in, job_id),
+            )
+        else:
+            cur.execute(
+                "UPDATE challan_jobs SET status='failed', finished_at=NOW(), last_error=%s WHERE id=%s",
+                (error, job_id),
+            )
+        conn.commit()
+        cur.close()
+
+
+def run_job(job):
+    """Dispatch a claimed job to its handler and record the outcome."""
+    handler = HANDLERS.get(job["job_type"])
+    if handler is None:
+        _finish_job(job["id"], error=f"No handler for job type {job['job_type']}")
+        return False
+
+    try:
+        handler(job)
+        _finish_job(job["id"])
+        return True
+    except Exception as e:
+        error = f"{e.__class__.__name__}: {e}"
+        print(f"❌ Job {job['id']} ({job['job_type']}) failed on attempt {job['attempts']}:", error)
+        traceback.print_exc()
+        if job["attempts"] < job["max_attempts"]:
+            retry_in = JOBS_RETRY_BASE_SECONDS * (2 ** (job["attempts"] - 1)) * random.uniform(0.8, 1.2)
+            _finish_job(job["id"], error=error, retry_in=retry_in)
+        else:
+            _finish_job(job["id"], error=error)
+            _final_failure(handler, job, error)
+        return False
+
+
+def _final_failure(handler, job, error):
+    on_failure = getattr(handler, "on_final_failure", None)
+    if on_failure:
+        try:
+            on_failure(job, error)
+        except Exception as cb_err:
+            print("⚠️ Job failure callback error:", cb_err)
+
+
+def fail_abandoned_jobs():
+    """
+    Mark jobs that took their worker down on every allowed attempt as failed
+    (the claim no longer hands them out) and run their failure callbacks.
+    Returns the number of jobs failed.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(FAIL_ABANDONED_SQL, (JOBS_LOCK_TIMEOUT_SECONDS,))
+        rows = cur.fetchall()
+        conn.commit()
+        cur.close()
+
+    for row in rows:
+        job = _job_from_row(row)
+        print(f"❌ Job {job['id']} ({job['job_type']}) abandoned after {job['attempts']} attempt(s), marked failed")
+        _final_failure(HANDLERS.get(job["job_type"]), job, row[7])
+    return len(rows)
+
+
+def prune_jobs(batch_size=JOBS_PRUNE_BATCH):
+    """
+    Fail abandoned jobs, then delete done/superseded jobs older than
+    JOBS_RETENTION_DAYS and failed ones older than JOBS_FAILED_RETENTION_DAYS,
+    in batches so no single transaction holds many row locks. Returns the
+    number of rows deleted.
+    """
+    fail_abandoned_jobs()
+    deleted = 0
+    with db_connection() as conn:
+        cur = conn.cursor()
+        while True:
+            cur.execute(
+                """DELETE FROM challan_jobs WHERE id IN (
+                       SELECT id FROM challan_jobs
+                       WHERE (status IN ('done', 'superseded') AND finished_at < NOW() - make_interval(secs => %s))
+                          OR (status = 'failed' AND finished_at < NOW() - make_interval(secs => %s))
+                       LIMIT %s
+                   )""",
+                (JOBS_RETENTION_DAYS * 86400, JOBS_FAILED_RETENTION_DAYS * 86400, batch_size),
+            )
+            count = cur.rowcount
+            conn.commit()
+            deleted += count
+            if count < batch_size:
+                break
+        cur.close()
+    return deleted
+
+
+_last_prune = 0.0
+_prune_lock = threading.Lock()
+
+
+def maybe_prune_jobs():
+    """prune_jobs() at most once per JOBS_PRUNE_INTERVAL per process."""
+    global _last_prune
+    now = time.monotonic()
+    with _prune_lock:
+        if now - _last_prune < JOBS_PRUNE_INTERVAL:
+            return 0
+        _last_prune = now
+    try:
+        deleted = prune_jobs()
+        if deleted:
+            print(f"🧹 Pruned {deleted} settled job(s)")
+        return deleted
+    except Exception as e:
+        print("⚠️ Job prune failed:", e)
+        return 0
+
+
+def _listen_connection(channels=(JOBS_CHANNEL,)):
+    """Dedicated autocommit connection used only to LISTEN for new work."""
+    try:
+        conn = psycopg2.connect(**DB_CONFIG)
+        conn.autocommit = True
+        cur = conn.cursor()
+        for channel in channels:
+            cur.execute(f"LISTEN {channel}")
+        cur.close()
+        return conn
+    except Exception as e:
+        print("⚠️ LISTEN unavailable, falling back to polling:", e)
+        return None
+
+
+def run_worker(worker_name=None, poll_interval=JOBS_POLL_INTERVAL, stop_event=None):
+    """
+    Process jobs and outbox emails until `stop_event` is set. Sleeps on
+    LISTEN/NOTIFY between empty polls so new work starts almost immediately.
+    """
+    # make sure handlers are registered in this process
+    import utils.challan_artifacts  # noqa: F401
+    import utils.dashboard_counters  # noqa: F401
+    from utils.email_outbox import EMAIL_CHANNEL, process_next_email
+
+    worker_name = worker_name or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    stop_event = stop_event or threading.Event()
+    channels = (JOBS_CHANNEL, EMAIL_CHANNEL)
+    listen_conn = _listen_connection(channels)
+    print(f"👷 Job worker {worker_name} started")
+
+    try:
+        while not stop_event.is_set():
+            try:
+                job = claim_job(worker_name)
+                if job:
+                    run_job(job)
+                # one email per job keeps a long job queue from starving the outbox
+                emailed = process_next_email(worker_name)
+            except Exception as e:
+                print("❌ Could not claim work:", e)
+                stop_event.wait(poll_interval)
+                continue
+
+            if job or emailed:
+                continue
+            maybe_prune_jobs()
+
+            if listen_conn is not None and not listen_conn.closed:
+                try:
+                    if select.select([listen_conn], [], [], poll_interval) != ([], [], []):
+                        listen_conn.poll()
+                        listen_conn.notifies.clear()
+                except Exception as e:
+                    print("⚠️ LISTEN connection lost:", e)
+                    try:
+                        listen_conn.close()
+                    except Exception:
+                        pass
+                    listen_conn = _listen_connection(channels)
+            else:
+                stop_event.wait(poll_interval)
+                # keep polling meanwhile, but get back to LISTEN on both channels
+                listen_conn = _listen_connection(channels)
+    finally:
+        if listen_conn is not None and not listen_conn.closed:
+            listen_conn.close()
+        print(f"👋 Job worker {worker_name} stopped")
+
+
+def start_inline_workers(count, stop_event=None):
+    """
+    Run `count` worker threads inside the current process. Meant for local
+    development (`python app.py`); production runs `python worker.py`.
+    """
+    stop_event = stop_event or threading.Event()
+    threads = []
+    for i in range(count):
+        t = threading.Thread(
+            target=run_worker,
+            kwargs={"worker_name": f"inline-{os.getpid()}-{i}", "stop_event": stop_event},
+            daemon=True,
+        )
+        t.start()
+        threads.append(t)
+    return stop_event, threads
+
+
+def wait_for(predicate, timeout, interval=0.5):
+    """Poll `predicate()` until it returns a truthy value or `timeout` elapses."""
+    deadline = time.monotonic() + timeout
+    while True:
+        result = predicate()
+        if result or time.monotonic() >= deadline:
+            return result
+        time.sleep(min(interval, max(0.0, deadline - time.monotonic())))
@@ -0,0 +1,280 @@
+"""
+Request timing and hot-path instrumentation.
+
+init_metrics(app) (called from create_app) times every request and exposes:
+
+  - GET /metrics in Prometheus text format
+    - per-endpoint latency histograms
+    - per-request time spent in each component (DB, PDF, QR, email enqueue)
+    - per-call component histograms, including work done by job workers
+    - a few pool/queue gauges
+  - a `Server-Timing` header on every response, e.g.
+        Server-Timing: app;dur=41.2, db;dur=6.3;desc="4", pdf;dur=30.1;desc="1"
+
+Components are recorded with `timed("pdf")` (decorator) or
+`component_timer("db")` (context manager). Inside a request they also add to
+that request's totals, which live in a ContextVar: work handed to other
+threads (background executor, job workers) is not charged to the request
+unless the caller runs it under contextvars.copy_context() on purpose.
+"db" is the time a pooled connection was checked out, "db_wait" the time
+spent waiting for one and "db_query" the statements themselves (timed by
+the cursors in utils/query_log.py). For streamed responses the latency stops when the
+body starts streaming.
+
+/metrics is only served with METRICS_TOKEN set (scrapers send
+"Authorization: Bearer <token>") or with METRICS_PUBLIC=1 for a listener
+that is not reachable from outside; otherwise it returns 404.
+
+Metrics are per process. Under gunicorn each worker reports its own
+numbers, so scrape every worker or aggregate by `instance`.
+"""
+import os
+import hmac
+import time
+import threading
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# ============================================================
+# 🔹 CONFIGURATION
+# ============================================================
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") not in ("0", "false", "no")
+# /metrics requires "Authorization: Bearer <token>"; without a token it is not served...
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+# ...unless it is explicitly opened up (e.g. bound to a private interface only)
+METRICS_PUBLIC = os.environ.get("METRICS_PUBLIC", "0") not in ("0", "false", "no", "")
+SERVER_TIMING_HEADER = os.environ.get("SERVER_TIMING_HEADER", "1") not in ("0", "false", "no")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COMPONENT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COMPONENTS = ("db", "db_wait", "db_query", "pdf", "qr", "email_enqueue")
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+_request_timings = ContextVar("request_timings", default=None)
+
+
+# ============================================================
+# 🔹 HISTOGRAMS
+# ============================================================
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values (Prometheus semantics)."""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        for label_values in sorted(snapshot):
+            series = snapshot[label_values]
+            bounds = [str(b) for b in self.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, series):
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, label_values, le)} {count}")
+            count = series[len(self.buckets)]
+            lines.append(f"{self.name}_sum{_labels(self.label_names, label_values)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, label_values)} {count}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by endpoint.",
+    ("method", "endpoint", "status"), LATENCY_BUCKETS,
+)
+REQUEST_COMPONENT = Histogram(
+    "http_request_component_seconds", "Time a request spent in a component (sum over its calls).",
+    ("endpoint", "component"), COMPONENT_BUCKETS,
+)
+COMPONENT_LATENCY = Histogram(
+    "component_duration_seconds", "Duration of single component calls (requests and workers).",
+    ("component",), COMPONENT_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements executed per request.",
+    ("endpoint",), QUERY_COUNT_BUCKETS,
+)
+_HISTOGRAMS = (REQUEST_LATENCY, REQUEST_COMPONENT, COMPONENT_LATENCY, REQUEST_QUERIES)
+
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+# request totals can be shared with helper threads via contextvars.copy_context()
+_timings_lock = threading.Lock()
+
+
+# ============================================================
+# 🔹 COMPONENT TIMERS
+# ============================================================
+def observe_component(component, seconds):
+    """Record one component call; also charged to the current request, if any."""
+    if not METRICS_ENABLED:
+        return
+    COMPONENT_LATENCY.observe(seconds, component)
+    timings = _request_timings.get()
+    if timings is not None:
+        with _timings_lock:
+            total, calls = timings.get(component, (0.0, 0))
+            timings[component] = (total + seconds, calls + 1)
+
+
+@contextmanager
+def component_timer(component):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_component(component, time.perf_counter() - started)
+
+
+def timed(component):
+    """Decorator form of component_timer()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with component_timer(component):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ============================================================
+# 🔹 FLASK INTEGRATION
+# ============================================================
+def _endpoint_label(request):
+    rule = getattr(request, "url_rule", None)
+    return rule.rule if rule is not None else "<unmatched>"
+
+
+def _server_timing(total, timings):
+    parts = [f"app;dur={total * 1000:.1f}"]
+    for component in COMPONENTS:
+        if component in timings:
+            seconds, calls = timings[component]
+            parts.append(f'{component};dur={seconds * 1000:.1f};desc="{calls}"')
+    return ", ".join(parts)
+
+
+def _gauges():
+    """Point-in-time gauges from the existing per-process pools."""
+    from utils.db import get_pool_stats
+    from utils.pdf_renderer import get_render_stats
+    from utils.executor import get_executor_stats
+
+    pool, renderer, executor = get_pool_stats(), get_render_stats(), get_executor_stats()
+    with _in_flight_lock:
+        in_flight = _in_flight
+    values = [
+        ("http_requests_in_flight", "Requests currently being served.", in_flight),
+        ("db_pool_in_use", "Pooled DB connections checked out.", pool["in_use"]),
+        ("db_pool_waiting", "Callers waiting for a DB connection.", pool["waiting"]),
+        ("pdf_render_in_flight", "wkhtmltopdf renders running.", renderer["in_flight"]),
+        ("pdf_render_queued", "Renders waiting for a render worker.", renderer["queued"]),
+        ("background_queue_depth", "Tasks waiting on the background executor.", executor["queue_depth"]),
+    ]
+    lines = []
+    for name, help_text, value in values:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+    return lines
+
+
+def render_metrics():
+    lines = []
+    for histogram in _HISTOGRAMS:
+        lines += histogram.render()
+    try:
+        lines += _gauges()
+    except Exception as e:
+        print("⚠️ Could not collect metrics gauges:", e)
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics():
+    for histogram in _HISTOGRAMS:
+        histogram.reset()
+
+
+def init_metrics(app):
+    """Install the timing hooks and the /metrics endpoint on `app`."""
+    from flask import request, g, Response
+
+    if not METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def _start_request_timer():
+        global _in_flight
+        g._metrics_started = time.perf_counter()
+        g._metrics_token = _request_timings.set({})
+        with _in_flight_lock:
+            _in_flight += 1
+
+    @app.after_request
+    def _record_request(response):
+        started = g.get("_metrics_started")
+        if started is None:
+            return response
+        total = time.perf_counter() - started
+        endpoint = _endpoint_label(request)
+        timings = _request_timings.get() or {}
+        if endpoint != "/metrics":
+            REQUEST_LATENCY.observe(total, request.method, endpoint, str(response.status_code))
+            for component, (seconds, _) in timings.items():
+                REQUEST_COMPONENT.observe(seconds, endpoint, component)
+            REQUEST_QUERIES.observe(timings.get("db_query", (0.0, 0))[1], endpoint)
+        if SERVER_TIMING_HEADER:
+            response.headers["Server-Timing"] = _server_timing(total, timings)
+        return response
+
+    @app.teardown_request
+    def _finish_request(exc):
+        global _in_flight
+        token = g.pop("_metrics_token", None)
+        if token is None:
+            return
+        _request_timings.reset(token)
+        with _in_flight_lock:
+            _in_flight -= 1
+
+    if not METRICS_TOKEN and not METRICS_PUBLIC:
+        print("ℹ️ /metrics disabled: set METRICS_TOKEN (or METRICS_PUBLIC=1) to expose it")
+        return
+
+    @app.route("/metrics")
+    def metrics():
+        if METRICS_TOKEN and not hmac.compare_digest(
+            request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}"
+        ):
+            return {"error": "Unauthorized"}, 401
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
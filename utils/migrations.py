@@ -0,0 +1,237 @@
+"""
+Versioned schema migrations.
+
+Migrations are plain SQL files in migrations/NNNN_description.sql, applied in
+order, each in its own transaction, and recorded in `schema_migrations`.
+
+    python -m utils.migrations upgrade         # apply pending migrations
+    python -m utils.migrations status          # applied / pending / changed
+    python -m utils.migrations check-indexes   # EXPLAIN hot queries, fail on seq scans
+"""
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+from utils.db import db_connection
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+# pg_advisory_lock key, so concurrent deploys/workers apply migrations once
+MIGRATIONS_LOCK_ID = 74201
+_FILENAME_RE = re.compile(r"^(\d{4})_([\w\-]+)\.sql$")
+
+SCHEMA_MIGRATIONS_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    checksum TEXT NOT NULL,
+    applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+"""
+
+
+# ============================================================
+# 🔹 DISCOVERY
+# ============================================================
+def discover(directory=MIGRATIONS_DIR):
+    """Return [(version, name, path, checksum)] sorted by version."""
+    found = []
+    for filename in sorted(os.listdir(directory)):
+        match = _FILENAME_RE.match(filename)
+        if not match:
+            continue
+        path = os.path.join(directory, filename)
+        with open(path, "rb") as fh:
+            checksum = hashlib.sha256(fh.read()).hexdigest()
+        found.append((int(match.group(1)), match.group(2), path, checksum))
+
+    versions = [m[0] for m in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions in {directory}")
+    return found
+
+
+def _applied(cur):
+    cur.execute("SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version")
+    return {row[0]: row for row in cur.fetchall()}
+
+
+# ============================================================
+# 🔹 UPGRADE / STATUS
+# ============================================================
+def upgrade(directory=MIGRATIONS_DIR, verbose=True):
+    """Apply pending migrations in order. Returns the versions applied."""
+    applied_now = []
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(SCHEMA_MIGRATIONS_SQL)
+        conn.commit()
+
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATIONS_LOCK_ID,))
+        try:
+            done = _applied(cur)
+            conn.commit()
+            for version, name, path, checksum in discover(directory):
+                if version in done:
+                    if done[version][2] != checksum and verbose:
+                        print(f"⚠️ Migration {version:04d}_{name} changed after it was applied")
+                    continue
+                with open(path, "r", encoding="utf-8") as fh:
+                    sql = fh.read()
+                try:
+                    cur.execute(sql)
+                    cur.execute(
+                        "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                        (version, name, checksum),
+                    )
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    raise RuntimeError(f"Migration {version:04d}_{name} failed: {e}") from e
+                applied_now.append(version)
+                if verbose:
+                    print(f"✅ Applied migration {version:04d}_{name}")
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATIONS_LOCK_ID,))
+            conn.commit()
+            cur.close()
+    return applied_now
+
+
+def status(directory=MIGRATIONS_DIR):
+    """[{version, name, state, applied_at}] where state is applied / pending / changed."""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(SCHEMA_MIGRATIONS_SQL)
+        conn.commit()
+        done = _applied(cur)
+        cur.close()
+
+    result = []
+    for version, name, _, checksum in discover(directory):
+        row = done.get(version)
+        if not row:
+            state = "pending"
+        elif row[2] != checksum:
+            state = "changed"
+        else:
+            state = "applied"
+        result.append({
+            "version": version,
+            "name": name,
+            "state": state,
+            "applied_at": row[3].isoformat() if row else None,
+        })
+    return result
+
+
+# ============================================================
+# 🔹 INDEX COVERAGE CHECK
+# ============================================================
+def _route_queries():
+    """
+    (route, table that must not be seq-scanned, SQL, params) for the hot
+    route queries, built from the same constants / builders the routes run.
+    """
+    from datetime import datetime
+    from routes.tenant.challans import challan_list_query, SINGLE_CHALLAN_SQL, _LIST_COLUMNS
+    from routes.tenant.tenant_auth import LOGIN_SQL
+    from routes.admin.tenant_users import LIST_USERS_SQL
+    from routes.admin.subscriptions import TENANT_SUBSCRIPTIONS_SQL
+    from routes.admin.logs import RECENT_LOGS_SQL
+    from utils.dashboard_counters import COUNTERS_SQL, AGGREGATE_SQL
+
+    columns = ["created_at", "challan_no"] + [
+        c for c in _LIST_COLUMNS.values() if c not in ("created_at", "challan_no")
+    ]
+
+    def page(**filters):
+        sql, params, _, _ = challan_list_query(1, columns, limit=51, **filters)
+        return sql, tuple(params)
+
+    bare_sql, bare_params, _, _ = challan_list_query(1, columns)
+    return [
+        ("GET /challans", "challans", bare_sql, tuple(bare_params)),
+        ("GET /challans?limit=", "challans", *page()),
+        ("GET /challans?cursor=", "challans", *page(cursor=(datetime.now(), "CH-"))),
+        ("GET /challans?status=", "challans", *page(status="pending")),
+        ("GET /challans?employee_id=", "challans", *page(employee_id=1)),
+        ("GET /challans?email_sent=false", "challans", *page(email_sent=False)),
+        ("GET /challan/<no>", "challans", SINGLE_CHALLAN_SQL, ("CH-1", 1)),
+        ("GET /dashboard", "tenant_challan_counters", COUNTERS_SQL, (1,)),
+        ("GET /dashboard (unseeded)", "challans", AGGREGATE_SQL, (1,)),
+        ("POST /login", "users", LOGIN_SQL, ("a@b.com",)),
+        ("GET /tenant_users/<tenant>", "users", LIST_USERS_SQL, (1,)),
+        ("GET /subscriptions/<tenant>", "subscriptions", TENANT_SUBSCRIPTIONS_SQL, (1,)),
+        ("GET /logs", "activity_logs", RECENT_LOGS_SQL, ()),
+    ]
+
+
+def _worker_queries():
+    """The workers' claim statements exactly as utils.jobs / utils.email_outbox run them."""
+    from utils.jobs import CLAIM_JOB_SQL, FAIL_ABANDONED_SQL, JOBS_LOCK_TIMEOUT_SECONDS
+    from utils.email_outbox import _CLAIM_SQL, CLAIM_DUE_WHERE, EXPIRE_SQL, EMAIL_LOCK_TIMEOUT_SECONDS
+
+    return [
+        ("worker claim (jobs)", "challan_jobs", CLAIM_JOB_SQL, ("check", JOBS_LOCK_TIMEOUT_SECONDS)),
+        ("worker fail abandoned (jobs)", "challan_jobs", FAIL_ABANDONED_SQL, (JOBS_LOCK_TIMEOUT_SECONDS,)),
+        ("worker claim (email)", "email_outbox",
+         _CLAIM_SQL.format(where=CLAIM_DUE_WHERE), ("check", EMAIL_LOCK_TIMEOUT_SECONDS)),
+        ("worker expire (email)", "email_outbox", EXPIRE_SQL, (EMAIL_LOCK_TIMEOUT_SECONDS,)),
+    ]
+
+
+def hot_queries():
+    """Every query check_indexes() EXPLAINs."""
+    return _route_queries() + _worker_queries()
+
+
+def _seq_scans(plan, found=None):
+    found = [] if found is None else found
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        _seq_scans(child, found)
+    return found
+
+
+def check_indexes():
+    """
+    EXPLAIN each hot query with sequential scans discouraged and report
+    whether the planner can serve it from an index. Small tables would
+    otherwise always seq-scan, so this checks index availability, not cost.
+    """
+    results = []
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SET LOCAL enable_seqscan = off")
+        for route, table, sql, params in hot_queries():
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cur.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scanned = _seq_scans(plan[0]["Plan"])
+            results.append({"route": route, "table": table, "ok": table not in scanned})
+        conn.rollback()
+        cur.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Database schema migrations")
+    parser.add_argument("command", choices=["upgrade", "status", "check-indexes"])
+    args = parser.parse_args()
+
+    if args.command == "upgrade":
+        applied = upgrade()
+        print(f"✅ Schema up to date ({len(applied)} migration(s) applied)")
+    elif args.command == "status":
+        for m in status():
+            print(f"{m['version']:04d}  {m['state']:<8} {m['name']}  {m['applied_at'] or ''}")
+    else:
+        failures = 0
+        for r in check_indexes():
+            print(f"{'✅' if r['ok'] else '❌'} {r['route']:<30} {r['table']}")
+            failures += 0 if r["ok"] else 1
+        sys.exit(1 if failures else 0)
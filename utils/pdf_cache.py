@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+# ============================================================
+# 🔹 CONFIGURATION
+# ============================================================
+PDF_CACHE_DIR = os.environ.get(
+    "PDF_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "static", "pdfs", "cache"),
+)
+PDF_CACHE_MAX_BYTES = int(os.environ.get("PDF_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+PDF_CACHE_MAX_AGE_DAYS = float(os.environ.get("PDF_CACHE_MAX_AGE_DAYS", 30))
+# Minimum seconds between two eviction sweeps in one process
+PDF_CACHE_SWEEP_INTERVAL = float(os.environ.get("PDF_CACHE_SWEEP_INTERVAL", 300))
+
+# Context keys that change on every render but do not identify the document
+VOLATILE_KEYS = ("generated_on", "qr_generated_at")
+
+
+def canonical_hash(value):
+    """sha256 of a canonical JSON encoding (sorted keys, no whitespace)."""
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _strip_volatile(value):
+    if isinstance(value, dict):
+        return {k: _strip_volatile(v) for k, v in value.items() if k not in VOLATILE_KEYS}
+    if isinstance(value, (list, tuple)):
+        return [_strip_volatile(v) for v in value]
+    return value
+
+
+def render_key(template_version, context, asset_fingerprints=None):
+    """
+    Cache key for one render: template version + template context (minus
+    per-render timestamps) + fingerprints of the local files it embeds, so a
+    re-uploaded logo with the same URL still invalidates the entry.
+    """
+    return canonical_hash({
+        "template": template_version,
+        "context": _strip_volatile(context),
+        "assets": asset_fingerprints or {},
+    })
+
+
+def file_fingerprint(path):
+    """(size, mtime_ns) of a local file, or None when missing."""
+    try:
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns]
+    except OSError:
+        return None
+
+
+class PdfCache:
+    """
+    Content-addressed store of rendered PDFs under static/pdfs/cache/<aa>/<key>.pdf.
+    A challan's PDF is published as a hard link (or copy) of the cache entry,
+    so evicting the cache never removes a challan's PDF.
+    """
+
+    def __init__(self, root=PDF_CACHE_DIR, max_bytes=PDF_CACHE_MAX_BYTES, max_age_days=PDF_CACHE_MAX_AGE_DAYS):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_days * 86400
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def path_for(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.pdf")
+
+    def _publish(self, src, dest):
+        """Atomically place `src` at `dest` (hard link, falling back to copy)."""
+        os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+        tmp = f"{dest}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            try:
+                os.link(src, tmp)
+            except OSError:
+                shutil.copyfile(src, tmp)
+            os.replace(tmp, dest)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def get_or_render(self, key, dest, render_fn):
+        """
+        Publish the cached PDF for `key` at `dest`, calling `render_fn(path)`
+        to produce it on a miss. Returns True on a cache hit.
+        """
+        cached = self.path_for(key)
+        if os.path.exists(cached):
+            try:
+                os.utime(cached)  # refresh for LRU eviction
+                self._publish(cached, dest)
+                with self._lock:
+                    self._hits += 1
+                return True
+            except OSError as e:
+                print("⚠️ PDF cache read failed, re-rendering:", e)
+
+        with self._lock:
+            self._misses += 1
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        render_fn(cached)
+        self._publish(cached, dest)
+        self.maybe_sweep()
+        return False
+
+    def maybe_sweep(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep < PDF_CACHE_SWEEP_INTERVAL:
+                return
+            self._last_sweep = now
+        try:
+            self.sweep()
+        except Exception as e:
+            print("⚠️ PDF cache sweep failed:", e)
+
+    def sweep(self):
+        """Drop entries older than max age, then least recently used beyond max size."""
+        entries = []
+        now = time.time()
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(".pdf"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+
+        evicted = 0
+        kept = []
+        for mtime, size, path in entries:
+            if self.max_age_seconds and now - mtime > self.max_age_seconds:
+                evicted += self._remove(path)
+            else:
+                kept.append((mtime, size, path))
+
+        total = sum(size for _, size, _ in kept)
+        if self.max_bytes and total > self.max_bytes:
+            for mtime, size, path in sorted(kept):
+                if total <= self.max_bytes:
+                    break
+                evicted += self._remove(path)
+                total -= size
+
+        with self._lock:
+            self._evictions += evicted
+        return evicted
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "max_bytes": self.max_bytes,
+                "max_age_days": self.max_age_seconds / 86400,
+            }
+
+
+pdf_cache = PdfCache()
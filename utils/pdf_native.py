@@ -0,0 +1,523 @@
+"""
+Native in-process challan PDF engine (reportlab).
+
+Lays out the same document as utils/templates/challan_template.html
+directly with reportlab's platypus: theme-coloured header with logo and
+company details, customer / problem / accessories sections, the items
+table, attached images, QR code, footer, terms and the DELIVERED
+watermark. Nothing is spawned, so a render costs milliseconds instead of
+a wkhtmltopdf process.
+
+It takes the same template context generate_pdf() builds for wkhtmltopdf
+(file:// and data: asset URLs included) and is selected per tenant with
+`"pdf_engine": "native"` in challan_config (see utils/pdf_renderer.py).
+
+Known differences from the HTML template: CSS font_family is not applied
+(Helvetica, or PDF_NATIVE_FONT / PDF_NATIVE_FONT_BOLD TrueType files for
+non-Latin text), and terms HTML is reduced to paragraphs and list items.
+"""
+import io
+import os
+import re
+import html
+import time
+import base64
+import hashlib
+import threading
+from collections import OrderedDict, deque
+
+import requests
+from PIL import Image as PILImage
+
+try:
+    from reportlab import rl_config
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.platypus import (
+        SimpleDocTemplate, Paragraph, Table, TableStyle, Image, Spacer, HRFlowable,
+    )
+    # without the C accelerator, ASCII85-encoding embedded images dominates render time
+    rl_config.useA85 = 0
+except ImportError:  # optional: only needed for tenants on the native engine
+    A4 = None
+
+# ============================================================
+# 🔹 CONFIGURATION
+# ============================================================
+PDF_NATIVE_FONT = os.environ.get("PDF_NATIVE_FONT", "")
+PDF_NATIVE_FONT_BOLD = os.environ.get("PDF_NATIVE_FONT_BOLD", "")
+# Prepared (downscaled) logos/images/QRs kept in memory per process
+PDF_NATIVE_IMAGE_CACHE_BYTES = int(os.environ.get("PDF_NATIVE_IMAGE_CACHE_BYTES", 32 * 1024 * 1024))
+# Images are resampled to this many pixels per CSS pixel of their box (2 ≈ 192 dpi)
+PDF_NATIVE_IMAGE_SCALE = float(os.environ.get("PDF_NATIVE_IMAGE_SCALE", 2))
+REMOTE_ASSET_TIMEOUT = 5
+
+PX = 0.75  # one CSS px in points
+DEFAULT_THEME = "#114e9e"
+MARGIN = 10 * mm + 30 * PX  # wkhtmltopdf page margin + the template's body padding
+
+LOGO_BOX = (200, 80)
+ATTACHMENT_BOX = (120, 120)
+QR_BOX = (90, 90)
+
+
+def native_available():
+    return A4 is not None
+
+
+_layout_version = None
+
+
+def layout_version():
+    """Hash of this module's source, used in PDF cache keys like template_version()."""
+    global _layout_version
+    if _layout_version is None:
+        with open(__file__, "rb") as f:
+            _layout_version = "native-" + hashlib.sha256(f.read()).hexdigest()[:16]
+    return _layout_version
+
+
+# ============================================================
+# 🔹 FONTS
+# ============================================================
+_fonts = None
+_fonts_lock = threading.Lock()
+
+
+def _font_names():
+    """(regular, bold) font names, registering PDF_NATIVE_FONT* once per process."""
+    global _fonts
+    if _fonts is None:
+        with _fonts_lock:
+            if _fonts is None:
+                fonts = ("Helvetica", "Helvetica-Bold")
+                if PDF_NATIVE_FONT:
+                    try:
+                        pdfmetrics.registerFont(TTFont("ChallanNative", PDF_NATIVE_FONT))
+                        bold = "ChallanNative"
+                        if PDF_NATIVE_FONT_BOLD:
+                            pdfmetrics.registerFont(TTFont("ChallanNative-Bold", PDF_NATIVE_FONT_BOLD))
+                            bold = "ChallanNative-Bold"
+                        fonts = ("ChallanNative", bold)
+                    except Exception as e:
+                        print("⚠️ Could not load PDF_NATIVE_FONT, using Helvetica:", e)
+                _fonts = fonts
+    return _fonts
+
+
+# ============================================================
+# 🔹 IMAGES
+# ============================================================
+class _ImageCache:
+    """LRU of downscaled image bytes keyed by source identity and target box."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        return None
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = value
+            self._bytes += len(value[0])
+            while self._bytes > self.max_bytes and len(self._items) > 1:
+                _, old = self._items.popitem(last=False)
+                self._bytes -= len(old[0])
+
+
+_image_cache = _ImageCache(PDF_NATIVE_IMAGE_CACHE_BYTES)
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _source(url):
+    """(cache key or None, loader) for a resolved asset URL."""
+    if url.startswith("file://"):
+        path = url[len("file://"):]
+        st = os.stat(path)
+        return (path, st.st_size, st.st_mtime_ns), lambda: _read(path)
+    if url.startswith("data:"):
+        header, _, payload = url.partition(",")
+        return (hashlib.sha256(url.encode("ascii")).hexdigest(),), lambda: (
+            base64.b64decode(payload) if ";base64" in header else payload.encode("utf-8")
+        )
+    if url.startswith("http://") or url.startswith("https://"):
+        def _fetch():
+            response = requests.get(url, timeout=REMOTE_ASSET_TIMEOUT)
+            response.raise_for_status()
+            return response.content
+        return None, _fetch
+    raise ValueError(f"unsupported asset URL: {url[:64]}")
+
+
+def _prepare(raw, box):
+    """
+    Image bytes downscaled to PDF_NATIVE_IMAGE_SCALE x its display size, plus
+    that display size in CSS px (natural size capped to `box`, like max-width/max-height).
+    """
+    img = PILImage.open(io.BytesIO(raw))
+    fit = min(box[0] / img.width, box[1] / img.height, 1.0)
+    display = (img.width * fit, img.height * fit)
+    limit = (max(1, int(display[0] * PDF_NATIVE_IMAGE_SCALE)), max(1, int(display[1] * PDF_NATIVE_IMAGE_SCALE)))
+    if img.format in ("JPEG", "PNG") and img.width <= limit[0] and img.height <= limit[1]:
+        return raw, display
+    img.thumbnail(limit)
+    out = io.BytesIO()
+    if img.mode in ("RGB", "L"):
+        img.save(out, "JPEG", quality=85)  # embedded by reportlab without re-encoding
+    else:
+        img.save(out, "PNG")
+    return out.getvalue(), display
+
+
+def _image(url, box, h_align="LEFT"):
+    """Image flowable fitted into `box` (CSS px, like max-width/max-height), or None."""
+    if not url:
+        return None
+    try:
+        key, load = _source(url)
+        prepared = _image_cache.get((key, box)) if key else None
+        if prepared is None:
+            prepared = _prepare(load(), box)
+            if key:
+                _image_cache.put((key, box), prepared)
+    except Exception as e:
+        print(f"⚠️ Native PDF: skipping image {url[:80]}: {e}")
+        return None
+    data, (width, height) = prepared
+    flowable = Image(io.BytesIO(data), width=width * PX, height=height * PX)
+    flowable.hAlign = h_align
+    return flowable
+
+
+# ============================================================
+# 🔹 TEXT
+# ============================================================
+_TAG_RE = re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9]*)[^>]*>")
+_BLOCK_TAGS = {"br", "p", "div", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6"}
+
+
+def _text(value, default="—"):
+    """Escaped paragraph text for a data value."""
+    if value is None or value == "":
+        value = default
+    return html.escape(str(value))
+
+
+def html_lines(markup):
+    """Terms HTML (or plain text) as a list of plain text lines, lists numbered/bulleted."""
+    markup = str(markup or "")
+    if not _TAG_RE.search(markup):
+        return [line.strip() for line in markup.splitlines() if line.strip()]
+
+    lines, current, lists = [], [], []
+
+    def flush():
+        text = " ".join(html.unescape("".join(current)).split())
+        if text:
+            lines.append(text)
+        current.clear()
+
+    pos = 0
+    for m in _TAG_RE.finditer(markup):
+        current.append(markup[pos:m.start()])
+        pos = m.end()
+        closing, tag = m.group(1), m.group(2).lower()
+        if tag in ("ol", "ul"):
+            flush()
+            if closing:
+                if lists:
+                    lists.pop()
+            else:
+                lists.append([tag, 0])
+        elif tag == "li" and not closing:
+            flush()
+            if lists and lists[-1][0] == "ol":
+                lists[-1][1] += 1
+                current.append(f"{lists[-1][1]}. ")
+            else:
+                current.append("• ")
+        elif tag in _BLOCK_TAGS:
+            flush()
+    current.append(markup[pos:])
+    flush()
+    return lines
+
+
+def _color(value, default=DEFAULT_THEME):
+    try:
+        return colors.HexColor(value or default)
+    except Exception:
+        return colors.HexColor(default)
+
+
+# ============================================================
+# 🔹 LAYOUT
+# ============================================================
+def _styles(theme):
+    regular, bold = _font_names()
+    body = ParagraphStyle("body", fontName=regular, fontSize=13 * PX, leading=13 * PX * 1.4,
+                          textColor=colors.HexColor("#333333"))
+    return {
+        "body": body,
+        "info": ParagraphStyle("info", parent=body, spaceBefore=3 * PX, spaceAfter=3 * PX),
+        "company": ParagraphStyle("company", parent=body, fontName=bold, fontSize=22 * PX,
+                                  leading=22 * PX * 1.3, textColor=theme),
+        "tagline": ParagraphStyle("tagline", parent=body, textColor=colors.HexColor("#666666")),
+        "meta": ParagraphStyle("meta", parent=body, fontSize=12 * PX, leading=12 * PX * 1.5, alignment=TA_RIGHT),
+        "section": ParagraphStyle("section", parent=body, fontName=bold, fontSize=15 * PX, leading=15 * PX * 1.2,
+                                  textColor=theme, spaceBefore=25 * PX, keepWithNext=1),
+        "cell": ParagraphStyle("cell", parent=body, leading=13 * PX * 1.2),
+        "footer": ParagraphStyle("footer", parent=body, fontSize=12 * PX, alignment=TA_CENTER,
+                                 textColor=colors.HexColor("#666666")),
+    }
+
+
+def _bold(label, value):
+    return f"<b>{label}</b> {value}"
+
+
+def _section(title, styles, theme):
+    rule = HRFlowable(width="100%", thickness=2 * PX, color=theme, spaceBefore=4 * PX, spaceAfter=8 * PX)
+    rule.keepWithNext = 1
+    return [Paragraph(html.escape(title), styles["section"]), rule]
+
+
+def _header(ctx, design, styles, theme, width):
+    details = [Paragraph(_text(design.get("company_name"), "Company Name"), styles["company"])]
+    for key in ("tagline", "company_address"):
+        if design.get(key):
+            details.append(Paragraph(_text(design[key]), styles["tagline" if key == "tagline" else "body"]))
+    if design.get("company_phone"):
+        details.append(Paragraph(_bold("Phone:", _text(design["company_phone"])), styles["body"]))
+
+    logo = _image(ctx.get("logo_url"), LOGO_BOX)
+    data = ctx.get("data") or {}
+    meta = Paragraph(
+        _bold("Challan No:", _text(data.get("challan_no"), "-")) + "<br/>"
+        + _bold("Date:", _text(data.get("created_at") or ctx.get("generated_on"))),
+        styles["meta"],
+    )
+    meta_width = width * 0.32
+    if logo is not None:
+        left = Table([[logo, details]], colWidths=[logo.drawWidth + 15 * PX, None])
+        left.setStyle(TableStyle([("VALIGN", (0, 0), (-1, -1), "MIDDLE"), ("LEFTPADDING", (0, 0), (-1, -1), 0)]))
+    else:
+        left = details
+    header = Table([[left, meta]], colWidths=[width - meta_width, meta_width])
+    header.setStyle(TableStyle([
+        ("LINEABOVE", (0, 0), (-1, 0), 8 * PX, theme),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("TOPPADDING", (0, 0), (-1, -1), 15 * PX),
+        ("LEFTPADDING", (0, 0), (-1, -1), 0),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 0),
+    ]))
+    return [header, Spacer(0, 10 * PX)]
+
+
+def _items_table(items, styles, theme, width):
+    regular, bold = _font_names()
+    col_widths = [width * 0.08, width * 0.72, width * 0.20]
+    # plain strings are drawn directly; only text that may need wrapping pays for a Paragraph
+    wrap_at = int(col_widths[1] / (styles["cell"].fontSize * 0.6))
+
+    def _cell(value, default):
+        text = str(value) if value not in (None, "") else default
+        return Paragraph(html.escape(text), styles["cell"]) if len(text) > wrap_at else text
+
+    rows = [["#", "Description", "Quantity"]]
+    for index, item in enumerate(items, start=1):
+        item = item if isinstance(item, dict) else {"description": item}
+        rows.append([str(index), _cell(item.get("description"), "—"), _cell(item.get("quantity", 1), "1")])
+    table = Table(rows, colWidths=col_widths, repeatRows=1)
+    table.setStyle(TableStyle([
+        ("FONT", (0, 0), (-1, -1), regular, styles["cell"].fontSize, styles["cell"].leading),
+        ("FONT", (0, 0), (-1, 0), bold, styles["cell"].fontSize, styles["cell"].leading),
+        ("TEXTCOLOR", (0, 1), (-1, -1), styles["cell"].textColor),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("BACKGROUND", (0, 0), (-1, 0), theme),
+        ("GRID", (0, 0), (-1, -1), 1 * PX, colors.HexColor("#dddddd")),
+        ("TOPPADDING", (0, 0), (-1, -1), 8 * PX),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 8 * PX),
+        ("LEFTPADDING", (0, 0), (-1, -1), 8 * PX),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 8 * PX),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+    ]))
+    return [Spacer(0, 8 * PX), table]
+
+
+def _images_grid(urls, width):
+    flowables = [f for f in (_image(url, ATTACHMENT_BOX) for url in urls) if f is not None]
+    if not flowables:
+        return []
+    cell = (ATTACHMENT_BOX[0] + 8) * PX
+    per_row = max(1, int(width // cell))
+    rows = [flowables[i:i + per_row] for i in range(0, len(flowables), per_row)]
+    rows[-1] += [""] * (per_row - len(rows[-1]))
+    table = Table(rows, colWidths=[cell] * per_row, hAlign="LEFT")
+    table.setStyle(TableStyle([
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        ("LEFTPADDING", (0, 0), (-1, -1), 4 * PX),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 4 * PX),
+    ]))
+    return [Spacer(0, 10 * PX), table]
+
+
+def build_story(ctx, width):
+    """Flowables for one challan from generate_pdf()'s template context."""
+    design = ctx.get("tenant_design") or {}
+    data = ctx.get("data") or {}
+    theme = _color(design.get("theme_color"))
+    styles = _styles(theme)
+
+    story = _header(ctx, design, styles, theme, width)
+
+    story += _section("Customer Information", styles, theme)
+    for label, key in (("Name:", "customer_name"), ("Email:", "email"), ("Contact:", "contact_number"),
+                       ("City:", "city"), ("Serial Number:", "serial_number")):
+        story.append(Paragraph(_bold(label, _text(data.get(key), "-")), styles["info"]))
+
+    story += _section("Problem Description", styles, theme)
+    story.append(Paragraph(_text(data.get("problem")), styles["info"]))
+
+    story += _section("Accessories & Warranty", styles, theme)
+    story.append(Paragraph(_bold("Accessories:", _text(ctx.get("accessories"))), styles["info"]))
+    story.append(Paragraph(_bold("Warranty:", _text(data.get("warranty"))), styles["info"]))
+    story.append(Paragraph(_bold("Dispatch Through:", _text(data.get("dispatch_through"))), styles["info"]))
+
+    if data.get("items"):
+        story += _section("Items", styles, theme)
+        story += _items_table(data["items"], styles, theme, width)
+
+    if ctx.get("images"):
+        images = _images_grid(ctx["images"], width)
+        if images:
+            story += _section("Attached Images", styles, theme) + images
+
+    qr = _image(ctx.get("qr_url"), QR_BOX, h_align="RIGHT")
+    if qr is not None:
+        story += [Spacer(0, 15 * PX), qr]
+
+    story += [
+        Spacer(0, 40 * PX),
+        HRFlowable(width="100%", thickness=1 * PX, color=colors.HexColor("#dddddd"), spaceAfter=10 * PX),
+        Paragraph(_text(design.get("footer_note"), "Thank you for your business!"), styles["footer"]),
+    ]
+
+    terms = html_lines(design.get("terms_conditions"))
+    if terms:
+        story += _section("Terms & Conditions", styles, theme)
+        story += [Paragraph(html.escape(line), styles["info"]) for line in terms]
+    return story
+
+
+def _watermark(canvas, doc):
+    regular, bold = _font_names()
+    width, height = doc.pagesize
+    canvas.saveState()
+    canvas.setFillColor(colors.HexColor("#777777"), alpha=0.08)
+    canvas.setFont(bold, 100 * PX)
+    canvas.translate(width * 0.15, height * 0.6 - 100 * PX)
+    canvas.rotate(30)
+    canvas.drawString(0, 0, "DELIVERED")
+    canvas.restoreState()
+
+
+# ============================================================
+# 🔹 RENDERER
+# ============================================================
+class NativePdfRenderer:
+    """
+    In-process renderer with the same interface as PdfRenderer
+    (render(context, pdf_path) -> timings, stats()). Renders run on the
+    caller's thread; there is no process or queue to bound.
+    """
+
+    def __init__(self):
+        if not native_available():
+            raise RuntimeError("reportlab is not installed")
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self._renders = 0
+        self._failures = 0
+        self._totals = {"layout_ms": 0.0, "build_ms": 0.0, "total_ms": 0.0}
+        self._max = dict(self._totals)
+        self._recent = deque(maxlen=500)
+
+    def render(self, template_context, pdf_path, **_):
+        """Lay out and write the challan to `pdf_path` atomically; returns timings in ms."""
+        base, ext = os.path.splitext(pdf_path)
+        tmp_path = f"{base}.tmp-{os.getpid()}-{threading.get_ident()}{ext or '.pdf'}"
+        with self._stats_lock:
+            self._in_flight += 1
+        started = time.perf_counter()
+        try:
+            doc = SimpleDocTemplate(
+                tmp_path, pagesize=A4, leftMargin=MARGIN, rightMargin=MARGIN, topMargin=MARGIN,
+                bottomMargin=MARGIN, title=f"Challan - {(template_context.get('data') or {}).get('challan_no', '')}",
+            )
+            story = build_story(template_context, doc.width)
+            layout_ms = (time.perf_counter() - started) * 1000
+            page = _watermark if template_context.get("is_delivered") else (lambda canvas, doc: None)
+            doc.build(story, onFirstPage=page, onLaterPages=page)
+            os.replace(tmp_path, pdf_path)
+        except Exception:
+            with self._stats_lock:
+                self._failures += 1
+            raise
+        finally:
+            with self._stats_lock:
+                self._in_flight -= 1
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+        total_ms = (time.perf_counter() - started) * 1000
+        timings = {"layout_ms": layout_ms, "build_ms": total_ms - layout_ms, "total_ms": total_ms}
+        with self._stats_lock:
+            self._renders += 1
+            for key, value in timings.items():
+                self._totals[key] += value
+                self._max[key] = max(self._max[key], value)
+            self._recent.append(total_ms)
+        return timings
+
+    def stats(self):
+        with self._stats_lock:
+            renders = self._renders
+            recent = sorted(self._recent)
+
+            def _pct(p):
+                if not recent:
+                    return 0.0
+                return round(recent[min(len(recent) - 1, int(p * len(recent)))], 2)
+
+            return {
+                "in_flight": self._in_flight,
+                "renders": renders,
+                "failures": self._failures,
+                "avg_ms": {k: round(v / renders, 2) if renders else 0.0 for k, v in self._totals.items()},
+                "max_ms": {k: round(v, 2) for k, v in self._max.items()},
+                "p50_ms": _pct(0.50),
+                "p95_ms": _pct(0.95),
+            }
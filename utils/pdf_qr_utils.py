@@ -1,33 +1,51 @@
 import qrcode
+import base64
+import hashlib
+import mimetypes
+import threading
+from collections import OrderedDict
 from fpdf import FPDF
 import os
+import re
 from datetime import datetime
 import requests
 from io import BytesIO
 import json
-import pdfkit
-from jinja2 import Environment, FileSystemLoader
+from utils.metrics import timed
 
 # Ensure folders exist
 os.makedirs("static/qr_codes", exist_ok=True)
 os.makedirs("static/pdfs", exist_ok=True)
-# baselocation_url="http://192.168.1.12:6001"
-baselocation_url="http://127.0.0.1:6001"
 # ----------------------------------------------------
 # 🔹 Generate QR Code and Save
 # ----------------------------------------------------
 
 
-def generate_and_save_qr(challan_no, challan_data=None):
+def _artifact_name(challan_no, tenant_id=None):
+    """
+    File path (relative to the artifact folder) for a challan's QR/PDF.
+    Challan numbers are per-tenant, so files live under a tenant folder.
+    """
+    safe_no = re.sub(r"[^A-Za-z0-9._-]+", "-", str(challan_no))
+    return f"{tenant_id}/{safe_no}" if tenant_id is not None else safe_no
+
+
+def challan_pdf_url(challan_no, tenant_id=None):
+    """Relative URL of a challan's published PDF (/static/pdfs/...)."""
+    return f"/static/pdfs/{_artifact_name(challan_no, tenant_id)}.pdf"
+
+
+@timed("qr")
+def generate_and_save_qr(challan_no, challan_data=None, tenant_id=None):
     """
     Generate a hybrid QR code that includes:
     - Non-sensitive challan data (for offline use)
     - A tracking URL (for online redirection)
 
-    Returns the relative URL (e.g., /static/qr_codes/CH-23102025100132.png)
+    Returns the relative URL (e.g., /static/qr_codes/12/CH-000123.png)
     """
     try:
-        os.makedirs("static/qr_codes", exist_ok=True)
+        os.makedirs(os.path.join("static/qr_codes", str(tenant_id) if tenant_id is not None else ""), exist_ok=True)
 
         # 🧠 Build QR payload (exclude sensitive customer data)
         qr_payload = {
@@ -56,7 +74,7 @@ def generate_and_save_qr(challan_no, challan_data=None):
         qr_img = qrcode.make(qr_text)
 
         # ✅ Save QR code
-        filename = f"{challan_no}.png"
+        filename = f"{_artifact_name(challan_no, tenant_id)}.png"
         filepath = os.path.join("static/qr_codes", filename)
         qr_img.save(filepath)
 
@@ -214,30 +232,100 @@ def generate_and_save_qr(challan_no, challan_data=None):
 #         print("❌ PDF generation error:", e)
 #         return None
 
-import os
-import json
-import pdfkit
-from jinja2 import Environment, FileSystemLoader
-from datetime import datetime
+from utils.pdf_renderer import get_renderer, resolve_engine, engine_version
+from utils.pdf_cache import pdf_cache, render_key, file_fingerprint
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# "file": hand wkhtmltopdf file:// paths; "inline": embed data: URIs from an in-memory cache
+PDF_ASSET_MODE = os.environ.get("PDF_ASSET_MODE", "file")
+PDF_ASSET_CACHE_BYTES = int(os.environ.get("PDF_ASSET_CACHE_BYTES", 64 * 1024 * 1024))
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "0.0.0.0", "[::1]")
+
+
+def _local_static_file(url):
+    """Map a /static/... URL (absolute or relative) to its file on disk, if any."""
+    if not url or "/static/" not in "/" + str(url).lstrip("/"):
+        return None
+    rel = "static/" + ("/" + str(url).lstrip("/")).split("/static/", 1)[1].split("?", 1)[0]
+    path = os.path.normpath(os.path.join(PROJECT_ROOT, rel))
+    if not path.startswith(os.path.join(PROJECT_ROOT, "static") + os.sep):
+        return None
+    return path if os.path.isfile(path) else None
+
+
+class _AssetCache:
+    """Small LRU of data: URIs keyed by (path, size, mtime) for PDF_ASSET_MODE=inline."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def data_uri(self, path):
+        st = os.stat(path)
+        key = (path, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        with open(path, "rb") as f:
+            uri = f"data:{mime};base64,{base64.b64encode(f.read()).decode('ascii')}"
+        with self._lock:
+            self._items[key] = uri
+            self._bytes += len(uri)
+            while self._bytes > self.max_bytes and len(self._items) > 1:
+                _, old = self._items.popitem(last=False)
+                self._bytes -= len(old)
+        return uri
+
+
+_asset_cache = _AssetCache(PDF_ASSET_CACHE_BYTES)
 
-def generate_pdf(data, tenant_design):
+
+def resolve_asset(url):
+    """
+    Resolve a logo/image/QR reference for wkhtmltopdf without HTTP loopback:
+    files under static/ are read from disk, remote URLs pass through, and
+    references to our own host whose file is missing are dropped.
+    """
+    if not url:
+        return None
+    local_file = _local_static_file(url)
+    if local_file:
+        if PDF_ASSET_MODE == "inline":
+            return _asset_cache.data_uri(local_file)
+        return "file://" + local_file
+    url = str(url)
+    if url.startswith("http://") or url.startswith("https://"):
+        host = url.split("://", 1)[1].split("/", 1)[0].rsplit(":", 1)[0]
+        if host in LOOPBACK_HOSTS:
+            print(f"⚠️ Skipping missing local asset: {url}")
+            return None
+        return url
+    return None
+
+@timed("pdf")
+def generate_pdf(data, tenant_design, tenant_id=None, output_path=None):
     """
-    Generate a professional HTML-based PDF (challan_preview.html)
+    Generate a professional HTML-based PDF (challan_template.html)
     Includes accessories, theme color, fonts, and images.
+    Rendering goes through the shared renderer for the tenant's engine
+    (challan_config "pdf_engine", see utils/pdf_renderer.py).
+    With `output_path` the PDF is written there instead of the challan's
+    static file and that path is returned (used by exports).
     """
     try:
         base_dir = os.path.dirname(os.path.abspath(__file__))
-        templates_dir = os.path.join(base_dir, "templates")
         static_dir = os.path.join(base_dir, "..", "static", "pdfs")
-        os.makedirs(static_dir, exist_ok=True)
-
-        env = Environment(loader=FileSystemLoader(templates_dir))
-        template = env.get_template("challan_template.html")
 
         challan_no = data.get("challan_no", f"CH-{datetime.now().strftime('%d%m%Y%H%M%S')}")
-        pdf_filename = f"{challan_no}.pdf"
-        pdf_path = os.path.join(static_dir, pdf_filename)
-        relative_url = f"/static/pdfs/{pdf_filename}"
+        pdf_filename = f"{_artifact_name(challan_no, tenant_id)}.pdf"
+        pdf_path = output_path or os.path.join(static_dir, pdf_filename)
+        os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+        relative_url = output_path or challan_pdf_url(challan_no, tenant_id)
 
         # ✅ Format accessories
         accessories_list = data.get("accessories", [])
@@ -250,46 +338,38 @@ def generate_pdf(data, tenant_design):
             accessories_list = [str(accessories_list)]
         accessories_str = ", ".join(accessories_list) if accessories_list else "—"
 
-        # ✅ Fix logo path
-        logo_url = tenant_design.get("logo_url", "")
-        if logo_url and not logo_url.startswith("http"):
-            logo_url = f"{baselocation_url}{logo_url}"
-
-        # ✅ Fix images
-        image_urls = []
-        for img in data.get("images", []):
-            if img and not str(img).startswith("http"):
-                image_urls.append(f"{baselocation_url}/{img.lstrip('/')}")
-            else:
-                image_urls.append(img)
-
-        html_content = template.render(
-                tenant_design=tenant_design,
-                data=data,
-                accessories=accessories_str,
-                images=image_urls,
-                logo_url=logo_url,
-                terms_conditions=tenant_design.get("terms_conditions", ""),   # ✅ Added line
-                is_delivered=(data.get("status", "").lower() == "delivered"),
-                generated_on=datetime.now().strftime("%d/%m/%Y, %I:%M %p"),
-            )
-
-
-        pdfkit.from_string(
-            html_content,
-            pdf_path,
-            options={
-                "enable-local-file-access": "",
-                "quiet": "",
-                "margin-top": "10mm",
-                "margin-bottom": "10mm",
-                "margin-left": "10mm",
-                "margin-right": "10mm",
-                "encoding": "UTF-8",
-            },
-        )
-
-        print(f"✅ PDF generated successfully: {pdf_path}")
+        # ✅ Resolve logo, images and QR from disk (no self-HTTP during rendering)
+        logo_url = resolve_asset(tenant_design.get("logo_url", ""))
+        image_urls = [u for u in (resolve_asset(img) for img in data.get("images", [])) if u]
+        qr_url = resolve_asset(data.get("qr_code_url"))
+
+        context = {
+            "tenant_design": tenant_design,
+            "data": data,
+            "accessories": accessories_str,
+            "images": image_urls,
+            "logo_url": logo_url,
+            "qr_url": qr_url,
+            "terms_conditions": tenant_design.get("terms_conditions", ""),   # ✅ Added line
+            "is_delivered": (data.get("status", "").lower() == "delivered"),
+            "generated_on": datetime.now().strftime("%d/%m/%Y, %I:%M %p"),
+        }
+
+        # ♻️ Identical inputs (template + context + embedded files) reuse the cached PDF
+        assets = {}
+        for url in [logo_url, qr_url, *image_urls]:
+            if url and url.startswith("file://"):
+                assets[url] = file_fingerprint(url[len("file://"):])
+            elif url and url.startswith("data:"):
+                assets[url[:64]] = hashlib.sha256(url.encode("ascii")).hexdigest()
+        engine = resolve_engine(tenant_design.get("pdf_engine"))
+        key = render_key(engine_version(engine), context, assets)
+
+        started = datetime.now()
+        hit = pdf_cache.get_or_render(key, pdf_path, lambda path: get_renderer(engine).render(context, path))
+        elapsed_ms = (datetime.now() - started).total_seconds() * 1000
+
+        print(f"✅ PDF {'reused from cache' if hit else 'generated successfully'} [{engine}]: {pdf_path} ({elapsed_ms:.0f} ms)")
         return relative_url
 
     except Exception as e:
@@ -0,0 +1,303 @@
+import os
+import time
+import hashlib
+import threading
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pdfkit
+from jinja2 import Environment, FileSystemLoader
+
+# ============================================================
+# 🔹 CONFIGURATION
+# ============================================================
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+CHALLAN_TEMPLATE = "challan_template.html"
+
+# Simultaneous wkhtmltopdf processes per Python process
+PDF_RENDER_WORKERS = int(os.environ.get("PDF_RENDER_WORKERS", max(1, min(4, os.cpu_count() or 1))))
+# Renders allowed to wait for a free worker before callers are rejected
+PDF_RENDER_QUEUE = int(os.environ.get("PDF_RENDER_QUEUE", 32))
+PDF_RENDER_TIMEOUT = float(os.environ.get("PDF_RENDER_TIMEOUT", 60))
+WKHTMLTOPDF_BIN = os.environ.get("WKHTMLTOPDF_BIN", "")
+# Engine for tenants whose challan_config has no "pdf_engine" (see ENGINES)
+PDF_ENGINE = os.environ.get("PDF_ENGINE", "wkhtmltopdf")
+
+WKHTMLTOPDF_OPTIONS = {
+    "enable-local-file-access": "",
+    "quiet": "",
+    "margin-top": "10mm",
+    "margin-bottom": "10mm",
+    "margin-left": "10mm",
+    "margin-right": "10mm",
+    "encoding": "UTF-8",
+}
+
+
+class RendererBusyError(RuntimeError):
+    """Raised when the render queue is full."""
+
+
+# ============================================================
+# 🔹 TEMPLATE CACHE
+# ============================================================
+# auto_reload=False: the compiled template is reused until the process restarts
+_template_env = Environment(loader=FileSystemLoader(TEMPLATES_DIR), auto_reload=False)
+
+
+_template_versions = {}
+
+
+def get_template(name=CHALLAN_TEMPLATE):
+    """Return the compiled Jinja template (compiled once per process)."""
+    return _template_env.get_template(name)
+
+
+def template_version(name=CHALLAN_TEMPLATE):
+    """Hash of the template source and wkhtmltopdf options, used in PDF cache keys."""
+    if name not in _template_versions:
+        source, _, _ = _template_env.loader.get_source(_template_env, name)
+        digest = hashlib.sha256(source.encode("utf-8"))
+        digest.update(repr(sorted(WKHTMLTOPDF_OPTIONS.items())).encode("utf-8"))
+        _template_versions[name] = digest.hexdigest()[:16]
+    return _template_versions[name]
+
+
+# ============================================================
+# 🔹 RENDERER SERVICE
+# ============================================================
+class PdfRenderer:
+    """
+    Bounded pool of render workers. wkhtmltopdf is a one-shot CLI, so each
+    render still spawns a process; the pool keeps the worker threads, the
+    resolved binary path and the compiled template warm, and caps how many
+    wkhtmltopdf processes run at once so a burst of challans queues instead
+    of forking without limit.
+    """
+
+    def __init__(self, workers=PDF_RENDER_WORKERS, queue_size=PDF_RENDER_QUEUE, timeout=PDF_RENDER_TIMEOUT):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pdf-render")
+        self._slots = threading.BoundedSemaphore(self.workers + max(0, queue_size))
+        self._config = None
+        self._config_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self._queued = 0
+        self._renders = 0
+        self._failures = 0
+        self._timeouts = 0
+        self._rejected = 0
+        self._totals = {"template_ms": 0.0, "queue_ms": 0.0, "wkhtmltopdf_ms": 0.0, "total_ms": 0.0}
+        self._max = dict(self._totals)
+        self._recent = deque(maxlen=500)
+
+    # ---------------- internals ----------------
+    def _configuration(self):
+        # pdfkit.configuration() shells out to `which` on every call; resolve once
+        if self._config is None:
+            with self._config_lock:
+                if self._config is None:
+                    self._config = pdfkit.configuration(wkhtmltopdf=WKHTMLTOPDF_BIN)
+        return self._config
+
+    def _record(self, timings, ok=True, timed_out=False):
+        with self._stats_lock:
+            if ok:
+                self._renders += 1
+                for key, value in timings.items():
+                    self._totals[key] += value
+                    self._max[key] = max(self._max[key], value)
+                self._recent.append(timings["total_ms"])
+            else:
+                self._failures += 1
+                if timed_out:
+                    self._timeouts += 1
+
+    def _run_wkhtmltopdf(self, html, pdf_path, options):
+        """Run one wkhtmltopdf process, writing atomically to `pdf_path`."""
+        base, ext = os.path.splitext(pdf_path)
+        tmp_path = f"{base}.tmp-{os.getpid()}-{threading.get_ident()}{ext or '.pdf'}"
+        kit = pdfkit.PDFKit(html, "string", options=options, configuration=self._configuration())
+        args = kit.command(tmp_path)
+        try:
+            result = subprocess.run(
+                args,
+                input=kit.source.to_s().encode("utf-8"),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=self.timeout,
+                env=kit.environ,
+            )
+            # wkhtmltopdf exits 1 on recoverable asset errors but still writes the PDF
+            if not os.path.exists(tmp_path) or os.path.getsize(tmp_path) == 0:
+                stderr = (result.stderr or b"").decode("utf-8", errors="replace")
+                raise IOError(f"wkhtmltopdf failed (exit {result.returncode}): {stderr.strip()[:500]}")
+            os.replace(tmp_path, pdf_path)
+        finally:
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    # ---------------- public API ----------------
+    def render(self, template_context, pdf_path, template_name=CHALLAN_TEMPLATE, options=None):
+        """
+        Render `template_context` through the cached template into `pdf_path`.
+        Blocks until done; raises RendererBusyError when the queue is full.
+        Returns the timing breakdown in milliseconds.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._stats_lock:
+                self._rejected += 1
+            raise RendererBusyError("PDF renderer queue is full")
+
+        started = time.perf_counter()
+        try:
+            html = get_template(template_name).render(**template_context)
+            template_ms = (time.perf_counter() - started) * 1000
+
+            def _job():
+                picked_up = time.perf_counter()
+                with self._stats_lock:
+                    self._queued -= 1
+                    self._in_flight += 1
+                try:
+                    self._run_wkhtmltopdf(html, pdf_path, options or WKHTMLTOPDF_OPTIONS)
+                    return (picked_up - submitted) * 1000, (time.perf_counter() - picked_up) * 1000
+                finally:
+                    with self._stats_lock:
+                        self._in_flight -= 1
+
+            submitted = time.perf_counter()
+            with self._stats_lock:
+                self._queued += 1
+            queue_ms, wk_ms = self._executor.submit(_job).result()
+        except subprocess.TimeoutExpired:
+            self._record(None, ok=False, timed_out=True)
+            raise
+        except Exception:
+            self._record(None, ok=False)
+            raise
+        finally:
+            self._slots.release()
+
+        timings = {
+            "template_ms": template_ms,
+            "queue_ms": queue_ms,
+            "wkhtmltopdf_ms": wk_ms,
+            "total_ms": (time.perf_counter() - started) * 1000,
+        }
+        self._record(timings)
+        return timings
+
+    def stats(self):
+        with self._stats_lock:
+            renders = self._renders
+            recent = sorted(self._recent)
+
+            def _pct(p):
+                if not recent:
+                    return 0.0
+                return round(recent[min(len(recent) - 1, int(p * len(recent)))], 2)
+
+            return {
+                "workers": self.workers,
+                "in_flight": self._in_flight,
+                "queued": self._queued,
+                "renders": renders,
+                "failures": self._failures,
+                "timeouts": self._timeouts,
+                "rejected": self._rejected,
+                "avg_ms": {k: round(v / renders, 2) if renders else 0.0 for k, v in self._totals.items()},
+                "max_ms": {k: round(v, 2) for k, v in self._max.items()},
+                "p50_ms": _pct(0.50),
+                "p95_ms": _pct(0.95),
+            }
+
+
+# ============================================================
+# 🔹 ENGINES
+# ============================================================
+# A renderer is any object with render(template_context, pdf_path) -> timings
+# and stats(); generate_pdf() builds one template context for all of them.
+ENGINES = ("wkhtmltopdf", "native")
+
+_renderers = {}
+_renderer_pid = None
+_renderer_lock = threading.Lock()
+_warned_engines = set()
+
+
+def _create_renderer(engine):
+    if engine == "native":
+        from utils.pdf_native import NativePdfRenderer
+        return NativePdfRenderer()
+    return PdfRenderer()
+
+
+def _native_available():
+    from utils.pdf_native import native_available
+    return native_available()
+
+
+def resolve_engine(engine=None):
+    """
+    Engine name for a tenant's "pdf_engine" setting: PDF_ENGINE when unset
+    or unknown, wkhtmltopdf when the native engine's reportlab is missing.
+    """
+    name = str(engine or PDF_ENGINE).strip().lower()
+    if name not in ENGINES:
+        if name not in _warned_engines:
+            _warned_engines.add(name)
+            print(f"⚠️ Unknown PDF engine '{name}', using {PDF_ENGINE}")
+        name = PDF_ENGINE if PDF_ENGINE in ENGINES else "wkhtmltopdf"
+    if name == "native" and not _native_available():
+        if "native" not in _warned_engines:
+            _warned_engines.add("native")
+            print("⚠️ Native PDF engine needs reportlab; falling back to wkhtmltopdf")
+        name = "wkhtmltopdf"
+    return name
+
+
+def engine_version(engine):
+    """Template/layout version of an engine, used in PDF cache keys."""
+    if engine == "native":
+        from utils.pdf_native import layout_version
+        return layout_version()
+    return template_version()
+
+
+def get_renderer(engine=None):
+    """Process-wide renderer per engine (recreated after fork, like the DB pool)."""
+    global _renderers, _renderer_pid
+    engine = resolve_engine(engine)
+    pid = os.getpid()
+    if _renderer_pid != pid or engine not in _renderers:
+        with _renderer_lock:
+            if _renderer_pid != pid:
+                _renderers, _renderer_pid = {}, pid
+            if engine not in _renderers:
+                _renderers[engine] = _create_renderer(engine)
+    return _renderers[engine]
+
+
+def get_render_stats():
+    """wkhtmltopdf pool stats, plus the native engine's under "native" once it has been used."""
+    renderers = _renderers if _renderer_pid == os.getpid() else {}
+    if "wkhtmltopdf" in renderers:
+        stats = renderers["wkhtmltopdf"].stats()
+    else:
+        stats = {
+            "workers": PDF_RENDER_WORKERS, "in_flight": 0, "queued": 0, "renders": 0,
+            "failures": 0, "timeouts": 0, "rejected": 0, "avg_ms": {}, "max_ms": {},
+            "p50_ms": 0.0, "p95_ms": 0.0,
+        }
+    stats["default_engine"] = resolve_engine()
+    if "native" in renderers:
+        stats["native"] = renderers["native"].stats()
+    return stats
@@ -0,0 +1,232 @@
+"""
+Instrumented psycopg2 cursors: slow-query log, per-request query counts and
+(in debug mode) N+1 detection.
+
+Every pooled connection is opened with InstrumentedCursor as its cursor
+factory, and `conn.cursor(cursor_factory=RealDictCursor)` call sites get an
+instrumented subclass of the requested factory (see utils/db.py), so no call
+site changes.
+
+  - Each execute() is reported to utils.metrics as the "db_query" component,
+    so the query count and time show up in Server-Timing and /metrics.
+  - Statements slower than SLOW_QUERY_MS are printed with normalized SQL
+    (literals and placeholders replaced by ?, IN/VALUES lists collapsed)
+    and a fingerprint of the parameters instead of their values.
+  - With QUERY_DEBUG=1 (or app.debug) each request's statements are grouped
+    by normalized SQL, and a statement repeated N_PLUS_ONE_THRESHOLD or
+    more times is reported as a likely N+1.
+"""
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from psycopg2 import extensions
+from utils.metrics import observe_component
+
+# ============================================================
+# 🔹 CONFIGURATION
+# ============================================================
+# Statements at or above this many ms are logged (<= 0 disables the log)
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 250))
+QUERY_DEBUG = os.environ.get("QUERY_DEBUG", "0") in ("1", "true", "yes")
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("N_PLUS_ONE_THRESHOLD", 5))
+# distinct slow statements kept for /api/admin/dashboard/slow_queries
+SLOW_QUERY_KEEP = int(os.environ.get("SLOW_QUERY_KEEP", 200))
+SQL_LOG_MAX_CHARS = 500
+
+# per-request statement counts (debug mode only): {"endpoint": ..., "statements": {sql: [count, seconds]}}
+_request_queries = ContextVar("request_queries", default=None)
+
+
+# ============================================================
+# 🔹 NORMALIZATION
+# ============================================================
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER_RE = re.compile(r"%\(\w+\)s|%s")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROWS_RE = re.compile(r"\(\?, \.\.\.\)(?:\s*,\s*\(\?, \.\.\.\))+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(query):
+    """SQL with literals/placeholders replaced by ? and lists collapsed, for grouping and logs."""
+    if isinstance(query, (bytes, bytearray)):
+        query = query.decode("utf-8", errors="replace")
+    sql = _COMMENT_RE.sub(" ", str(query))
+    sql = _STRING_RE.sub("?", sql)
+    sql = _PLACEHOLDER_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _LIST_RE.sub("(?, ...)", sql)
+    sql = _ROWS_RE.sub("(?, ...), ...", sql)
+    sql = _SPACE_RE.sub(" ", sql).strip()
+    return sql[:SQL_LOG_MAX_CHARS] + ("…" if len(sql) > SQL_LOG_MAX_CHARS else "")
+
+
+def params_fingerprint(params):
+    """Short, stable hash of the bound parameters (values are never logged)."""
+    if params is None:
+        return "-"
+    return hashlib.sha1(repr(params).encode("utf-8", errors="replace")).hexdigest()[:12]
+
+
+# ============================================================
+# 🔹 SLOW QUERY LOG
+# ============================================================
+class SlowQueryLog:
+    """Counters for every statement plus the slowest normalized statements."""
+
+    def __init__(self, threshold_ms=SLOW_QUERY_MS, keep=SLOW_QUERY_KEEP):
+        self.threshold_ms = threshold_ms
+        self.keep = max(1, keep)
+        self._lock = threading.Lock()
+        self._queries = 0
+        self._total_ms = 0.0
+        self._slow = 0
+        self._statements = OrderedDict()  # normalized sql -> stats
+
+    def record(self, query, params, elapsed_ms, many=False):
+        with self._lock:
+            self._queries += 1
+            self._total_ms += elapsed_ms
+        if self.threshold_ms <= 0 or elapsed_ms < self.threshold_ms:
+            return
+
+        sql = normalize_sql(query)
+        fingerprint = params_fingerprint(params)
+        with self._lock:
+            self._slow += 1
+            entry = self._statements.pop(sql, None) or {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["last_params"] = fingerprint
+            self._statements[sql] = entry
+            while len(self._statements) > self.keep:
+                self._statements.popitem(last=False)
+
+        current = _request_queries.get()
+        where = current["endpoint"] if current else _context_label()
+        print(f"🐢 Slow query {elapsed_ms:.1f} ms [{where}]{' (executemany)' if many else ''}: "
+              f"{sql} params#{fingerprint}")
+
+    def stats(self):
+        with self._lock:
+            statements = sorted(self._statements.items(), key=lambda kv: kv[1]["total_ms"], reverse=True)
+            return {
+                "queries": self._queries,
+                "total_ms": round(self._total_ms, 1),
+                "slow": self._slow,
+                "threshold_ms": self.threshold_ms,
+                "slowest": [
+                    {"sql": sql, **{k: round(v, 2) if isinstance(v, float) else v for k, v in entry.items()}}
+                    for sql, entry in statements[:20]
+                ],
+            }
+
+
+slow_query_log = SlowQueryLog()
+
+
+def _context_label():
+    try:
+        from flask import has_request_context, request
+        if has_request_context():
+            return f"{request.method} {request.path}"
+    except Exception:
+        pass
+    return threading.current_thread().name
+
+
+def _record(query, params, elapsed, many=False):
+    observe_component("db_query", elapsed)
+    slow_query_log.record(query, params, elapsed * 1000, many=many)
+    current = _request_queries.get()
+    if current is not None:
+        sql = normalize_sql(query)
+        entry = current["statements"].setdefault(sql, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+
+
+# ============================================================
+# 🔹 CURSORS
+# ============================================================
+class InstrumentedCursorMixin:
+    """Times execute()/executemany() on any psycopg2 cursor class."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _record(query, vars, time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            _record(query, None, time.perf_counter() - started, many=True)
+
+
+class InstrumentedCursor(InstrumentedCursorMixin, extensions.cursor):
+    pass
+
+
+_factories = {extensions.cursor: InstrumentedCursor}
+_factories_lock = threading.Lock()
+
+
+def instrumented_factory(factory):
+    """Instrumented subclass of a cursor factory (e.g. RealDictCursor), cached per class."""
+    if factory is None:
+        return InstrumentedCursor
+    if not isinstance(factory, type) or issubclass(factory, InstrumentedCursorMixin):
+        return factory
+    with _factories_lock:
+        if factory not in _factories:
+            _factories[factory] = type(f"Instrumented{factory.__name__}", (InstrumentedCursorMixin, factory), {})
+        return _factories[factory]
+
+
+# ============================================================
+# 🔹 FLASK INTEGRATION (debug mode)
+# ============================================================
+def init_query_log(app):
+    """Group each request's statements and flag likely N+1 patterns (debug only)."""
+    from flask import request, g
+
+    if not (QUERY_DEBUG or app.debug):
+        return
+
+    @app.before_request
+    def _start_query_tracking():
+        g._query_token = _request_queries.set({"endpoint": f"{request.method} {request.path}", "statements": {}})
+
+    @app.after_request
+    def _report_queries(response):
+        current = _request_queries.get()
+        if current is None:
+            return response
+        statements = current["statements"]
+        response.headers["X-Query-Count"] = str(sum(count for count, _ in statements.values()))
+        repeated = [(sql, count, seconds) for sql, (count, seconds) in statements.items()
+                    if count >= N_PLUS_ONE_THRESHOLD]
+        for sql, count, seconds in sorted(repeated, key=lambda r: r[1], reverse=True):
+            print(f"🔁 Possible N+1 on {current['endpoint']}: {count}× ({seconds * 1000:.1f} ms) {sql}")
+        return response
+
+    @app.teardown_request
+    def _stop_query_tracking(exc):
+        token = g.pop("_query_token", None)
+        if token is not None:
+            _request_queries.reset(token)
+
+
+def get_query_stats():
+    return slow_query_log.stats()
@@ -0,0 +1,271 @@
+import os
+import time
+import hashlib
+import smtplib
+import threading
+from flask_mail import Connection
+
+# ============================================================
+# 🔹 CONFIGURATION
+# ============================================================
+# Authenticated sessions kept per (server, port, username, credentials/TLS mode)
+SMTP_POOL_MAX_PER_KEY = int(os.environ.get("SMTP_POOL_MAX_PER_KEY", 3))
+# Idle sessions older than this are closed instead of reused
+SMTP_IDLE_TIMEOUT = float(os.environ.get("SMTP_IDLE_TIMEOUT", 120))
+# Sessions idle longer than this are checked with NOOP before reuse
+SMTP_KEEPALIVE_SECONDS = float(os.environ.get("SMTP_KEEPALIVE_SECONDS", 30))
+SMTP_CONNECT_TIMEOUT = float(os.environ.get("SMTP_CONNECT_TIMEOUT", 20))
+SMTP_CHECKOUT_TIMEOUT = float(os.environ.get("SMTP_CHECKOUT_TIMEOUT", 30))
+
+# errors that mean the session is gone and a fresh one may succeed
+_RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPHeloError, ConnectionError, TimeoutError)
+
+
+class SmtpPoolTimeout(smtplib.SMTPException):
+    """Raised when no SMTP session frees up in time."""
+
+
+class _Session:
+    __slots__ = ("host", "created_at", "last_used", "sent")
+
+    def __init__(self, host):
+        self.host = host
+        self.created_at = self.last_used = time.monotonic()
+        self.sent = 0    # messages on this session, for MAIL_MAX_EMAILS
+
+
+def _close(host):
+    try:
+        host.quit()
+    except Exception:
+        try:
+            host.close()
+        except Exception:
+            pass
+
+
+class SmtpPool:
+    """
+    Reusable authenticated SMTP sessions keyed by (server, port, username)
+    plus a hash of the password and TLS/SSL mode, so a session logged in with
+    old credentials is never handed out after a settings change.
+    Each key holds at most `max_per_key` sessions; callers wait for a free one.
+    """
+
+    def __init__(self, max_per_key=SMTP_POOL_MAX_PER_KEY, idle_timeout=SMTP_IDLE_TIMEOUT,
+                 keepalive=SMTP_KEEPALIVE_SECONDS):
+        self.max_per_key = max(1, max_per_key)
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self._cond = threading.Condition()
+        self._idle = {}    # key -> [_Session] (most recently used last)
+        self._open = {}    # key -> number of sessions (idle + checked out)
+        self._stats = {"sends": 0, "connects": 0, "reused": 0, "reconnects": 0,
+                       "evicted_idle": 0, "keepalive_failures": 0, "waits": 0,
+                       "suppressed": 0}
+
+    @staticmethod
+    def key_for(state):
+        secret = f"{state.password or ''}\0{bool(state.use_tls)}\0{bool(state.use_ssl)}"
+        return (state.server, int(state.port or 0), state.username or "",
+                hashlib.sha256(secret.encode("utf-8")).hexdigest()[:16])
+
+    # ---------------- sessions ----------------
+    def _connect(self, state):
+        if state.use_ssl:
+            host = smtplib.SMTP_SSL(state.server, state.port, timeout=SMTP_CONNECT_TIMEOUT)
+        else:
+            host = smtplib.SMTP(state.server, state.port, timeout=SMTP_CONNECT_TIMEOUT)
+        try:
+            if state.use_tls:
+                host.starttls()
+            if state.username and state.password:
+                host.login(state.username, state.password)
+        except Exception:
+            _close(host)
+            raise
+        with self._cond:
+            self._stats["connects"] += 1
+        return _Session(host)
+
+    def _evict_idle_locked(self, now):
+        """Close sessions idle past the timeout (caller holds the lock)."""
+        expired = []
+        for key, sessions in self._idle.items():
+            keep = []
+            for s in sessions:
+                if now - s.last_used > self.idle_timeout:
+                    expired.append(s)
+                    self._open[key] -= 1
+                else:
+                    keep.append(s)
+            self._idle[key] = keep
+        self._stats["evicted_idle"] += len(expired)
+        if expired:
+            self._cond.notify_all()
+        return expired
+
+    def _checkout(self, state, timeout=SMTP_CHECKOUT_TIMEOUT):
+        key = self.key_for(state)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                expired = self._evict_idle_locked(now)
+                idle = self._idle.get(key)
+                if idle:
+                    session = idle.pop()
+                    break
+                if self._open.get(key, 0) < self.max_per_key:
+                    self._open[key] = self._open.get(key, 0) + 1
+                    session = None
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise SmtpPoolTimeout(f"No SMTP session available for {key[0]}:{key[1]}")
+                self._stats["waits"] += 1
+                self._cond.wait(remaining)
+
+        for s in expired:
+            _close(s.host)
+
+        if session is not None and time.monotonic() - session.last_used > self.keepalive:
+            # long-idle session: make sure the server has not dropped it
+            try:
+                code, _ = session.host.noop()
+                if code != 250:
+                    raise smtplib.SMTPServerDisconnected(f"NOOP returned {code}")
+            except Exception:
+                with self._cond:
+                    self._stats["keepalive_failures"] += 1
+                _close(session.host)
+                session = None
+
+        if session is None:
+            try:
+                return key, self._connect(state), False
+            except Exception:
+                self._release_slot(key)
+                raise
+        with self._cond:
+            self._stats["reused"] += 1
+        return key, session, True
+
+    def _release_slot(self, key):
+        with self._cond:
+            self._open[key] = max(0, self._open.get(key, 0) - 1)
+            self._cond.notify()
+
+    def _checkin(self, key, session):
+        session.last_used = time.monotonic()
+        with self._cond:
+            self._idle.setdefault(key, []).append(session)
+            self._cond.notify()
+
+    def _discard(self, key, session):
+        _close(session.host)
+        self._release_slot(key)
+
+    # ---------------- public API ----------------
+    def send(self, state, message):
+        """
+        Send a flask_mail Message over a pooled session for `state` (a
+        flask_mail _Mail). Must run inside an app context. A reused session
+        that turns out to be dead is replaced once before giving up.
+        With MAIL_SUPPRESS_SEND (or TESTING) nothing is sent: the message is
+        only recorded (email_dispatched), as flask_mail itself does.
+        """
+        if state.suppress:
+            Connection(state).send(message)
+            with self._cond:
+                self._stats["suppressed"] += 1
+            return True
+
+        for attempt in (1, 2):
+            key, session, reused = self._checkout(state)
+            try:
+                connection = Connection(state)
+                connection.host = session.host
+                # flask_mail counts toward MAIL_MAX_EMAILS per connection; count per session
+                connection.num_emails = session.sent
+                connection.send(message)
+                if connection.host is not session.host:
+                    # MAIL_MAX_EMAILS reached: flask_mail quit the session and
+                    # opened a new one, which takes the old one's slot
+                    session = _Session(connection.host)
+                    with self._cond:
+                        self._stats["connects"] += 1
+                else:
+                    session.sent = connection.num_emails
+            except _RECONNECT_ERRORS:
+                self._discard(key, session)
+                if reused and attempt == 1:
+                    # siblings were most likely dropped by the same server restart
+                    self.close_key(key)
+                    with self._cond:
+                        self._stats["reconnects"] += 1
+                    continue
+                raise
+            except smtplib.SMTPResponseException:
+                # server rejected this message but the session is fine; reset it for the next send
+                try:
+                    session.host.rset()
+                    self._checkin(key, session)
+                except Exception:
+                    self._discard(key, session)
+                raise
+            except Exception:
+                self._discard(key, session)
+                raise
+            self._checkin(key, session)
+            with self._cond:
+                self._stats["sends"] += 1
+            return True
+
+    def close_key(self, key):
+        """Close idle sessions for a key (e.g. after the tenant changed credentials)."""
+        with self._cond:
+            sessions = self._idle.pop(key, [])
+            self._open[key] = max(0, self._open.get(key, 0) - len(sessions))
+            self._cond.notify_all()
+        for s in sessions:
+            _close(s.host)
+
+    def close_all(self):
+        for key in list(self._idle):
+            self.close_key(key)
+
+    def stats(self):
+        with self._cond:
+            return {
+                **self._stats,
+                "keys": len([k for k, n in self._open.items() if n]),
+                "open": sum(self._open.values()),
+                "idle": sum(len(v) for v in self._idle.values()),
+                "max_per_key": self.max_per_key,
+                "idle_timeout_s": self.idle_timeout,
+            }
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_smtp_pool():
+    """Process-wide SMTP pool (recreated after fork, like the DB pool)."""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool, _pool_pid = SmtpPool(), pid
+    return _pool
+
+
+def get_smtp_pool_stats():
+    if _pool is None or _pool_pid != os.getpid():
+        return {"sends": 0, "connects": 0, "reused": 0, "reconnects": 0, "evicted_idle": 0,
+                "keepalive_failures": 0, "waits": 0, "suppressed": 0, "keys": 0, "open": 0,
+                "idle": 0, "max_per_key": max(1, SMTP_POOL_MAX_PER_KEY), "idle_timeout_s": SMTP_IDLE_TIMEOUT}
+    return _pool.stats()
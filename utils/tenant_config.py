@@ -0,0 +1,248 @@
+"""
+Parsed per-tenant configuration (branding, challan, email, terms) cached in
+process, so routes, the PDF job and the mailer stop re-querying
+`tenant_settings` and re-parsing its JSON on every call.
+
+Entries live in a TTL'd LRU per process. When TENANT_CONFIG_REDIS_URL is set
+(and the optional `redis` package is installed) a shared Redis copy sits
+behind it, so a freshly started worker does not go to Postgres for every
+tenant. Writers call invalidate_tenant_config() after committing; other
+processes pick the change up within TENANT_CONFIG_TTL seconds.
+
+Shared entries are stamped with a per-tenant generation counter kept in
+Redis and bumped on every invalidation. A process only writes an entry if
+the generation it read before loading from Postgres is still current, and
+readers ignore entries from an older generation, so a load that raced a
+settings change in another process can never be served from Redis.
+"""
+import os
+import copy
+import json
+import time
+import threading
+from collections import OrderedDict
+from utils.db import db_connection
+
+try:
+    import redis
+except ImportError:  # optional
+    redis = None
+
+# ============================================================
+# 🔹 CONFIGURATION
+# ============================================================
+TENANT_CONFIG_TTL = float(os.environ.get("TENANT_CONFIG_TTL", 30))
+TENANT_CONFIG_MAX_ENTRIES = int(os.environ.get("TENANT_CONFIG_MAX_ENTRIES", 1000))
+TENANT_CONFIG_REDIS_URL = os.environ.get("TENANT_CONFIG_REDIS_URL", "")
+# shared copy outlives the local one; it is deleted on invalidation anyway
+TENANT_CONFIG_REDIS_TTL = int(os.environ.get("TENANT_CONFIG_REDIS_TTL", 600))
+_REDIS_PREFIX = "tenant_config:"
+_REDIS_GENERATION_PREFIX = "tenant_config_gen:"
+
+CONFIG_SQL = """
+SELECT ts.branding_config, ts.challan_config, ts.email_config, ts.terms_conditions,
+       t.email, ts.tenant_id IS NOT NULL
+FROM tenants t
+LEFT JOIN tenant_settings ts ON ts.tenant_id = t.id
+WHERE t.id = %s
+"""
+
+
+def _parse(value):
+    """dict from a JSON/JSONB column value, {} for anything unusable."""
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode("utf-8")
+    try:
+        parsed = json.loads(value)
+        return parsed if isinstance(parsed, dict) else {}
+    except Exception:
+        return {}
+
+
+def load_tenant_config(tenant_id):
+    """
+    Read and parse a tenant's settings from Postgres. Returns None for an
+    unknown tenant; a tenant without a settings row gets empty sections.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(CONFIG_SQL, (tenant_id,))
+        row = cur.fetchone()
+        cur.close()
+    if not row:
+        return None
+    return {
+        "branding": _parse(row[0]),
+        "challan": _parse(row[1]),
+        "email": _parse(row[2]),
+        "terms_conditions": row[3] or "",
+        "tenant_email": row[4],
+        "has_settings": bool(row[5]),
+    }
+
+
+# ============================================================
+# 🔹 CACHE
+# ============================================================
+class TenantConfigCache:
+    """LRU of parsed tenant configs with a TTL, optionally backed by Redis."""
+
+    def __init__(self, ttl=TENANT_CONFIG_TTL, max_entries=TENANT_CONFIG_MAX_ENTRIES, redis_url=TENANT_CONFIG_REDIS_URL):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # tenant_id -> (expires_at, config)
+        # bumped on invalidation so a load that raced a write is not cached
+        self._generations = {}
+        self._stats = {"hits": 0, "misses": 0, "shared_hits": 0, "loads": 0,
+                       "invalidations": 0, "evictions": 0, "shared_errors": 0}
+        self._redis = None
+        if redis_url and redis is not None:
+            self._redis = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        elif redis_url:
+            print("⚠️ TENANT_CONFIG_REDIS_URL set but the redis package is not installed; using local cache only")
+
+    # ---------------- shared tier ----------------
+    def _shared_get(self, tenant_id):
+        """(config or None, generation) from Redis; the generation is None when Redis is unusable."""
+        if self._redis is None:
+            return None, None
+        try:
+            raw, generation = self._redis.mget(f"{_REDIS_PREFIX}{tenant_id}", f"{_REDIS_GENERATION_PREFIX}{tenant_id}")
+            generation = int(generation or 0)
+            entry = json.loads(raw) if raw else None
+            if entry and entry.get("generation") == generation:
+                return entry["config"], generation
+            return None, generation
+        except Exception as e:
+            self._count("shared_errors")
+            print("⚠️ Tenant config cache (redis) read failed:", e)
+            return None, None
+
+    def _shared_set(self, tenant_id, config, generation):
+        """Store `config` unless the tenant was invalidated since `generation` was read."""
+        if self._redis is None or generation is None:
+            return
+        generation_key = f"{_REDIS_GENERATION_PREFIX}{tenant_id}"
+        value = json.dumps({"generation": generation, "config": config}, default=str)
+        try:
+            with self._redis.pipeline() as pipe:
+                pipe.watch(generation_key)
+                if int(pipe.get(generation_key) or 0) != generation:
+                    pipe.unwatch()
+                    return
+                pipe.multi()
+                pipe.set(f"{_REDIS_PREFIX}{tenant_id}", value, ex=TENANT_CONFIG_REDIS_TTL)
+                pipe.execute()
+        except redis.WatchError:
+            pass  # invalidated while writing: the newer settings win
+        except Exception as e:
+            self._count("shared_errors")
+            print("⚠️ Tenant config cache (redis) write failed:", e)
+
+    def _shared_invalidate(self, tenant_id):
+        if self._redis is None:
+            return
+        try:
+            with self._redis.pipeline() as pipe:
+                pipe.incr(f"{_REDIS_GENERATION_PREFIX}{tenant_id}")
+                pipe.delete(f"{_REDIS_PREFIX}{tenant_id}")
+                pipe.execute()
+        except Exception as e:
+            self._count("shared_errors")
+            print("⚠️ Tenant config cache (redis) invalidation failed:", e)
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    # ---------------- public API ----------------
+    def get(self, tenant_id):
+        """Parsed config for a tenant (a private copy), or None for an unknown tenant."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(tenant_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(tenant_id)
+                self._stats["hits"] += 1
+                return copy.deepcopy(entry[1])
+            self._stats["misses"] += 1
+            generation = self._generations.get(tenant_id, 0)
+
+        # the shared generation is read before Postgres, so a racing write is detected
+        config, shared_generation = self._shared_get(tenant_id)
+        if config is not None:
+            self._count("shared_hits")
+        else:
+            config = load_tenant_config(tenant_id)
+            self._count("loads")
+            if config is None:
+                return None
+            if self._generations.get(tenant_id, 0) == generation:
+                self._shared_set(tenant_id, config, shared_generation)
+
+        with self._lock:
+            if self._generations.get(tenant_id, 0) != generation:
+                return copy.deepcopy(config)
+            self._entries[tenant_id] = (now + self.ttl, config)
+            self._entries.move_to_end(tenant_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+        return copy.deepcopy(config)
+
+    def invalidate(self, tenant_id):
+        with self._lock:
+            self._entries.pop(tenant_id, None)
+            self._generations[tenant_id] = self._generations.get(tenant_id, 0) + 1
+            self._stats["invalidations"] += 1
+        self._shared_invalidate(tenant_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                "shared": "redis" if self._redis is not None else None,
+            }
+
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+def get_tenant_config_cache():
+    """Process-wide cache (recreated after fork, like the DB pool)."""
+    global _cache, _cache_pid
+    pid = os.getpid()
+    if _cache is None or _cache_pid != pid:
+        with _cache_lock:
+            if _cache is None or _cache_pid != pid:
+                _cache, _cache_pid = TenantConfigCache(), pid
+    return _cache
+
+
+def get_tenant_config(tenant_id):
+    return get_tenant_config_cache().get(tenant_id)
+
+
+def invalidate_tenant_config(tenant_id):
+    """Call after committing any change to the tenant's settings row."""
+    get_tenant_config_cache().invalidate(tenant_id)
+
+
+def get_tenant_config_stats():
+    return get_tenant_config_cache().stats()
@@ -0,0 +1,138 @@
+import os
+import uuid
+import time
+import hashlib
+import threading
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+from utils.blob_store import STAGING_DIR, StagedBlob, _ext_for
+
+# ============================================================
+# 🔹 LIMITS
+# ============================================================
+UPLOAD_MAX_FILE_BYTES = int(os.environ.get("UPLOAD_MAX_FILE_BYTES", 10 * 1024 * 1024))
+UPLOAD_MAX_REQUEST_BYTES = int(os.environ.get("UPLOAD_MAX_REQUEST_BYTES", 50 * 1024 * 1024))
+# multipart parts per request (files + form fields)
+UPLOAD_MAX_PARTS = int(os.environ.get("UPLOAD_MAX_PARTS", 30))
+# in-memory cap for non-file form fields (the challan `data` JSON)
+UPLOAD_MAX_FORM_MEMORY = int(os.environ.get("UPLOAD_MAX_FORM_MEMORY", 1024 * 1024))
+
+
+# ============================================================
+# 🔹 METRICS (per process)
+# ============================================================
+_stats_lock = threading.Lock()
+_stats = {
+    "files": 0,
+    "bytes": 0,
+    "seconds": 0.0,
+    "largest_file_bytes": 0,
+    "rejected_file_too_large": 0,
+}
+
+
+def _record_file(size, seconds):
+    with _stats_lock:
+        _stats["files"] += 1
+        _stats["bytes"] += size
+        _stats["seconds"] += seconds
+        _stats["largest_file_bytes"] = max(_stats["largest_file_bytes"], size)
+
+
+def get_upload_stats():
+    with _stats_lock:
+        seconds = _stats["seconds"]
+        return {
+            **{k: v for k, v in _stats.items() if k != "seconds"},
+            "throughput_mb_s": round(_stats["bytes"] / seconds / (1024 * 1024), 2) if seconds else 0.0,
+            "max_file_bytes": UPLOAD_MAX_FILE_BYTES,
+            "max_request_bytes": UPLOAD_MAX_REQUEST_BYTES,
+            "max_parts": UPLOAD_MAX_PARTS,
+        }
+
+
+# ============================================================
+# 🔹 STAGING FILE
+# ============================================================
+class StagingFile:
+    """
+    Writable target handed to the multipart parser. Each chunk is hashed and
+    written straight to the blob staging area, so the blob store can publish
+    the upload with a rename instead of copying it again.
+    """
+
+    def __init__(self, max_bytes=UPLOAD_MAX_FILE_BYTES):
+        os.makedirs(os.path.join(os.getcwd(), STAGING_DIR), exist_ok=True)
+        self.path = os.path.join(os.getcwd(), STAGING_DIR, f"{uuid.uuid4().hex}.part")
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.claimed = False
+        self._fh = open(self.path, "w+b")
+        self._digest = hashlib.sha256()
+        self._started = time.perf_counter()
+        self._finished = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            with _stats_lock:
+                _stats["rejected_file_too_large"] += 1
+            raise RequestEntityTooLarge(f"Each file must be at most {self.max_bytes // (1024 * 1024)} MB")
+        self._digest.update(data)
+        return self._fh.write(data)
+
+    def seek(self, *args):
+        # the parser rewinds the stream once the part is complete
+        if not self._finished:
+            self._finished = True
+            self._fh.flush()
+            _record_file(self.size, time.perf_counter() - self._started)
+        return self._fh.seek(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._fh, name)
+
+    def __iter__(self):
+        return iter(self._fh)
+
+    def claim(self, filename):
+        """Hand the staged file over to the blob store."""
+        self._fh.close()
+        self.claimed = True
+        return StagedBlob(self._digest.hexdigest(), _ext_for(filename), self.size, self.path, filename)
+
+    def discard(self):
+        try:
+            self._fh.close()
+        except Exception:
+            pass
+        if not self.claimed and os.path.exists(self.path):
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+# ============================================================
+# 🔹 REQUEST CLASS
+# ============================================================
+class StreamingUploadRequest(Request):
+    """Request whose file uploads stream into blob staging with byte caps."""
+
+    max_form_parts = UPLOAD_MAX_PARTS
+    max_form_memory_size = UPLOAD_MAX_FORM_MEMORY
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if content_length and UPLOAD_MAX_FILE_BYTES and content_length > UPLOAD_MAX_FILE_BYTES:
+            with _stats_lock:
+                _stats["rejected_file_too_large"] += 1
+            raise RequestEntityTooLarge(f"Each file must be at most {UPLOAD_MAX_FILE_BYTES // (1024 * 1024)} MB")
+        stream = StagingFile()
+        self.__dict__.setdefault("_staging_files", []).append(stream)
+        return stream
+
+    def close(self):
+        # staged uploads the route did not hand to the blob store are removed
+        for stream in self.__dict__.pop("_staging_files", []):
+            stream.discard()
+        super().close()
@@ -0,0 +1,53 @@
+"""
+Background worker for challan jobs (QR + PDF) and the email outbox.
+
+    python worker.py                 # one process per CPU
+    python worker.py --processes 4   # explicit process count
+
+Each process claims jobs from the `challan_jobs` table with
+FOR UPDATE SKIP LOCKED, so any number of workers can run side by side.
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import threading
+
+from utils.jobs import run_worker
+from utils.migrations import upgrade
+
+
+def _worker_main(index):
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    run_worker(worker_name=f"worker-{index}-{os.getpid()}", stop_event=stop_event)
+
+
+# ============================================================
+# 🔹 ENTRY POINT
+# ============================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run challan job workers")
+    parser.add_argument("--processes", type=int,
+                        default=int(os.environ.get("JOB_WORKER_PROCESSES", os.cpu_count() or 1)))
+    args = parser.parse_args()
+
+    upgrade()
+
+    if args.processes <= 1:
+        _worker_main(0)
+    else:
+        procs = [multiprocessing.Process(target=_worker_main, args=(i,)) for i in range(args.processes)]
+        for p in procs:
+            p.start()
+
+        def _shutdown(*_):
+            for p in procs:
+                if p.is_alive():
+                    p.terminate()
+
+        signal.signal(signal.SIGTERM, _shutdown)
+        signal.signal(signal.SIGINT, _shutdown)
+        for p in procs:
+            p.join()